@@ -3,14 +3,70 @@
 上下文事件管理模块
 根据状态和行为触发事件，实现主动消息发送
 """
-from typing import Optional, Dict, List, Callable
+from typing import Optional, Dict, List, Callable, Tuple, Any
 import asyncio
+import heapq
+import itertools
+import re
 import time
+from dataclasses import dataclass, field, fields
 from datetime import datetime
 from enum import Enum
 from astrbot.api import logger
 
 
+# 问候语关键词
+_GREETINGS = (
+    "你好", "您好", "hi", "hello", "嗨", "hey",
+    "早上好", "晚上好", "下午好", "早安", "晚安",
+    "在吗", "在不在"
+)
+
+# 话题关键词（按优先级排列）
+_TOPIC_KEYWORDS = {
+    "天气": ("天气", "下雨", "晴天", "温度"),
+    "绘画": ("画", "图", "绘", "生成图片", "自拍"),
+    "聊天": ("聊天", "说话", "讲", "告诉"),
+    "帮助": ("帮", "怎么", "如何", "教"),
+}
+_TOPIC_PRIORITY = {topic: i for i, topic in enumerate(_TOPIC_KEYWORDS)}
+
+# 关键词 -> (类别, 话题)
+_KEYWORD_LABELS: Dict[str, Tuple[str, Optional[str]]] = {}
+for _word in _GREETINGS:
+    _KEYWORD_LABELS.setdefault(_word, ("greeting", None))
+for _topic, _words in _TOPIC_KEYWORDS.items():
+    for _word in _words:
+        _KEYWORD_LABELS.setdefault(_word, ("topic", _topic))
+
+# 所有关键词编译为一个多模式匹配：零宽前瞻使每个位置都参与匹配（允许重叠），
+# 长词优先，一次扫描即可得到全部命中。每个关键词单独一个分组，按命中的分组号取标签，
+# 不依赖 lower() 还原关键词（IGNORECASE 会匹配 "hİ"、"K"（开尔文符号）等大小写变体）
+_KEYWORD_ORDER = sorted(_KEYWORD_LABELS, key=len, reverse=True)
+_KEYWORD_RE = re.compile(
+    "(?=(?:" + "|".join(f"({re.escape(word)})" for word in _KEYWORD_ORDER) + "))",
+    re.IGNORECASE
+)
+# 分组号 -> (类别, 话题)，分组号从 1 开始
+_GROUP_LABELS = [None] + [_KEYWORD_LABELS[word] for word in _KEYWORD_ORDER]
+
+# 单独判断问候语时使用的正则（忽略大小写，无需先 lower()）
+_GREETING_RE = re.compile("|".join(map(re.escape, _GREETINGS)), re.IGNORECASE)
+
+
+def _scan_keywords(message: str) -> Tuple[bool, Optional[str]]:
+    """单次扫描消息，返回 (是否问候, 优先级最高的话题)"""
+    is_greeting = False
+    best_topic = None
+    for match in _KEYWORD_RE.finditer(message):
+        kind, topic = _GROUP_LABELS[match.lastindex]
+        if kind == "greeting":
+            is_greeting = True
+        elif best_topic is None or _TOPIC_PRIORITY[topic] < _TOPIC_PRIORITY[best_topic]:
+            best_topic = topic
+    return is_greeting, best_topic
+
+
 class EventType(Enum):
     """事件类型"""
     EMOTION_CHANGE = "情绪变化"
@@ -39,7 +95,8 @@ class EventTrigger:
     """事件触发器"""
     
     def __init__(self):
-        self.handlers: Dict[EventType, List[Callable]] = {}
+        # event_type -> [(handler, 是否为协程函数)]
+        self.handlers: Dict[EventType, List[Tuple[Callable, bool]]] = {}
         self.last_message_time: Optional[float] = None
         self.message_count = 0
         self.last_topic = None
@@ -54,7 +111,7 @@ class EventTrigger:
         """
         if event_type not in self.handlers:
             self.handlers[event_type] = []
-        self.handlers[event_type].append(handler)
+        self.handlers[event_type].append((handler, asyncio.iscoroutinefunction(handler)))
     
     async def trigger_event(self, event: ContextEvent):
         """
@@ -64,9 +121,9 @@ class EventTrigger:
             event: 上下文事件
         """
         handlers = self.handlers.get(event.event_type, [])
-        for handler in handlers:
+        for handler, is_coroutine in handlers:
             try:
-                if asyncio.iscoroutinefunction(handler):
+                if is_coroutine:
                     await handler(event)
                 else:
                     handler(event)
@@ -86,41 +143,46 @@ class EventTrigger:
         """
         events = []
         current_time = time.time()
+        is_greeting, current_topic = _scan_keywords(message)
         
         # 检测问候
-        if self._is_greeting(message):
+        if is_greeting:
             events.append(ContextEvent(
                 EventType.GREETING,
-                {"message": message}
+                {"message": message},
+                current_time
             ))
         
         # 检测长消息
         if len(message) > 200:
             events.append(ContextEvent(
                 EventType.LONG_MESSAGE,
-                {"message": message, "length": len(message)}
+                {"message": message, "length": len(message)},
+                current_time
             ))
         
         # 检测用户空闲（距离上次消息超过5分钟）
         if self.last_message_time and (current_time - self.last_message_time) > 300:
             events.append(ContextEvent(
                 EventType.USER_IDLE,
-                {"idle_duration": current_time - self.last_message_time}
+                {"idle_duration": current_time - self.last_message_time},
+                current_time
             ))
         
         # 检测对话开始（第一条消息或长时间空闲后的消息）
         if self.message_count == 0 or (self.last_message_time and (current_time - self.last_message_time) > 600):
             events.append(ContextEvent(
                 EventType.CONVERSATION_START,
-                {"message": message}
+                {"message": message},
+                current_time
             ))
         
         # 检测话题切换
-        current_topic = self._extract_topic(message)
         if self.last_topic and current_topic and current_topic != self.last_topic:
             events.append(ContextEvent(
                 EventType.TOPIC_CHANGE,
-                {"old_topic": self.last_topic, "new_topic": current_topic}
+                {"old_topic": self.last_topic, "new_topic": current_topic},
+                current_time
             ))
         
         # 更新状态
@@ -133,29 +195,12 @@ class EventTrigger:
     
     def _is_greeting(self, message: str) -> bool:
         """检测是否是问候语"""
-        greetings = [
-            "你好", "您好", "hi", "hello", "嗨", "hey",
-            "早上好", "晚上好", "下午好", "早安", "晚安",
-            "在吗", "在不在"
-        ]
-        message_lower = message.lower().strip()
-        return any(greeting in message_lower for greeting in greetings)
+        return _GREETING_RE.search(message) is not None
     
     def _extract_topic(self, message: str) -> Optional[str]:
         """提取消息主题（简化实现）"""
         # 这里可以使用更复杂的NLP方法，目前使用关键词提取
-        keywords = {
-            "天气": ["天气", "下雨", "晴天", "温度"],
-            "绘画": ["画", "图", "绘", "生成图片", "自拍"],
-            "聊天": ["聊天", "说话", "讲", "告诉"],
-            "帮助": ["帮", "怎么", "如何", "教"],
-        }
-        
-        for topic, words in keywords.items():
-            if any(word in message for word in words):
-                return topic
-        
-        return None
+        return _scan_keywords(message)[1]
     
     def reset(self):
         """重置触发器状态"""
@@ -168,8 +213,14 @@ class ProactiveMessageManager:
     """主动消息管理器"""
     
     def __init__(self):
-        self.scheduled_messages: List[Dict] = []
+        # 最小堆：(scheduled_time, seq, msg_data)，seq 用于打破时间相同时的比较
+        self.scheduled_messages: List[Tuple[float, int, Dict]] = []
         self.running = False
+        self._seq = itertools.count()
+        self._wake = asyncio.Event()
+        # 会话索引：session_id -> {seq: msg_data}，用于按会话取消（惰性删除）
+        self._by_session: Dict[str, Dict[int, Dict]] = {}
+        self._cancelled_count = 0
     
     def schedule_message(
         self,
@@ -188,50 +239,93 @@ class ProactiveMessageManager:
             context_data: 上下文数据
         """
         scheduled_time = time.time() + delay
-        self.scheduled_messages.append({
+        seq = next(self._seq)
+        msg_data = {
             "message": message,
             "scheduled_time": scheduled_time,
             "session_id": session_id,
-            "context_data": context_data or {}
-        })
+            "context_data": context_data or {},
+            "cancelled": False
+        }
+        heapq.heappush(self.scheduled_messages, (scheduled_time, seq, msg_data))
+        self._by_session.setdefault(session_id, {})[seq] = msg_data
+        # 唤醒调度器，重新计算下一次到期时间
+        self._wake.set()
     
     async def start_scheduler(self, send_callback: Callable):
         """
         启动调度器
         
+        队列为空时挂起等待，否则精确休眠到最早一条消息到期；
+        新消息入队会提前唤醒调度器。
+        
         Args:
             send_callback: 消息发送回调函数
         """
         self.running = True
         
         while self.running:
+            self._drop_cancelled_head()
+            if not self.scheduled_messages:
+                await self._wake.wait()
+            else:
+                delay = self.scheduled_messages[0][0] - time.time()
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+            self._wake.clear()
+            
+            # 弹出所有已到期的消息
             current_time = time.time()
             messages_to_send = []
-            
-            # 找出所有应该发送的消息
-            for msg_data in self.scheduled_messages:
-                if msg_data["scheduled_time"] <= current_time:
+            while self.scheduled_messages and self.scheduled_messages[0][0] <= current_time:
+                msg_data = self._pop_message()
+                if not msg_data["cancelled"]:
                     messages_to_send.append(msg_data)
             
-            # 发送消息并从队列中移除
-            for msg_data in messages_to_send:
-                try:
-                    await send_callback(
+            if not messages_to_send:
+                continue
+            
+            # 并发发送本批消息，单条失败不影响其他消息
+            results = await asyncio.gather(
+                *(
+                    send_callback(
                         msg_data["message"],
                         msg_data["session_id"],
                         msg_data["context_data"]
                     )
-                except Exception as e:
-                    logger.error(f"发送主动消息失败: {e}")
-                
-                self.scheduled_messages.remove(msg_data)
-            
-            # 等待一段时间再检查
-            await asyncio.sleep(1)
+                    for msg_data in messages_to_send
+                ),
+                return_exceptions=True
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.error(f"发送主动消息失败: {result}")
+    
+    def _pop_message(self) -> Dict:
+        """弹出堆顶消息并同步维护会话索引"""
+        _, seq, msg_data = heapq.heappop(self.scheduled_messages)
+        if msg_data["cancelled"]:
+            self._cancelled_count -= 1
+        else:
+            bucket = self._by_session.get(msg_data["session_id"])
+            if bucket is not None:
+                bucket.pop(seq, None)
+                if not bucket:
+                    del self._by_session[msg_data["session_id"]]
+        return msg_data
+    
+    def _drop_cancelled_head(self):
+        """丢弃堆顶已取消的消息，避免为其空等"""
+        while self.scheduled_messages and self.scheduled_messages[0][2]["cancelled"]:
+            self._pop_message()
     
     def stop_scheduler(self):
         """停止调度器"""
         self.running = False
+        self._wake.set()
     
     def clear_scheduled_messages(self, session_id: Optional[str] = None):
         """
@@ -241,29 +335,69 @@ class ProactiveMessageManager:
             session_id: 如果指定，只清空该会话的消息；否则清空所有
         """
         if session_id:
-            self.scheduled_messages = [
-                msg for msg in self.scheduled_messages
-                if msg["session_id"] != session_id
-            ]
+            bucket = self._by_session.pop(session_id, None)
+            if not bucket:
+                return
+            for msg_data in bucket.values():
+                msg_data["cancelled"] = True
+            self._cancelled_count += len(bucket)
+            # 已取消的条目超过一半时重建堆
+            if self._cancelled_count * 2 > len(self.scheduled_messages):
+                self.scheduled_messages = [
+                    item for item in self.scheduled_messages
+                    if not item[2]["cancelled"]
+                ]
+                heapq.heapify(self.scheduled_messages)
+                self._cancelled_count = 0
         else:
             self.scheduled_messages.clear()
+            self._by_session.clear()
+            self._cancelled_count = 0
+        self._wake.set()
+
+
+# 会话状态字段未设置时的占位值
+_UNSET: Any = object()
+
+
+@dataclass(slots=True)
+class SessionState:
+    """单个会话的状态"""
+    last_emotion: Any = _UNSET
+    emotion_analysis: Any = _UNSET
+    last_interaction_time: Any = _UNSET
+    # 未预先声明的键
+    extras: Dict[str, Any] = field(default_factory=dict)
+
+
+_SESSION_FIELDS = frozenset(f.name for f in fields(SessionState)) - {"extras"}
 
 
 class ContextState:
     """上下文状态管理"""
     
     def __init__(self):
-        self.states: Dict[str, Dict] = {}  # session_id -> state
+        self.states: Dict[str, SessionState] = {}  # session_id -> state
     
     def update_state(self, session_id: str, key: str, value):
         """更新会话状态"""
-        if session_id not in self.states:
-            self.states[session_id] = {}
-        self.states[session_id][key] = value
+        state = self.states.get(session_id)
+        if state is None:
+            state = self.states[session_id] = SessionState()
+        if key in _SESSION_FIELDS:
+            setattr(state, key, value)
+        else:
+            state.extras[key] = value
     
     def get_state(self, session_id: str, key: str, default=None):
         """获取会话状态"""
-        return self.states.get(session_id, {}).get(key, default)
+        state = self.states.get(session_id)
+        if state is None:
+            return default
+        if key in _SESSION_FIELDS:
+            value = getattr(state, key)
+            return default if value is _UNSET else value
+        return state.extras.get(key, default)
     
     def clear_state(self, session_id: str):
         """清空会话状态"""
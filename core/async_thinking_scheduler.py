@@ -4,9 +4,10 @@
 管理后台思考线程，定期生成思考和活动记录
 """
 import asyncio
-from datetime import datetime, timedelta
-from pathlib import Path
-from typing import Optional, Callable
+import json
+import sys
+from datetime import datetime
+from typing import Optional, Callable, List, Tuple, Dict, Any
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from astrbot.api import logger
@@ -14,10 +15,35 @@ from astrbot.api import logger
 from .thought_engine import ThoughtEngine
 from .experience_bank import ExperienceBank
 
+_now = datetime.now
+
+# 写入队列的结束标记：写入任务写完其之前的全部记录后退出
+_STOP = object()
+
+# Python 3.12+ 支持单个任务 eager 启动（同步执行到首个 await）
+_EAGER_START = sys.version_info >= (3, 12)
+
+
+def _create_task(coro) -> asyncio.Task:
+    """在当前事件循环上为本调度器创建任务；3.12+ 上 eager 启动，不改动宿主循环的任务工厂"""
+    loop = asyncio.get_running_loop()
+    if _EAGER_START:
+        return asyncio.Task(coro, loop=loop, eager_start=True)
+    return loop.create_task(coro)
+
 
 class AsyncThinkingScheduler:
     """异步思考循环调度器"""
     
+    # 合并调度的节拍间隔（分钟），思考每4拍（20分钟）一次，活动每5拍（25分钟）一次
+    TICK_MINUTES = 5
+    THINK_EVERY_TICKS = 4
+    ACTIVITY_EVERY_TICKS = 5
+    
+    # 经历写入队列：容量上限与单批最大条数
+    WRITE_QUEUE_SIZE = 1000
+    WRITE_BATCH_SIZE = 32
+    
     def __init__(self, thought_engine: ThoughtEngine, experience_bank: ExperienceBank, llm_action=None, on_weather_changed: Optional[Callable] = None, persona_profile: str = ""):
         """
         初始化调度器
@@ -46,6 +72,17 @@ class AsyncThinkingScheduler:
         
         # 是否正在运行
         self.is_running = False
+        
+        # 节拍计数（持久化，重启后不丢失进度）
+        self._tick_file = self.thought_engine.data_dir / "scheduler_state.json"
+        self._tick = self._load_tick()
+        
+        # 经历写入队列：(描述, 写入函数, 参数)，由后台任务批量在线程中执行
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        
+        # 后台运行的思考任务：大模型思考可能超过一个节拍，不阻塞节拍和活动记录
+        self._think_task: Optional[asyncio.Task] = None
     
     def start(self):
         """启动异步思考循环"""
@@ -54,19 +91,22 @@ class AsyncThinkingScheduler:
                 logger.warning("[异步思考] 调度器已在运行")
                 return
             
-            # 安排定期思考任务（每15-30分钟）
-            self.scheduler.add_job(
-                func=self._scheduled_think,
-                trigger=IntervalTrigger(minutes=20),  # 每20分钟思考一次
-                name="thought_generator",
-                max_instances=1,
-            )
+            # 绑定到宿主当前运行的事件循环（AstrBot 已持有循环，插件无法替换其实现，
+            # 若宿主使用 uvloop 则此处自动沿用）
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            if loop is not None:
+                self.scheduler.configure(event_loop=loop)
+                self._write_queue = asyncio.Queue(maxsize=self.WRITE_QUEUE_SIZE)
+                self._writer_task = loop.create_task(self._writer_loop())
             
-            # 安排定期活动记录任务（每25-35分钟）
+            # 思考与活动记录合并为一个定时节拍，减少调度唤醒次数
             self.scheduler.add_job(
-                func=self._scheduled_activity,
-                trigger=IntervalTrigger(minutes=25),  # 每25分钟记录一个活动
-                name="activity_recorder",
+                func=self._scheduled_tick,
+                trigger=IntervalTrigger(minutes=self.TICK_MINUTES),
+                name="thinking_tick",
                 max_instances=1,
             )
             
@@ -88,8 +128,8 @@ class AsyncThinkingScheduler:
         except Exception as e:
             logger.error(f"[异步思考] 启动调度器失败: {e}")
     
-    def stop(self):
-        """停止异步思考循环"""
+    async def stop(self):
+        """停止异步思考循环，等待写入队列中的记录全部写完后返回"""
         try:
             if not self.is_running:
                 logger.warning("[异步思考] 调度器未运行")
@@ -98,11 +138,65 @@ class AsyncThinkingScheduler:
             self.scheduler.shutdown()
             self.is_running = False
             
+            if self._think_task is not None:
+                self._think_task.cancel()
+                self._think_task = None
+            
+            # 停止写入任务：放入结束标记并等待写入任务退出，正在线程中写入的批次及其后
+            # 排队的记录都会按顺序写完，之后才允许关闭经历银行；之后的写入直接同步执行
+            write_queue, writer_task = self._write_queue, self._writer_task
+            self._write_queue = None
+            self._writer_task = None
+            if writer_task is not None and not writer_task.done():
+                await write_queue.put(_STOP)
+                await writer_task
+            elif write_queue is not None:
+                pending = []
+                while not write_queue.empty():
+                    pending.append(write_queue.get_nowait())
+                self._apply_writes(pending)
+            
             logger.info("[异步思考] 调度器已停止")
             
         except Exception as e:
             logger.error(f"[异步思考] 停止调度器失败: {e}")
     
+    def _load_tick(self) -> int:
+        """加载节拍计数"""
+        try:
+            if self._tick_file.exists():
+                with open(self._tick_file, 'r', encoding='utf-8') as f:
+                    return int(json.load(f).get("tick", 0))
+        except Exception as e:
+            logger.warning(f"[异步思考] 加载节拍计数失败: {e}")
+        return 0
+    
+    def _save_tick(self):
+        """保存节拍计数"""
+        try:
+            with open(self._tick_file, 'w', encoding='utf-8') as f:
+                json.dump({"tick": self._tick}, f)
+        except Exception as e:
+            logger.warning(f"[异步思考] 保存节拍计数失败: {e}")
+    
+    async def _scheduled_tick(self):
+        """定时节拍：按节拍数决定是否思考、记录活动
+        
+        思考在后台任务中运行，节拍不等待它完成：大模型思考耗时超过一个节拍时，
+        后续节拍（及其中的活动记录）不会被 max_instances 跳过。
+        """
+        self._tick += 1
+        self._save_tick()
+        
+        # 任务常在首个 await 前就返回，eager 启动省去一次事件循环调度
+        if self._tick % self.THINK_EVERY_TICKS == 0:
+            if self._think_task is not None and not self._think_task.done():
+                logger.warning("[异步思考] 上一次思考尚未完成，跳过本次思考")
+            else:
+                self._think_task = _create_task(self._scheduled_think())
+        if self._tick % self.ACTIVITY_EVERY_TICKS == 0:
+            await _create_task(self._scheduled_activity())
+    
     async def _scheduled_think(self):
         """定期思考任务"""
         try:
@@ -110,7 +204,7 @@ class AsyncThinkingScheduler:
             thought = await self.thought_engine.generate_thought(
                 llm_action=self.llm_action,
                 weather=self.current_weather,
-                current_time=datetime.now(),
+                current_time=_now(),
                 persona_profile=self.persona_profile
             )
             
@@ -130,7 +224,7 @@ class AsyncThinkingScheduler:
         try:
             logger.info("[异步思考] 触发日常活动记录")
             activity = await self.thought_engine.generate_activity(
-                current_time=datetime.now()
+                current_time=_now()
             )
             
             if activity:
@@ -152,7 +246,7 @@ class AsyncThinkingScheduler:
             thoughts = self.thought_engine.get_today_thoughts()
             activities = self.thought_engine.get_today_activities()
             
-            logger.info(f"[异步思考] 今日思考数: {len(thoughts)}, 活动数: {len(activities)}")
+            logger.info("[异步思考] 今日思考数: %d, 活动数: %d", len(thoughts), len(activities))
             
             # 可以在这里添加复盘总结
             if len(thoughts) > 0 or len(activities) > 0:
@@ -180,7 +274,7 @@ class AsyncThinkingScheduler:
         
         # 如果天气改变，触发回调
         if old_weather != weather:
-            logger.info(f"[异步思考] 天气已更新: {old_weather} -> {weather}")
+            logger.info("[异步思考] 天气已更新: %s -> %s", old_weather, weather)
             
             if self.on_weather_changed:
                 try:
@@ -188,6 +282,44 @@ class AsyncThinkingScheduler:
                 except Exception as e:
                     logger.error(f"[异步思考] 天气变化回调失败: {e}")
     
+    def _enqueue_write(self, description: str, func: Callable, *args, **kwargs):
+        """将经历写入放入队列；调度器未运行或队列已满时直接同步写入"""
+        item = (description, func, args, kwargs)
+        if self._write_queue is not None:
+            try:
+                self._write_queue.put_nowait(item)
+                return
+            except asyncio.QueueFull:
+                logger.warning("[异步思考] 写入队列已满，改为同步写入")
+        self._apply_writes([item])
+    
+    async def _writer_loop(self):
+        """后台写入任务：攒批后在线程中执行，避免阻塞事件循环；取到结束标记时写完当前批次后退出"""
+        write_queue = self._write_queue
+        while True:
+            item = await write_queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stopping = False
+            while len(batch) < self.WRITE_BATCH_SIZE and not write_queue.empty():
+                item = write_queue.get_nowait()
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await asyncio.to_thread(self._apply_writes, batch)
+            if stopping:
+                return
+    
+    def _apply_writes(self, batch: List[Tuple[str, Callable, tuple, Dict[str, Any]]]):
+        """依次执行一批经历写入"""
+        for description, func, args, kwargs in batch:
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"[异步思考] {description}失败: {e}")
+    
     def record_user_interaction(self, user_id: str, user_message: str, bot_response: str, session_id: Optional[str] = None):
         """
         记录用户互动（用于经历累积）
@@ -198,36 +330,26 @@ class AsyncThinkingScheduler:
             bot_response: 机器人回复
             session_id: 会话ID
         """
-        try:
-            self.experience_bank.record_conversation(
-                user_id=user_id,
-                user_message=user_message,
-                bot_response=bot_response,
-                session_id=session_id
-            )
-        except Exception as e:
-            logger.error(f"[异步思考] 记录互动失败: {e}")
+        self._enqueue_write(
+            "记录互动",
+            self.experience_bank.record_conversation,
+            user_id=user_id,
+            user_message=user_message,
+            bot_response=bot_response,
+            session_id=session_id
+        )
     
-    def update_skill(self, skill_name: str, level: int = 1):
+    def update_skill(self, skill_name: str, level: Optional[int] = 1):
         """更新技能"""
-        try:
-            self.experience_bank.update_growth("skills", skill_name, level)
-        except Exception as e:
-            logger.error(f"[异步思考] 更新技能失败: {e}")
+        self._enqueue_write("更新技能", self.experience_bank.update_growth, "skills", skill_name, level)
     
     def add_interest(self, interest_name: str):
         """添加兴趣"""
-        try:
-            self.experience_bank.update_growth("interests", interest_name)
-        except Exception as e:
-            logger.error(f"[异步思考] 添加兴趣失败: {e}")
+        self._enqueue_write("添加兴趣", self.experience_bank.update_growth, "interests", interest_name)
     
     def add_view(self, view_description: str):
         """添加观点"""
-        try:
-            self.experience_bank.update_growth("views", view_description)
-        except Exception as e:
-            logger.error(f"[异步思考] 添加观点失败: {e}")
+        self._enqueue_write("添加观点", self.experience_bank.update_growth, "views", view_description)
     
     def get_user_profile(self, user_id: str):
         """获取用户资料"""
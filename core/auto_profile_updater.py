@@ -4,15 +4,124 @@
 根据情绪变化自动更新QQ昵称、签名和头像
 """
 
+import os
+import json
+import logging
+import random
 import time
 import asyncio
+from collections import deque
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Optional, Dict, Tuple, Iterator
 from datetime import datetime
+from types import MappingProxyType
 
 from astrbot.api import logger
 from astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event import AiocqhttpMessageEvent
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+# 更新类型 -> 状态中记录上次更新时间的键
+_UPDATE_KEYS = MappingProxyType({
+    "nickname": "last_nickname_update",
+    "signature": "last_signature_update",
+    "avatar": "last_avatar_update",
+})
+
+# 情绪昵称映射
+_EMOTION_NICKNAMES = {
+    "开心": ("开心小助手", "阳光助手", "快乐AI"),
+    "悲伤": ("沉思者", "安静的AI", "温柔助手"),
+    "生气": ("严肃助手", "认真AI", "冷静者"),
+    "兴奋": ("活力助手", "热情AI", "兴奋小助手"),
+    "平静": ("宁静助手", "淡然AI", "平和助手"),
+    "困惑": ("思考者", "探索AI", "求知助手"),
+    "无聊": ("慵懒助手", "悠闲AI", "慢节奏助手"),
+    "好奇": ("探索者", "好奇AI", "发现助手"),
+    "惊讶": ("惊叹助手", "惊喜AI", "新奇助手"),
+    "焦虑": ("缓压助手", "安心AI", "放松助手")
+}
+
+# 情绪签名模板
+_EMOTION_TEMPLATES = {
+    "开心": (
+        "今天心情超好！✨",
+        "开心的一天～😊",
+        "生活真美好 🌟"
+    ),
+    "悲伤": (
+        "有点想静静...",
+        "心情有些低落 💔",
+        "今天不太开心呢"
+    ),
+    "生气": (
+        "有点不开心...",
+        "需要冷静一下 💢",
+        "心情不太美丽"
+    ),
+    "兴奋": (
+        "超级兴奋！🎉",
+        "太棒了！！",
+        "开心到飞起～⭐"
+    ),
+    "平静": (
+        "安静地度过每一天 🌸",
+        "岁月静好～",
+        "平平淡淡才是真"
+    ),
+    "困惑": (
+        "有点搞不懂...",
+        "迷糊中 🤔",
+        "需要思考一下"
+    ),
+    "无聊": (
+        "好无聊啊...",
+        "无所事事中 😴",
+        "找点事情做吧"
+    ),
+    "好奇": (
+        "探索世界中 🔍",
+        "对一切充满好奇～",
+        "想知道更多！"
+    ),
+    "惊讶": (
+        "哇！太惊讶了！",
+        "没想到啊 😲",
+        "出乎意料！"
+    ),
+    "焦虑": (
+        "有点焦虑...",
+        "需要放松一下 💫",
+        "深呼吸～"
+    )
+}
+_DEFAULT_TEMPLATES = ("保持微笑～",)
+
+
+def _shuffled_cycle(items: Tuple[str, ...]) -> Iterator[str]:
+    """无限循环地产出打乱顺序的元素，每轮结束后重新洗牌"""
+    while True:
+        yield from random.sample(items, len(items))
+
+# 情绪表情映射
+_EMOTION_EXPRESSIONS = {
+    "开心": "开心微笑的表情",
+    "悲伤": "略带悲伤的表情",
+    "生气": "生气的表情",
+    "兴奋": "兴奋激动的表情",
+    "平静": "平静淡定的表情",
+    "困惑": "困惑疑惑的表情",
+    "无聊": "无聊慵懒的表情",
+    "好奇": "好奇的表情",
+    "惊讶": "惊讶的表情",
+    "焦虑": "焦虑不安的表情"
+}
+
 
 class AutoProfileUpdater:
     """自动Profile更新管理器
@@ -21,6 +130,9 @@ class AutoProfileUpdater:
     支持昵称、签名、头像的智能更新
     """
     
+    # 状态写盘的合并延迟（秒）
+    FLUSH_DELAY = 5
+    
     def __init__(
         self,
         data_dir: Path,
@@ -52,11 +164,29 @@ class AutoProfileUpdater:
         self.threshold = threshold
         self.persona_name = persona_name
         
+        # 每种情绪的签名模板轮换序列
+        self._template_cycles: Dict[str, Iterator[str]] = {
+            emotion: _shuffled_cycle(templates)
+            for emotion, templates in _EMOTION_TEMPLATES.items()
+        }
+        self._default_template_cycle = _shuffled_cycle(_DEFAULT_TEMPLATES)
+        
         # 状态文件
         self.state_file = self.data_dir / "profile_update_state.json"
         
         # 加载状态
         self.state = self._load_state()
+        # 情绪历史单独保存为定长队列，只保留最近10条
+        self.emotion_history = deque(self.state.pop("emotion_history", []), maxlen=10)
+        
+        # 延迟写盘：标记脏位，由后台任务合并写入
+        self._dirty = False
+        self._wake = asyncio.Event()
+        self._flush_task: Optional[asyncio.Task] = None
+        
+        # 状态版本号，用于缓存状态摘要
+        self._state_version = 0
+        self._summary_cache: Optional[Tuple[int, str]] = None
         
         # 头像存储目录
         self.avatar_dir = self.data_dir / "avatars"
@@ -66,9 +196,10 @@ class AutoProfileUpdater:
     
     def _load_state(self) -> Dict:
         """加载状态"""
-        import json
         if self.state_file.exists():
             try:
+                if ORJSON_AVAILABLE:
+                    return orjson.loads(self.state_file.read_bytes())
                 with open(self.state_file, 'r', encoding='utf-8') as f:
                     return json.load(f)
             except Exception as e:
@@ -83,31 +214,87 @@ class AutoProfileUpdater:
             "emotion_history": []
         }
     
-    def _save_state(self):
-        """保存状态"""
-        import json
+    def _snapshot_state(self) -> Dict:
+        """在事件循环线程中复制一份待写盘的状态"""
+        return {**self.state, "emotion_history": list(self.emotion_history)}
+    
+    def _write_state(self, data: Dict) -> bool:
+        """将状态写入文件（写临时文件后原子替换），可在线程中执行"""
         try:
-            with open(self.state_file, 'w', encoding='utf-8') as f:
-                json.dump(self.state, f, ensure_ascii=False, indent=2)
+            tmp_file = self.state_file.with_suffix(".tmp")
+            if ORJSON_AVAILABLE:
+                tmp_file.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+            else:
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, self.state_file)
+            return True
         except Exception as e:
             logger.error(f"[Profile更新器] 保存状态失败: {e}")
+            return False
     
-    def _can_update(self, update_type: str) -> bool:
+    def _save_state(self):
+        """同步保存状态"""
+        self._dirty = False
+        if not self._write_state(self._snapshot_state()):
+            self._dirty = True
+    
+    async def _save_state_async(self):
+        """在线程中保存状态，避免阻塞事件循环"""
+        data = self._snapshot_state()
+        self._dirty = False
+        if not await asyncio.to_thread(self._write_state, data):
+            self._dirty = True
+    
+    def _mark_dirty(self):
+        """标记状态已修改，由后台任务在 FLUSH_DELAY 秒内合并写盘"""
+        self._dirty = True
+        self._state_version += 1
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # 没有运行中的事件循环，直接同步写入
+            self._save_state()
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+        self._wake.set()
+    
+    async def _flush_loop(self):
+        """后台写盘循环"""
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            await asyncio.sleep(self.FLUSH_DELAY)
+            if self._dirty:
+                await self._save_state_async()
+    
+    def stop(self):
+        """停止后台写盘任务并立即保存未写入的状态"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self._dirty:
+            self._save_state()
+    
+    def _can_update(self, update_type: str, current_time: Optional[float] = None) -> bool:
         """检查是否可以更新
         
         Args:
             update_type: 更新类型 (nickname/signature/avatar)
+            current_time: 当前时间戳，调用方已取时间时传入以复用
             
         Returns:
             是否可以更新
         """
-        last_update_key = f"last_{update_type}_update"
-        last_update = self.state.get(last_update_key, 0)
-        current_time = time.time()
+        last_update = self.state.get(_UPDATE_KEYS[update_type], 0)
+        if current_time is None:
+            current_time = time.time()
         
         if current_time - last_update < self.cooldown:
-            remaining = int(self.cooldown - (current_time - last_update))
-            logger.debug(f"[Profile更新器] {update_type}更新冷却中，还需{remaining}秒")
+            if logger.isEnabledFor(logging.DEBUG):
+                remaining = int(self.cooldown - (current_time - last_update))
+                logger.debug(f"[Profile更新器] {update_type}更新冷却中，还需{remaining}秒")
             return False
         
         return True
@@ -118,9 +305,8 @@ class AutoProfileUpdater:
         Args:
             update_type: 更新类型
         """
-        last_update_key = f"last_{update_type}_update"
-        self.state[last_update_key] = time.time()
-        self._save_state()
+        self.state[_UPDATE_KEYS[update_type]] = time.time()
+        self._mark_dirty()
     
     async def _generate_nickname(self, emotion: str, intensity: float, llm_action=None, context_data: str = "") -> str:
         """生成基于情绪、人设和上下文的昵称
@@ -163,22 +349,7 @@ class AutoProfileUpdater:
                 logger.warning(f"[Profile更新器] 通过LLM生成昵称失败: {e}，使用默认逻辑")
         
         # 如果LLM不可用或生成失败，使用备用逻辑
-        # 情绪昵称映射
-        emotion_nicknames = {
-            "开心": ["开心小助手", "阳光助手", "快乐AI"],
-            "悲伤": ["沉思者", "安静的AI", "温柔助手"],
-            "生气": ["严肃助手", "认真AI", "冷静者"],
-            "兴奋": ["活力助手", "热情AI", "兴奋小助手"],
-            "平静": ["宁静助手", "淡然AI", "平和助手"],
-            "困惑": ["思考者", "探索AI", "求知助手"],
-            "无聊": ["慵懒助手", "悠闲AI", "慢节奏助手"],
-            "好奇": ["探索者", "好奇AI", "发现助手"],
-            "惊讶": ["惊叹助手", "惊喜AI", "新奇助手"],
-            "焦虑": ["缓压助手", "安心AI", "放松助手"]
-        }
-        
-        import random
-        possible_nicknames = emotion_nicknames.get(emotion, [self.persona_name])
+        possible_nicknames = _EMOTION_NICKNAMES.get(emotion, (self.persona_name,))
         base_nickname = random.choice(possible_nicknames)
         
         # 根据强度调整昵称
@@ -200,63 +371,7 @@ class AutoProfileUpdater:
         Returns:
             新签名
         """
-        # 情绪签名模板
-        emotion_templates = {
-            "开心": [
-                "今天心情超好！✨",
-                "开心的一天～😊",
-                "生活真美好 🌟"
-            ],
-            "悲伤": [
-                "有点想静静...",
-                "心情有些低落 💔",
-                "今天不太开心呢"
-            ],
-            "生气": [
-                "有点不开心...",
-                "需要冷静一下 💢",
-                "心情不太美丽"
-            ],
-            "兴奋": [
-                "超级兴奋！🎉",
-                "太棒了！！",
-                "开心到飞起～⭐"
-            ],
-            "平静": [
-                "安静地度过每一天 🌸",
-                "岁月静好～",
-                "平平淡淡才是真"
-            ],
-            "困惑": [
-                "有点搞不懂...",
-                "迷糊中 🤔",
-                "需要思考一下"
-            ],
-            "无聊": [
-                "好无聊啊...",
-                "无所事事中 😴",
-                "找点事情做吧"
-            ],
-            "好奇": [
-                "探索世界中 🔍",
-                "对一切充满好奇～",
-                "想知道更多！"
-            ],
-            "惊讶": [
-                "哇！太惊讶了！",
-                "没想到啊 😲",
-                "出乎意料！"
-            ],
-            "焦虑": [
-                "有点焦虑...",
-                "需要放松一下 💫",
-                "深呼吸～"
-            ]
-        }
-        
-        templates = emotion_templates.get(emotion, ["保持微笑～"])
-        import random
-        signature = random.choice(templates)
+        signature = next(self._template_cycles.get(emotion, self._default_template_cycle))
         
         # 添加时间戳
         now = datetime.now()
@@ -290,24 +405,24 @@ class AutoProfileUpdater:
         
         # 检查情绪强度是否达到阈值
         if intensity < self.threshold:
-            logger.debug(f"[Profile更新器] 情绪强度{intensity:.2f}未达到阈值{self.threshold}")
+            logger.debug("[Profile更新器] 情绪强度%.2f未达到阈值%s", intensity, self.threshold)
             return result
         
-        logger.info(f"[Profile更新器] 检测到强情绪: {emotion} (强度: {intensity:.2f})")
+        logger.info("[Profile更新器] 检测到强情绪: %s (强度: %.2f)", emotion, intensity)
+        
+        now = time.time()
         
         # 记录情绪历史
-        self.state["emotion_history"].append({
+        self.emotion_history.append({
             "emotion": emotion,
             "intensity": intensity,
-            "timestamp": time.time()
+            "timestamp": now
         })
-        # 只保留最近10条
-        self.state["emotion_history"] = self.state["emotion_history"][-10:]
-        self._save_state()
+        self._mark_dirty()
         
         try:
             # 更新昵称
-            if self.enable_nickname and self._can_update("nickname"):
+            if self.enable_nickname and self._can_update("nickname", now):
                 # 生成上下文数据用于昵称生成
                 context_data = f"情绪: {emotion}, 强度: {intensity}, 人设: {self.persona_name}"
                 new_nickname = await self._generate_nickname(emotion, intensity, llm_action=llm_action, context_data=context_data)
@@ -316,23 +431,23 @@ class AutoProfileUpdater:
                     self.state["current_nickname"] = new_nickname
                     self._record_update("nickname")
                     result["nickname"] = True
-                    logger.info(f"[Profile更新器] 昵称已更新为: {new_nickname}")
+                    logger.info("[Profile更新器] 昵称已更新为: %s", new_nickname)
             
             # 更新签名
-            if self.enable_signature and self._can_update("signature"):
+            if self.enable_signature and self._can_update("signature", now):
                 new_signature = self._generate_signature(emotion, intensity)
                 if new_signature != self.state.get("current_signature"):
                     await event.bot.set_self_longnick(longNick=new_signature)
                     self.state["current_signature"] = new_signature
                     self._record_update("signature")
                     result["signature"] = True
-                    logger.info(f"[Profile更新器] 签名已更新为: {new_signature}")
+                    logger.info("[Profile更新器] 签名已更新为: %s", new_signature)
             
             # 更新头像
-            if self.enable_avatar and self._can_update("avatar") and llm_action:
+            if self.enable_avatar and self._can_update("avatar", now) and llm_action:
                 # 生成情绪对应的头像提示词
                 avatar_prompt = self._generate_avatar_prompt(emotion, intensity)
-                logger.info(f"[Profile更新器] 开始生成头像，提示词: {avatar_prompt}")
+                logger.info("[Profile更新器] 开始生成头像，提示词: %s", avatar_prompt)
                 
                 # 使用LLM生成头像
                 image_url = await llm_action.generate_image(avatar_prompt)
@@ -341,11 +456,11 @@ class AutoProfileUpdater:
                     await event.bot.set_qq_avatar(file=image_url)
                     self._record_update("avatar")
                     result["avatar"] = True
-                    logger.info(f"[Profile更新器] 头像已更新")
+                    logger.info("[Profile更新器] 头像已更新")
                     
                     # 保存头像URL到状态
                     self.state["last_avatar_url"] = image_url
-                    self._save_state()
+                    self._mark_dirty()
         
         except Exception as e:
             logger.error(f"[Profile更新器] 更新失败: {e}", exc_info=True)
@@ -362,21 +477,7 @@ class AutoProfileUpdater:
         Returns:
             绘画提示词
         """
-        # 情绪表情映射
-        emotion_expressions = {
-            "开心": "开心微笑的表情",
-            "悲伤": "略带悲伤的表情",
-            "生气": "生气的表情",
-            "兴奋": "兴奋激动的表情",
-            "平静": "平静淡定的表情",
-            "困惑": "困惑疑惑的表情",
-            "无聊": "无聊慵懒的表情",
-            "好奇": "好奇的表情",
-            "惊讶": "惊讶的表情",
-            "焦虑": "焦虑不安的表情"
-        }
-        
-        expression = emotion_expressions.get(emotion, "自然的表情")
+        expression = _EMOTION_EXPRESSIONS.get(emotion, "自然的表情")
         
         # 根据强度调整描述
         intensity_desc = ""
@@ -395,6 +496,9 @@ class AutoProfileUpdater:
         Returns:
             状态摘要文本
         """
+        if self._summary_cache and self._summary_cache[0] == self._state_version:
+            return self._summary_cache[1]
+        
         summary = "【Profile自动更新状态】\n\n"
         
         summary += f"昵称更新: {'✓ 启用' if self.enable_nickname else '✗ 禁用'}\n"
@@ -408,13 +512,15 @@ class AutoProfileUpdater:
         summary += f"\n头像更新: {'✓ 启用' if self.enable_avatar else '✗ 禁用'}\n"
         
         # 情绪历史
-        if self.state.get("emotion_history"):
+        if self.emotion_history:
             summary += "\n最近情绪记录:\n"
-            for record in self.state["emotion_history"][-5:]:
+            fromtimestamp = datetime.fromtimestamp
+            for record in list(self.emotion_history)[-5:]:
                 emotion = record.get("emotion", "未知")
                 intensity = record.get("intensity", 0)
                 timestamp = record.get("timestamp", 0)
-                time_str = datetime.fromtimestamp(timestamp).strftime("%m-%d %H:%M")
+                time_str = fromtimestamp(timestamp).strftime("%m-%d %H:%M")
                 summary += f"  • {time_str} - {emotion} (强度: {intensity:.2f})\n"
         
+        self._summary_cache = (self._state_version, summary)
         return summary
@@ -3,13 +3,32 @@
 经历累积和关系网络管理
 记录所有对话、事件和用户互动模式，形成持续性记忆银行
 """
+import atexit
+import heapq
 import json
-from datetime import datetime, timedelta
+import mmap
+import os
+import queue
+import threading
+import time
+from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, List, Any
-from collections import defaultdict
+from typing import Optional, Dict, List, Any, BinaryIO, Iterator
+from collections import Counter, deque
 from astrbot.api import logger
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
 try:
     from .timeline_verifier import TimelineVerifier
     TIMELINE_AVAILABLE = True
@@ -18,15 +37,150 @@ except ImportError:
     logger.warning("[经历银行] TimelineVerifier 未找到，时间线验证功能将被禁用")
 
 
+def _json_default(obj: Any) -> Any:
+    """序列化内存结构中的非 JSON 原生类型"""
+    if isinstance(obj, deque):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def _dumps_line(record: Any) -> bytes:
+    """序列化为一行 JSONL（UTF-8 字节，含换行）"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(record, default=_json_default, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(record, ensure_ascii=False, default=_json_default) + "\n").encode("utf-8")
+
+
+def _dumps_pretty(data: Any) -> bytes:
+    """序列化为缩进格式的 JSON（UTF-8 字节）"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data, default=_json_default, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, ensure_ascii=False, indent=2, default=_json_default).encode("utf-8")
+
+
+def _loads(data) -> Any:
+    """解析 JSON 文本或字节"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# 元素数不少于该值时才用 NumPy 计算（小数组的转换开销高于纯 Python 循环）
+_NUMPY_MIN_SIZE = 64
+
+
+def _diff(values: List[float]) -> List[float]:
+    """相邻元素之差"""
+    if NUMPY_AVAILABLE and len(values) >= _NUMPY_MIN_SIZE:
+        return np.diff(np.fromiter(values, dtype=np.float64, count=len(values))).tolist()
+    return [b - a for a, b in zip(values, values[1:])]
+
+
+def _mean(values: List[float]) -> float:
+    """平均值（空列表返回 0）"""
+    if not values:
+        return 0.0
+    if NUMPY_AVAILABLE and len(values) >= _NUMPY_MIN_SIZE:
+        return float(np.mean(np.fromiter(values, dtype=np.float64, count=len(values))))
+    return sum(values) / len(values)
+
+
+def _epoch(record: Dict[str, Any], *keys: str, default: Optional[float] = None) -> float:
+    """记录的 POSIX 时间戳：优先使用写入时保存的 ts_epoch，旧记录再解析 ISO 时间字段"""
+    ts = record.get("ts_epoch")
+    if ts is not None:
+        return ts
+    for key in keys:
+        value = record.get(key)
+        if value:
+            return datetime.fromisoformat(value).timestamp()
+    if default is None:
+        raise ValueError(f"记录缺少时间字段: {keys}")
+    return default
+
+
+_USER_ID_KEY = b'"user_id":'
+
+
+def _find_user_id(buf, start: int, end: int) -> Optional[str]:
+    """在 buf[start:end] 这一行 JSONL 中直接定位并解析 user_id 字段，无需解析整行
+    
+    行内文本中的引号都已转义，因此第一个 "user_id": 一定是键本身。
+    """
+    hit = buf.find(_USER_ID_KEY, start, end)
+    if hit == -1:
+        return None
+    value_start = hit + len(_USER_ID_KEY)
+    while value_start < end and buf[value_start] in b" \t":
+        value_start += 1
+    if buf[value_start:value_start + 1] != b'"':
+        # 非字符串值（如 null），退回整行解析
+        try:
+            user_id = _loads(buf[start:end]).get("user_id")
+        except Exception:
+            return None
+        return user_id if isinstance(user_id, str) else None
+    quote = buf.find(b'"', value_start + 1, end)
+    # 跳过被反斜杠转义的引号
+    while quote != -1:
+        backslashes = 0
+        while buf[quote - 1 - backslashes] == 0x5C:
+            backslashes += 1
+        if backslashes % 2 == 0:
+            break
+        quote = buf.find(b'"', quote + 1, end)
+    if quote == -1:
+        return None
+    try:
+        return _loads(buf[value_start:quote + 1])
+    except Exception:
+        return None
+
+
+def _fold_promises(records) -> List[Dict[str, Any]]:
+    """按顺序折叠承诺日志：完成操作作用于其之前所有匹配关键词的承诺"""
+    promises = []
+    for record in records:
+        if record.get("op") != "complete":
+            promises.append(record)
+            continue
+        keyword = record.get("keyword", "").lower()
+        for promise in promises:
+            if keyword in promise.get("promise", "").lower():
+                promise["status"] = "completed"
+                promise["completed_at"] = record.get("at")
+                if record.get("note"):
+                    promise["completion_note"] = record["note"]
+    return promises
+
+
+# 后台写线程的控制标记
+_FLUSH = object()
+_STOP = object()
+_REPLACE = object()
+
+
 class ExperienceBank:
     """经历累积银行"""
     
-    def __init__(self, data_dir: Path, enable_timeline_verification: bool = True):
+    # JSONL 日志写缓冲大小（字节）
+    LOG_BUFFER_SIZE = 1 << 16
+    # 关系网络增量日志累积到该条数时写一次完整快照
+    RELATIONSHIP_CHECKPOINT_DELTAS = 200
+    # 成长轨迹变更后延迟写盘的秒数（期间的多次更新合并为一次写入）
+    GROWTH_FLUSH_DELAY = 5
+    # 承诺日志中的完成操作条数达到承诺条数（且不少于该值）时压缩日志
+    PROMISE_COMPACT_MIN_OPS = 32
+    
+    def __init__(self, data_dir: Path, enable_timeline_verification: bool = True,
+                 batch_size: int = 256, flush_interval_ms: int = 10):
         """初始化经历银行
         
         Args:
             data_dir: 数据目录
             enable_timeline_verification: 是否启用时间线验证
+            batch_size: 后台写线程单批最多合并的记录数
+            flush_interval_ms: 后台写线程等待凑批的最长时间（毫秒）
         """
         self.data_dir = data_dir
         self.data_dir.mkdir(parents=True, exist_ok=True)
@@ -37,8 +191,27 @@ class ExperienceBank:
         self.events_file = self.data_dir / "events.jsonl"
         # 成长轨迹文件
         self.growth_file = self.data_dir / "growth.json"
-        # 关系网络文件
+        # 关系网络文件（快照）及其增量日志
         self.relationships_file = self.data_dir / "relationships.json"
+        self.relationships_delta_file = self.data_dir / "relationships.delta.jsonl"
+        # 长期项目、承诺、生物钟、场景人格记录文件
+        self.projects_file = self.data_dir / "projects.jsonl"
+        self.promises_file = self.data_dir / "promises.jsonl"
+        self.circadian_file = self.data_dir / "circadian.jsonl"
+        self.personality_file = self.data_dir / "personalities.jsonl"
+        # 对话记录的用户偏移索引（user_id -> 行起始偏移），首次查询时加载或重建
+        self.conversations_index_file = self.data_dir / "conversations.idx"
+        self._user_offsets: Optional[Dict[str, List[int]]] = None
+        self._index_lock = threading.Lock()
+        
+        # JSONL 追加写：记录放入队列，由后台线程批量写入常驻句柄并刷盘
+        self._log_handles: Dict[Path, BinaryIO] = {}
+        self._write_queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval_ms / 1000
+        atexit.register(self.close)
         
         # 初始化时间线验证器
         self.timeline_verifier = None
@@ -50,23 +223,245 @@ class ExperienceBank:
                 logger.error(f"[经历银行] 启用时间线验证器失败: {e}")
         
         self._init_data_files()
+        
+        # 内存中的关系网络：启动时加载快照并重放增量日志
+        self._state_lock = threading.RLock()
+        self._relationship_deltas = 0
+        self._relationships: Dict[str, Dict[str, Any]] = self._load_relationships()
+        
+        # 内存中的成长轨迹：更新只改缓存并标记为脏，延迟合并写盘
+        self._growth: Dict[str, Any] = self._load_growth()
+        self._growth_dirty = False
+        self._growth_timer: Optional[threading.Timer] = None
+        # 排名前5的技能缓存，技能等级变化时失效
+        self._top_skills: Optional[List[str]] = None
+        
+        # 承诺日志状态：承诺文本（小写，用于匹配完成关键词）与完成操作条数，首次使用时加载
+        self._promise_texts: Optional[List[str]] = None
+        self._promise_ops = 0
+        
+        # 各场景最新的人格表现：context_type -> 记录
+        self._latest_personality_by_context: Dict[str, Dict[str, Any]] = self._load_personalities()
     
     def _init_data_files(self):
         """初始化数据文件"""
         for file_path in [self.conversations_file, self.events_file]:
             if not file_path.exists():
-                file_path.write_text("", encoding='utf-8')
+                file_path.write_bytes(b"")
         
         if not self.growth_file.exists():
-            self.growth_file.write_text(json.dumps({
+            self.growth_file.write_bytes(_dumps_pretty({
                 "skills": {},
                 "interests": [],
                 "views": [],
                 "updated_at": datetime.now().isoformat()
-            }, ensure_ascii=False, indent=2), encoding='utf-8')
+            }))
         
         if not self.relationships_file.exists():
-            self.relationships_file.write_text(json.dumps({}, ensure_ascii=False, indent=2), encoding='utf-8')
+            self.relationships_file.write_bytes(_dumps_pretty({}))
+    
+    def _append_record(self, path: Path, record: Dict[str, Any], index_key: Optional[str] = None):
+        """追加一条记录到 JSONL 日志（交给后台写线程），index_key 用于对话偏移索引"""
+        self._ensure_writer()
+        self._write_queue.put((path, _dumps_line(record), index_key))
+    
+    def _ensure_writer(self):
+        """确保后台写线程正在运行"""
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(
+                    target=self._writer_loop, name="ExperienceBankWriter", daemon=True
+                )
+                self._writer.start()
+    
+    def _writer_loop(self):
+        """后台写线程：攒批后每个文件只做一次 write + fsync"""
+        write_queue = self._write_queue
+        while True:
+            batch = [write_queue.get()]
+            deadline = time.monotonic() + self._flush_interval
+            # 队列中的标记（刷新/停止）表示本批结束，立即写出
+            while len(batch) < self._batch_size and batch[-1][0] not in (_FLUSH, _STOP):
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(write_queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            if self._write_batch(batch):
+                return
+    
+    def _write_batch(self, batch: List[tuple]) -> bool:
+        """按顺序写出一批记录，返回是否收到停止标记"""
+        chunks: Dict[Path, List[bytes]] = {}
+        waiters = []
+        stop = False
+        for target, payload, index_key in batch:
+            if target is _FLUSH:
+                waiters.append(payload)
+            elif target is _STOP:
+                waiters.append(payload)
+                stop = True
+            elif target is _REPLACE:
+                # 替换整个文件前先写出之前排队的追加记录，保证顺序
+                self._write_chunks(chunks)
+                chunks = {}
+                self._replace_file(*payload)
+            else:
+                chunks.setdefault(target, []).append((payload, index_key))
+        
+        self._write_chunks(chunks)
+        for waiter in waiters:
+            waiter.set()
+        return stop
+    
+    def _write_chunks(self, chunks: Dict[Path, List[tuple]]):
+        """每个文件一次 write + fsync"""
+        for path, entries in chunks.items():
+            try:
+                fh = self._log_handles.get(path)
+                if fh is None:
+                    fh = self._log_handles[path] = open(path, 'ab', buffering=self.LOG_BUFFER_SIZE)
+                data = b"".join(line for line, _ in entries)
+                if path == self.conversations_file:
+                    # 写入与索引更新在同一把锁内，重建索引时不会看到写了一半的数据
+                    with self._index_lock:
+                        offset = fh.tell()
+                        fh.write(data)
+                        fh.flush()
+                        if self._user_offsets is not None:
+                            for line, key in entries:
+                                if key is not None:
+                                    self._user_offsets.setdefault(key, []).append(offset)
+                                offset += len(line)
+                else:
+                    fh.write(data)
+                    fh.flush()
+                os.fsync(fh.fileno())
+            except Exception as e:
+                logger.error(f"[经历银行] 写入日志失败 {path.name}: {e}")
+    
+    def _replace_file(self, path: Path, data: bytes, truncate: Optional[Path] = None):
+        """原子替换文件内容，并可选地清空一个日志文件"""
+        try:
+            tmp_path = path.with_suffix(path.suffix + ".tmp")
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+            # 旧的追加句柄仍指向被替换掉的文件，需关闭后重新打开
+            fh = self._log_handles.pop(path, None)
+            if fh is not None:
+                fh.close()
+            if truncate is not None:
+                fh = self._log_handles.pop(truncate, None)
+                if fh is not None:
+                    fh.close()
+                open(truncate, 'wb').close()
+        except Exception as e:
+            logger.error(f"[经历银行] 写入文件失败 {path.name}: {e}")
+    
+    def flush(self):
+        """写出脏的缓存数据，并等待队列中的记录全部写入磁盘，读取日志文件前调用"""
+        self._flush_growth()
+        writer = self._writer
+        if writer is None or not writer.is_alive():
+            return
+        done = threading.Event()
+        self._write_queue.put((_FLUSH, done, None))
+        if not done.wait(timeout=10):
+            logger.warning("[经历银行] 等待日志写入超时")
+    
+    def close(self):
+        """写完队列中的记录，停止后台写线程并关闭日志句柄"""
+        atexit.unregister(self.close)
+        self._flush_growth()
+        if self._relationship_deltas:
+            self._checkpoint_relationships()
+        with self._writer_lock:
+            writer = self._writer
+            self._writer = None
+        if writer is not None and writer.is_alive():
+            done = threading.Event()
+            self._write_queue.put((_STOP, done, None))
+            writer.join(timeout=10)
+        for fh in self._log_handles.values():
+            try:
+                fh.close()
+            except Exception as e:
+                logger.error(f"[经历银行] 关闭日志失败: {e}")
+        self._log_handles.clear()
+        self._save_conversation_index()
+        if self.timeline_verifier:
+            self.timeline_verifier.close()
+    
+    def _load_conversation_index(self) -> Dict[str, List[int]]:
+        """加载对话偏移索引；索引缺失或与对话文件大小不一致时重建"""
+        with self._index_lock:
+            if self._user_offsets is not None:
+                return self._user_offsets
+            
+            size = self.conversations_file.stat().st_size if self.conversations_file.exists() else 0
+            try:
+                if self.conversations_index_file.exists():
+                    index = _loads(self.conversations_index_file.read_bytes())
+                    if index.get("size") == size:
+                        self._user_offsets = index["offsets"]
+                        return self._user_offsets
+            except Exception as e:
+                logger.warning(f"[经历银行] 加载对话索引失败，将重建: {e}")
+            
+            self._user_offsets = self._build_conversation_index()
+            logger.info(f"[经历银行] 已重建对话索引，共 {len(self._user_offsets)} 个用户")
+            return self._user_offsets
+    
+    def _build_conversation_index(self) -> Dict[str, List[int]]:
+        """内存映射对话文件并线性扫描一次，生成用户偏移索引（只解析 user_id 字段）"""
+        offsets: Dict[str, List[int]] = {}
+        if not self.conversations_file.exists() or self.conversations_file.stat().st_size == 0:
+            return offsets
+        with open(self.conversations_file, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                size = len(mm)
+                pos = 0
+                while pos < size:
+                    end = mm.find(b"\n", pos)
+                    if end == -1:
+                        end = size
+                    user_id = _find_user_id(mm, pos, end)
+                    if user_id is not None:
+                        offsets.setdefault(user_id, []).append(pos)
+                    pos = end + 1
+        return offsets
+    
+    def _save_conversation_index(self):
+        """持久化对话偏移索引（记录对应的对话文件大小，用于下次启动时校验）"""
+        with self._index_lock:
+            if self._user_offsets is None:
+                return
+            try:
+                size = self.conversations_file.stat().st_size if self.conversations_file.exists() else 0
+                self.conversations_index_file.write_bytes(
+                    _dumps_line({"size": size, "offsets": self._user_offsets})
+                )
+            except Exception as e:
+                logger.error(f"[经历银行] 保存对话索引失败: {e}")
+    
+    def _read_user_conversations(self, user_id: str) -> List[Dict[str, Any]]:
+        """按偏移索引读取某个用户的全部对话记录"""
+        self.flush()
+        index = self._load_conversation_index()
+        with self._index_lock:
+            offsets = list(index.get(user_id, ()))
+        
+        conversations = []
+        with open(self.conversations_file, 'rb') as f:
+            for offset in offsets:
+                f.seek(offset)
+                conversations.append(_loads(f.readline()))
+        return conversations
     
     def record_conversation(self, user_id: str, user_message: str, bot_response: str, session_id: Optional[str] = None):
         """
@@ -79,9 +474,11 @@ class ExperienceBank:
             session_id: 会话ID
         """
         try:
+            now = datetime.now()
             record = {
-                "timestamp": datetime.now().isoformat(),
-                "date": datetime.now().strftime("%Y-%m-%d"),
+                "timestamp": now.isoformat(),
+                "ts_epoch": now.timestamp(),
+                "date": now.strftime("%Y-%m-%d"),
                 "user_id": user_id,
                 "session_id": session_id,
                 "user_message": user_message,
@@ -90,12 +487,12 @@ class ExperienceBank:
                 "response_length": len(bot_response)
             }
             
-            with open(self.conversations_file, 'a', encoding='utf-8') as f:
-                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._append_record(self.conversations_file, record, index_key=user_id)
             
             # 更新关系网络
             self._update_relationship(user_id, {
-                "last_chat": datetime.now().isoformat(),
+                "last_chat": now.isoformat(),
+                "ts_epoch": now.timestamp(),
                 "interaction_type": "conversation"
             })
             
@@ -115,17 +512,18 @@ class ExperienceBank:
             metadata: 其他元数据
         """
         try:
+            now = datetime.now()
             record = {
-                "timestamp": datetime.now().isoformat(),
-                "date": datetime.now().strftime("%Y-%m-%d"),
+                "timestamp": now.isoformat(),
+                "ts_epoch": now.timestamp(),
+                "date": now.strftime("%Y-%m-%d"),
                 "event_type": event_type,
                 "description": description,
                 "related_user_id": related_user_id,
                 "metadata": metadata or {}
             }
             
-            with open(self.events_file, 'a', encoding='utf-8') as f:
-                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._append_record(self.events_file, record)
             
             logger.info(f"[经历银行] 事件已记录: {event_type}")
             
@@ -143,125 +541,196 @@ class ExperienceBank:
             validate_smoothness: 是否验证成长平滑性
         """
         try:
-            with open(self.growth_file, 'r', encoding='utf-8') as f:
-                growth_data = json.load(f)
-            
-            if growth_type == "skills":
-                # 技能升级平滑性验证
-                if item in growth_data["skills"] and level and validate_smoothness:
-                    old_level = growth_data["skills"][item].get("level", 1)
-                    level_jump = abs(level - old_level)
+            now = datetime.now()
+            now_iso = now.isoformat()
+            with self._state_lock:
+                growth_data = self._growth
+                
+                if growth_type == "skills":
+                    # 技能升级平滑性验证
+                    if item in growth_data["skills"] and level and validate_smoothness:
+                        old_level = growth_data["skills"][item].get("level", 1)
+                        level_jump = abs(level - old_level)
+                
+                        # 平滑性检查：等级变化不应超过3级
+                        if level_jump > 3:
+                            logger.warning(f"[经历银行] 技能等级变化过大: {item} {old_level}->{level}，调整为渐进式提升")
+                            # 调整为渐进升级
+                            level = old_level + min(3, level_jump if level > old_level else -3)
+                
+                    if item not in growth_data["skills"]:
+                        growth_data["skills"][item] = {
+                            "level": 1,
+                            "first_learned": now_iso,
+                            "last_used": now_iso,
+                            "growth_history": []  # 成长历史
+                        }
+                    else:
+                        if level:
+                            # 记录成长历史
+                            growth_data["skills"][item].setdefault("growth_history", []).append({
+                                "from_level": growth_data["skills"][item]["level"],
+                                "to_level": level,
+                                "changed_at": now_iso
+                            })
+                            growth_data["skills"][item]["level"] = level
+                        growth_data["skills"][item]["last_used"] = now_iso
                     
-                    # 平滑性检查：等级变化不应超过3级
-                    if level_jump > 3:
-                        logger.warning(f"[经历银行] 技能等级变化过大: {item} {old_level}->{level}，调整为渐进式提升")
-                        # 调整为渐进升级
-                        level = old_level + min(3, level_jump if level > old_level else -3)
+                    self._top_skills = None
                 
-                if item not in growth_data["skills"]:
-                    growth_data["skills"][item] = {
-                        "level": 1,
-                        "first_learned": datetime.now().isoformat(),
-                        "last_used": datetime.now().isoformat(),
-                        "growth_history": []  # 成长历史
-                    }
-                else:
-                    if level:
-                        # 记录成长历史
-                        growth_data["skills"][item].setdefault("growth_history", []).append({
-                            "from_level": growth_data["skills"][item]["level"],
-                            "to_level": level,
-                            "changed_at": datetime.now().isoformat()
+                elif growth_type == "interests":
+                    # 检查是否已存在
+                    existing_interests = [i.get("item") for i in growth_data["interests"]]
+                    if item not in existing_interests:
+                        growth_data["interests"].append({
+                            "item": item,
+                            "discovered_at": now_iso
                         })
-                        growth_data["skills"][item]["level"] = level
-                    growth_data["skills"][item]["last_used"] = datetime.now().isoformat()
-            
-            elif growth_type == "interests":
-                # 检查是否已存在
-                existing_interests = [i.get("item") for i in growth_data["interests"]]
-                if item not in existing_interests:
-                    growth_data["interests"].append({
-                        "item": item,
-                        "discovered_at": datetime.now().isoformat()
+                        logger.info(f"[经历银行] 新兴趣已添加: {item}")
+                
+                elif growth_type == "views":
+                    # 观点平滑性检查：避免短期内添加相反观点
+                    if validate_smoothness and growth_data["views"]:
+                        recent_views = growth_data["views"][-5:]  # 最近5个观点
+                        now_epoch = now.timestamp()
+                        for recent in recent_views:
+                            # 简单检查时间间隔（至少间7天）
+                            formed_at = _epoch(recent, "formed_at", default=now_epoch)
+                            if now_epoch - formed_at < 7 * 86400:
+                                logger.debug(f"[经历银行] 观点添加频繁，建议间隔至少7天")
+                
+                    growth_data["views"].append({
+                        "view": item,
+                        "formed_at": now_iso,
+                        "ts_epoch": now.timestamp()
                     })
-                    logger.info(f"[经历银行] 新兴趣已添加: {item}")
-            
-            elif growth_type == "views":
-                # 观点平滑性检查：避免短期内添加相反观点
-                if validate_smoothness and growth_data["views"]:
-                    recent_views = growth_data["views"][-5:]  # 最近5个观点
-                    for recent in recent_views:
-                        # 简单检查时间间隔（至少间7天）
-                        formed_at = datetime.fromisoformat(recent.get("formed_at", datetime.now().isoformat()))
-                        if (datetime.now() - formed_at) < timedelta(days=7):
-                            logger.debug(f"[经历银行] 观点添加频繁，建议间隔至少7天")
                 
-                growth_data["views"].append({
-                    "view": item,
-                    "formed_at": datetime.now().isoformat()
-                })
-            
-            growth_data["updated_at"] = datetime.now().isoformat()
-            
-            with open(self.growth_file, 'w', encoding='utf-8') as f:
-                json.dump(growth_data, f, ensure_ascii=False, indent=2)
+                growth_data["updated_at"] = now_iso
+                
+                self._mark_growth_dirty()
             
             logger.info(f"[经历银行] 成长轨迹已更新: {growth_type} - {item}")
             
         except Exception as e:
             logger.error(f"[经历银行] 更新成长失败: {e}")
     
+    def _load_growth(self) -> Dict[str, Any]:
+        """加载成长轨迹"""
+        try:
+            return _loads(self.growth_file.read_bytes())
+        except Exception as e:
+            logger.error(f"[经历银行] 加载成长轨迹失败: {e}")
+            return {"skills": {}, "interests": [], "views": [], "updated_at": datetime.now().isoformat()}
+    
+    def _mark_growth_dirty(self):
+        """标记成长轨迹已变更，延迟 GROWTH_FLUSH_DELAY 秒后写盘"""
+        with self._state_lock:
+            self._growth_dirty = True
+            if self._growth_timer is None:
+                self._growth_timer = threading.Timer(self.GROWTH_FLUSH_DELAY, self._flush_growth)
+                self._growth_timer.daemon = True
+                self._growth_timer.start()
+    
+    def _flush_growth(self):
+        """若成长轨迹有变更，交给后台写线程原子替换 growth.json"""
+        with self._state_lock:
+            if self._growth_timer is not None:
+                self._growth_timer.cancel()
+                self._growth_timer = None
+            if not self._growth_dirty:
+                return
+            data = _dumps_pretty(self._growth)
+            self._growth_dirty = False
+            self._ensure_writer()
+            self._write_queue.put((_REPLACE, (self.growth_file, data), None))
+    
+    def _load_relationships(self) -> Dict[str, Dict[str, Any]]:
+        """加载关系网络快照并重放增量日志"""
+        relationships = {}
+        try:
+            relationships = _loads(self.relationships_file.read_bytes())
+        except Exception as e:
+            logger.error(f"[经历银行] 加载关系网络失败: {e}")
+        
+        if self.relationships_delta_file.exists():
+            with open(self.relationships_delta_file, 'rb') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        delta = _loads(line)
+                    except Exception:
+                        # 进程中断时可能留下不完整的最后一行
+                        logger.warning("[经历银行] 跳过损坏的关系网络增量记录")
+                        continue
+                    relationships[delta["uid"]] = delta["rel"]
+                    self._relationship_deltas += 1
+        
+        # 互动模式计数使用 Counter（dict 子类，可直接序列化），最近互动使用定长 deque
+        for rel in relationships.values():
+            rel["interaction_patterns"] = Counter(rel.get("interaction_patterns", {}))
+            rel["last_interactions"] = deque(rel.get("last_interactions", []), maxlen=10)
+        
+        return relationships
+    
+    def _checkpoint_relationships(self):
+        """将内存中的关系网络写为完整快照，并清空增量日志"""
+        with self._state_lock:
+            data = _dumps_pretty(self._relationships)
+            self._relationship_deltas = 0
+            self._ensure_writer()
+            self._write_queue.put((_REPLACE, (self.relationships_file, data, self.relationships_delta_file), None))
+    
     def _update_relationship(self, user_id: str, interaction_data: Dict[str, Any]):
         """
-        更新用户关系网络
+        更新用户关系网络（内存更新 + 追加增量日志）
         
         Args:
             user_id: 用户ID
             interaction_data: 互动数据
         """
         try:
-            with open(self.relationships_file, 'r', encoding='utf-8') as f:
-                relationships = json.load(f)
-            
-            if user_id not in relationships:
-                relationships[user_id] = {
-                    "first_met": datetime.now().isoformat(),
-                    "interaction_count": 0,
-                    "interaction_patterns": defaultdict(int),
-                    "last_interactions": [],
-                    "estimated_personality": {},
-                    "notes": ""
-                }
-            
-            user_rel = relationships[user_id]
-            user_rel["interaction_count"] = user_rel.get("interaction_count", 0) + 1
-            user_rel["last_interactions"].append(interaction_data)
-            
-            # 只保留最近10次互动
-            if len(user_rel["last_interactions"]) > 10:
-                user_rel["last_interactions"] = user_rel["last_interactions"][-10:]
-            
-            # 统计互动模式
-            interaction_type = interaction_data.get("interaction_type", "unknown")
-            if "interaction_patterns" not in user_rel:
-                user_rel["interaction_patterns"] = {}
-            if interaction_type not in user_rel["interaction_patterns"]:
-                user_rel["interaction_patterns"][interaction_type] = 0
-            user_rel["interaction_patterns"][interaction_type] += 1
-            
-            with open(self.relationships_file, 'w', encoding='utf-8') as f:
-                # 转换defaultdict为普通dict以便序列化
-                relationships_serializable = {}
-                for uid, rel in relationships.items():
-                    rel_copy = rel.copy()
-                    if isinstance(rel_copy.get("interaction_patterns"), defaultdict):
-                        rel_copy["interaction_patterns"] = dict(rel_copy["interaction_patterns"])
-                    relationships_serializable[uid] = rel_copy
-                json.dump(relationships_serializable, f, ensure_ascii=False, indent=2)
+            with self._state_lock:
+                relationships = self._relationships
+                
+                if user_id not in relationships:
+                    relationships[user_id] = {
+                        "first_met": datetime.now().isoformat(),
+                        "interaction_count": 0,
+                        "interaction_patterns": Counter(),
+                        "last_interactions": deque(maxlen=10),
+                        "estimated_personality": {},
+                        "notes": ""
+                    }
+                
+                user_rel = relationships[user_id]
+                user_rel["interaction_count"] = user_rel.get("interaction_count", 0) + 1
+                # 只保留最近10次互动（deque 满后自动丢弃最早的一条）
+                user_rel["last_interactions"].append(interaction_data)
+                
+                # 统计互动模式
+                user_rel["interaction_patterns"][interaction_data.get("interaction_type", "unknown")] += 1
+                
+                # 只追加该用户的最新记录，定期再写完整快照
+                self._append_record(self.relationships_delta_file, {"uid": user_id, "rel": user_rel})
+                self._relationship_deltas += 1
+                if self._relationship_deltas >= self.RELATIONSHIP_CHECKPOINT_DELTAS:
+                    self._checkpoint_relationships()
             
         except Exception as e:
             logger.error(f"[经历银行] 更新关系网络失败: {e}")
     
+    def _get_relationship(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """获取某个用户关系记录的副本"""
+        with self._state_lock:
+            user_rel = self._relationships.get(user_id)
+            if user_rel is None:
+                return None
+            user_rel = dict(user_rel)
+            user_rel["interaction_patterns"] = dict(user_rel.get("interaction_patterns", {}))
+            user_rel["last_interactions"] = list(user_rel.get("last_interactions", []))
+            return user_rel
+    
     def get_user_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
         """
         获取用户的综合资料（基于历史互动）
@@ -273,14 +742,10 @@ class ExperienceBank:
             用户资料字典
         """
         try:
-            with open(self.relationships_file, 'r', encoding='utf-8') as f:
-                relationships = json.load(f)
-            
-            if user_id not in relationships:
+            user_rel = self._get_relationship(user_id)
+            if user_rel is None:
                 return None
             
-            user_rel = relationships[user_id]
-            
             # 分析互动模式
             total_interactions = user_rel.get("interaction_count", 0)
             patterns = user_rel.get("interaction_patterns", {})
@@ -333,24 +798,27 @@ class ExperienceBank:
             return "低频"
     
     def _get_top_skills(self, skills: Dict[str, Dict]) -> List[str]:
-        """获取排名前5的技能"""
-        sorted_skills = sorted(skills.items(), key=lambda x: x[1].get("level", 0), reverse=True)
-        return [skill[0] for skill in sorted_skills[:5]]
+        """获取排名前5的技能（结果缓存到技能等级下次变化）"""
+        if self._top_skills is None:
+            # nlargest 与 sorted(...)[:5] 结果一致（等级相同时保持原有顺序），但只需 O(n log 5)
+            top = heapq.nlargest(5, skills.items(), key=lambda x: x[1].get("level", 0))
+            self._top_skills = [skill[0] for skill in top]
+        return list(self._top_skills)
     
     def get_growth_summary(self) -> Dict[str, Any]:
         """获取成长摘要"""
         try:
-            with open(self.growth_file, 'r', encoding='utf-8') as f:
-                growth_data = json.load(f)
-            
-            return {
-                "skills_count": len(growth_data.get("skills", {})),
-                "interests_count": len(growth_data.get("interests", [])),
-                "views_count": len(growth_data.get("views", [])),
-                "top_skills": self._get_top_skills(growth_data.get("skills", {})),
-                "recent_interests": growth_data.get("interests", [])[-5:],
-                "updated_at": growth_data.get("updated_at")
-            }
+            with self._state_lock:
+                growth_data = self._growth
+                
+                return {
+                    "skills_count": len(growth_data.get("skills", {})),
+                    "interests_count": len(growth_data.get("interests", [])),
+                    "views_count": len(growth_data.get("views", [])),
+                    "top_skills": self._get_top_skills(growth_data.get("skills", {})),
+                    "recent_interests": growth_data.get("interests", [])[-5:],
+                    "updated_at": growth_data.get("updated_at")
+                }
             
         except Exception as e:
             logger.error(f"[经历银行] 获取成长摘要失败: {e}")
@@ -373,9 +841,8 @@ class ExperienceBank:
             if not self.conversations_file.exists():
                 return []
             
-            # 收集所有与该用户相关的对话
-            with open(self.conversations_file, 'r', encoding='utf-8') as f:
-                conversations = [json.loads(line) for line in f if json.loads(line).get("user_id") == user_id]
+            # 收集所有与该用户相关的对话（按偏移索引直接定位，不扫描其他用户的记录）
+            conversations = self._read_user_conversations(user_id)
             
             if not conversations:
                 return []
@@ -410,21 +877,25 @@ class ExperienceBank:
             
             # 検测互动频率和较大5倍声泰叨出现（可能是下了好爲气）
             if len(conversations) > 1:
-                avg_interval = (datetime.fromisoformat(conversations[-1]["timestamp"]) - 
-                               datetime.fromisoformat(conversations[0]["timestamp"])).total_seconds() / len(conversations)
+                count = len(conversations)
+                if NUMPY_AVAILABLE and count >= _NUMPY_MIN_SIZE:
+                    # 直接由 ts_epoch 构造数组，间隔与突增位置都在 C 层计算，只遍历命中的少数位置
+                    ts = np.fromiter((_epoch(c, "timestamp") for c in conversations), dtype=np.float64, count=count)
+                    intervals = np.diff(ts)
+                    threshold = (ts[-1] - ts[0]) / count / 5
+                    spikes = [(int(i), float(intervals[i])) for i in np.flatnonzero(intervals < threshold)]
+                else:
+                    epochs = [_epoch(c, "timestamp") for c in conversations]
+                    threshold = (epochs[-1] - epochs[0]) / count / 5
+                    spikes = [(i, interval) for i, interval in enumerate(_diff(epochs)) if interval < threshold]
                 
-                for i in range(1, len(conversations)):
-                    prev_time = datetime.fromisoformat(conversations[i-1]["timestamp"])
-                    curr_time = datetime.fromisoformat(conversations[i]["timestamp"])
-                    interval = (curr_time - prev_time).total_seconds()
-                    
-                    if interval < avg_interval / 5:
-                        milestones.append({
-                            "type": "sudden_frequency_increase",
-                            "timestamp": conversations[i]["timestamp"],
-                            "description": "消息强流（很积急）",
-                            "interval": interval
-                        })
+                for i, interval in spikes:
+                    milestones.append({
+                        "type": "sudden_frequency_increase",
+                        "timestamp": conversations[i + 1]["timestamp"],
+                        "description": "消息强流（很积急）",
+                        "interval": interval
+                    })
             
             # 按时间排序并限制数量
             milestones.sort(key=lambda x: x["timestamp"])
@@ -448,17 +919,10 @@ class ExperienceBank:
             详细的关系特征描述或None
         """
         try:
-            if not self.relationships_file.exists():
+            user_rel = self._get_relationship(user_id)
+            if user_rel is None:
                 return None
             
-            with open(self.relationships_file, 'r', encoding='utf-8') as f:
-                relationships = json.load(f)
-            
-            if user_id not in relationships:
-                return None
-            
-            user_rel = relationships[user_id]
-            
             # 五维性格模弋
             profile = {
                 "user_id": user_id,
@@ -546,13 +1010,14 @@ class ExperienceBank:
             return {"level": "低", "score": 0}
         
         # 计算平均消息长度
-        avg_message_len = sum(i.get("message_length", 0) for i in interactions) / len(interactions)
+        avg_message_len = _mean([i.get("message_length", 0) for i in interactions])
         
         # 计算互动间隔变化
         if len(interactions) > 1:
-            timestamps = [datetime.fromisoformat(i.get("timestamp", "")) for i in interactions]
-            intervals = [(timestamps[i+1] - timestamps[i]).total_seconds() for i in range(len(timestamps)-1)]
-            consistency = 1 - (max(intervals) / max(intervals + [1])) if intervals else 0.5
+            timestamps = [_epoch(i, "timestamp", "last_chat") for i in interactions]
+            intervals = _diff(timestamps)
+            max_interval = max(intervals)
+            consistency = 1 - (max_interval / max(max_interval, 1)) if intervals else 0.5
         else:
             consistency = 0.5
         
@@ -639,20 +1104,18 @@ class ExperienceBank:
             metadata: 其他元数据（进度、年份等）
         """
         try:
+            now = datetime.now()
             record = {
-                "timestamp": datetime.now().isoformat(),
-                "date": datetime.now().strftime("%Y-%m-%d"),
+                "timestamp": now.isoformat(),
+                "ts_epoch": now.timestamp(),
+                "date": now.strftime("%Y-%m-%d"),
                 "project_name": project_name,
                 "description": description,
                 "status": status,
                 "metadata": metadata or {}
             }
             
-            if not hasattr(self, "projects_file"):
-                self.projects_file = self.data_dir / "projects.jsonl"
-            
-            with open(self.projects_file, 'a', encoding='utf-8') as f:
-                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._append_record(self.projects_file, record)
             
             logger.info(f"[经历银行] 项目已记录: {project_name} - {status}")
             
@@ -672,9 +1135,11 @@ class ExperienceBank:
             metadata: 其他元数据
         """
         try:
+            now = datetime.now()
             record = {
-                "timestamp": datetime.now().isoformat(),
-                "date": datetime.now().strftime("%Y-%m-%d"),
+                "timestamp": now.isoformat(),
+                "ts_epoch": now.timestamp(),
+                "date": now.strftime("%Y-%m-%d"),
                 "promise": promise,
                 "related_user_id": related_user_id,
                 "deadline": deadline,
@@ -683,11 +1148,9 @@ class ExperienceBank:
                 "metadata": metadata or {}
             }
             
-            if not hasattr(self, "promises_file"):
-                self.promises_file = self.data_dir / "promises.jsonl"
-            
-            with open(self.promises_file, 'a', encoding='utf-8') as f:
-                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            with self._state_lock:
+                self._load_promise_state().append(promise.lower())
+                self._append_record(self.promises_file, record)
             
             logger.info(f"[经历银行] 承诺已记录: {promise}")
             
@@ -698,35 +1161,128 @@ class ExperienceBank:
         """
         标记承诺为完成
         
+        不改写已有记录，而是向承诺日志追加一条完成操作，读取时按顺序折叠；
+        完成操作累积较多时再压缩日志。
+        
         Args:
             promise_keyword: 承诺的关键词或描述
             completion_note: 完成介绍
         """
         try:
-            if not hasattr(self, "promises_file"):
-                return
-            
-            with open(self.promises_file, 'r', encoding='utf-8') as f:
-                promises = [json.loads(line) for line in f]
-            
-            updated = False
-            for promise in promises:
-                if promise_keyword.lower() in promise.get("promise", "").lower():
-                    promise["status"] = "completed"
-                    promise["completed_at"] = datetime.now().isoformat()
-                    if completion_note:
-                        promise["completion_note"] = completion_note
-                    updated = True
+            keyword = promise_keyword.lower()
+            with self._state_lock:
+                if not any(keyword in text for text in self._load_promise_state()):
+                    return
+                
+                now = datetime.now()
+                self._append_record(self.promises_file, {
+                    "op": "complete",
+                    "keyword": promise_keyword,
+                    "at": now.isoformat(),
+                    "ts_epoch": now.timestamp(),
+                    "note": completion_note
+                })
+                self._promise_ops += 1
+                if self._promise_ops >= max(len(self._promise_texts), self.PROMISE_COMPACT_MIN_OPS):
+                    self._compact_promises()
             
-            if updated:
-                with open(self.promises_file, 'w', encoding='utf-8') as f:
-                    for promise in promises:
-                        f.write(json.dumps(promise, ensure_ascii=False) + "\n")
-                logger.info(f"[经历银行] 承诺已完成: {promise_keyword}")
+            logger.info(f"[经历银行] 承诺已完成: {promise_keyword}")
         
         except Exception as e:
             logger.error(f"[经历银行] 更新承诺失败: {e}")
     
+    def _load_promise_state(self) -> List[str]:
+        """首次使用时扫描承诺日志，返回承诺文本列表（调用方持有 _state_lock）"""
+        if self._promise_texts is None:
+            self.flush()
+            texts = []
+            ops = 0
+            if self.promises_file.exists():
+                with open(self.promises_file, 'rb') as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        record = _loads(line)
+                        if record.get("op") == "complete":
+                            ops += 1
+                        else:
+                            texts.append(record.get("promise", "").lower())
+            self._promise_texts = texts
+            self._promise_ops = ops
+        return self._promise_texts
+    
+    def get_promises(self) -> List[Dict[str, Any]]:
+        """读取全部承诺（已折叠完成操作）"""
+        try:
+            self.flush()
+            if not self.promises_file.exists():
+                return []
+            with open(self.promises_file, 'rb') as f:
+                return _fold_promises(_loads(line) for line in f if line.strip())
+        except Exception as e:
+            logger.error(f"[经历银行] 读取承诺失败: {e}")
+            return []
+    
+    def _compact_promises(self):
+        """将承诺日志折叠为每个承诺一条记录（调用方持有 _state_lock）
+        
+        内存映射日志，先只解析完成操作行；承诺行按原文查找其后各操作的关键词，
+        不含任何关键词的行原样写回，只有可能命中的行才解析并重新序列化。
+        查找前与折叠时一样用 Unicode lower() 处理整行，保证预筛选不会漏掉真正命中的承诺。
+        """
+        self.flush()
+        if not self.promises_file.exists() or self.promises_file.stat().st_size == 0:
+            self._promise_ops = 0
+            return
+        
+        with open(self.promises_file, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                # 切分行，并解析完成操作（操作记录以 "op" 键开头）
+                lines = []
+                ops = []
+                size = len(mm)
+                pos = 0
+                while pos < size:
+                    end = mm.find(b"\n", pos)
+                    if end == -1:
+                        end = size
+                    line = mm[pos:end]
+                    if line.strip():
+                        if line.startswith(b'{"op"'):
+                            op = _loads(line)
+                            keyword = op.get("keyword", "").lower()
+                            needle = json.dumps(keyword, ensure_ascii=False)[1:-1]
+                            ops.append((len(lines), keyword, needle, op))
+                        else:
+                            lines.append(line)
+                    pos = end + 1
+        
+        # 完成操作只作用于其之前的承诺
+        chunks = []
+        for index, line in enumerate(lines):
+            lowered = line.decode("utf-8").lower()
+            # 含 \u 转义的行（旧版按 ASCII 转义写入）无法按原文查找，交给解析后的比较判断
+            escaped = "\\u" in lowered
+            matched = [(keyword, op) for position, keyword, needle, op in ops
+                       if position > index and (escaped or needle in lowered)]
+            if not matched:
+                chunks.append(line + b"\n")
+                continue
+            promise = _loads(line)
+            text = promise.get("promise", "").lower()
+            for keyword, op in matched:
+                if keyword in text:
+                    promise["status"] = "completed"
+                    promise["completed_at"] = op.get("at")
+                    if op.get("note"):
+                        promise["completion_note"] = op["note"]
+            chunks.append(_dumps_line(promise))
+        
+        self._ensure_writer()
+        self._write_queue.put((_REPLACE, (self.promises_file, b"".join(chunks)), None))
+        self._promise_ops = 0
+        logger.info(f"[经历银行] 承诺日志已压缩: {len(lines)} 条")
+    
     # ========== 时间节律与生物钟 ==========
     
     def record_circadian_state(self, state: str, energy_level: int, creativity_level: int, mood: str):
@@ -740,20 +1296,18 @@ class ExperienceBank:
             mood: 情绿 (开心/中性/愢怂)
         """
         try:
+            now = datetime.now()
             record = {
-                "timestamp": datetime.now().isoformat(),
-                "hour": datetime.now().hour,
+                "timestamp": now.isoformat(),
+                "ts_epoch": now.timestamp(),
+                "hour": now.hour,
                 "state": state,
                 "energy_level": energy_level,
                 "creativity_level": creativity_level,
                 "mood": mood
             }
             
-            if not hasattr(self, "circadian_file"):
-                self.circadian_file = self.data_dir / "circadian.jsonl"
-            
-            with open(self.circadian_file, 'a', encoding='utf-8') as f:
-                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._append_record(self.circadian_file, record)
             
         except Exception as e:
             logger.debug(f"[经历银行] 记录生物钟失败: {e}")
@@ -771,19 +1325,19 @@ class ExperienceBank:
             metadata: 其他元数据
         """
         try:
+            now = datetime.now()
             record = {
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": now.isoformat(),
+                "ts_epoch": now.timestamp(),
                 "context_type": context_type,
                 "traits": traits,
                 "tone": tone,
                 "metadata": metadata or {}
             }
             
-            if not hasattr(self, "personality_file"):
-                self.personality_file = self.data_dir / "personalities.jsonl"
-            
-            with open(self.personality_file, 'a', encoding='utf-8') as f:
-                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            with self._state_lock:
+                self._latest_personality_by_context[context_type] = record
+                self._append_record(self.personality_file, record)
             
             logger.info(f"[经历银行] 人格表现已记录: {context_type}")
             
@@ -794,23 +1348,23 @@ class ExperienceBank:
         """
         获取指定场景的人格描述
         """
+        with self._state_lock:
+            personality = self._latest_personality_by_context.get(context_type)
+        return dict(personality) if personality is not None else None
+    
+    def _load_personalities(self) -> Dict[str, Dict[str, Any]]:
+        """扫描一次人格表现日志，保留每个场景最新的记录"""
+        latest = {}
         try:
-            if not hasattr(self, "personality_file"):
-                return None
-            
-            with open(self.personality_file, 'r', encoding='utf-8') as f:
-                personalities = [json.loads(line) for line in f]
-            
-            # 返回最新的匹配上下文类型
-            matching = [p for p in personalities if p.get("context_type") == context_type]
-            if matching:
-                return matching[-1]
-            
-            return None
-            
+            if self.personality_file.exists():
+                with open(self.personality_file, 'rb') as f:
+                    for line in f:
+                        if line.strip():
+                            record = _loads(line)
+                            latest[record.get("context_type")] = record
         except Exception as e:
-            logger.debug(f"[经历银行] 获取人格失败: {e}")
-            return None
+            logger.debug(f"[经历银行] 加载人格记录失败: {e}")
+        return latest
     
     # ========== 时间线验证集成 ==========
     
@@ -869,9 +1423,8 @@ class ExperienceBank:
             return {"error": "时间线验证器未启用"}
         
         try:
-            # 获取所有经历
-            with open(self.events_file, 'r', encoding='utf-8') as f:
-                events = [json.loads(line) for line in f if line.strip()]
+            # 所有经历以生成器惰性传入：只有分析器真正遍历时才读取并逐行解析事件日志
+            events = self._iter_jsonl(self.events_file)
             
             # 分析连贯性
             coherence = self.timeline_verifier.analyze_experience_coherence(events)
@@ -886,6 +1439,16 @@ class ExperienceBank:
             logger.error(f"[经历银行] 获取时间线报告失败: {e}")
             return {}
     
+    def _iter_jsonl(self, path: Path) -> Iterator[Dict[str, Any]]:
+        """逐行读取 JSONL 日志（读取前先写出队列中的记录）"""
+        self.flush()
+        if not path.exists():
+            return
+        with open(path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    yield _loads(line)
+    
     def _analyze_growth_smoothness(self) -> Dict[str, Any]:
         """
         分析成长轨迹的平滑性
@@ -894,33 +1457,46 @@ class ExperienceBank:
             平滑性分析结果
         """
         try:
-            with open(self.growth_file, 'r', encoding='utf-8') as f:
-                growth_data = json.load(f)
-            
-            skills = growth_data.get("skills", {})
-            smoothness_issues = []
-            
-            # 检查每个技能的成长历史
-            for skill_name, skill_data in skills.items():
-                growth_history = skill_data.get("growth_history", [])
-                
-                for i in range(len(growth_history)):
-                    history = growth_history[i]
-                    level_jump = abs(history.get("to_level", 0) - history.get("from_level", 0))
-                    
-                    if level_jump > 3:
-                        smoothness_issues.append({
-                            "skill": skill_name,
-                            "issue": f"等级跃迁过大: {history.get('from_level')} -> {history.get('to_level')}",
-                            "timestamp": history.get("changed_at")
-                        })
+            with self._state_lock:
+                skills = dict(self._growth.get("skills", {}))
+            # 展平为 (技能, 历史记录) 序列，等级差在 NumPy 中整体计算，只为前5个问题构造字典
+            entries = [
+                (skill_name, history)
+                for skill_name, skill_data in skills.items()
+                for history in skill_data.get("growth_history", [])
+            ]
+            count = len(entries)
+            if NUMPY_AVAILABLE and count >= _NUMPY_MIN_SIZE:
+                from_levels = np.fromiter((h.get("from_level", 0) for _, h in entries), dtype=np.float64, count=count)
+                to_levels = np.fromiter((h.get("to_level", 0) for _, h in entries), dtype=np.float64, count=count)
+                jump_indices = np.flatnonzero(np.abs(to_levels - from_levels) > 3)
+                issue_count = len(jump_indices)
+                jumps = [entries[i] for i in jump_indices[:5]]
+            else:
+                jumps = []
+                append = jumps.append
+                for entry in entries:
+                    history = entry[1]
+                    level_jump = history.get("to_level", 0) - history.get("from_level", 0)
+                    if level_jump > 3 or level_jump < -3:
+                        append(entry)
+                issue_count = len(jumps)
+            
+            smoothness_issues = [
+                {
+                    "skill": skill_name,
+                    "issue": f"等级跃迁过大: {history.get('from_level')} -> {history.get('to_level')}",
+                    "timestamp": history.get("changed_at")
+                }
+                for skill_name, history in jumps[:5]
+            ]
             
             return {
-                "is_smooth": len(smoothness_issues) == 0,
+                "is_smooth": issue_count == 0,
                 "total_skills": len(skills),
-                "issue_count": len(smoothness_issues),
-                "issues": smoothness_issues[:5],  # 只返回前5个问题
-                "assessment": "平滑" if len(smoothness_issues) == 0 else "有跨越式成长"
+                "issue_count": issue_count,
+                "issues": smoothness_issues,  # 只返回前5个问题
+                "assessment": "平滑" if issue_count == 0 else "有跨越式成长"
             }
             
         except Exception as e:
@@ -5,15 +5,136 @@
 定期使用LLM生成上下文优化提示，最小化token消耗同时保证高质量扮演
 """
 
+import gzip
 import json
+import operator
+import os
+import time
 import asyncio
 from pathlib import Path
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Iterator, Any, Callable, Tuple
 from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import defaultdict, deque
 
 from astrbot.api import logger
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgspec
+    MSGSPEC_AVAILABLE = True
+except ImportError:
+    MSGSPEC_AVAILABLE = False
+
+
+def _loads(data) -> Any:
+    """解析 JSON 文本或字节"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _json_default(obj: Any) -> Any:
+    """序列化内存结构中的非 JSON 原生类型"""
+    if isinstance(obj, deque):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def _dumps(data: Any, pretty: bool = False) -> bytes:
+    """序列化为 JSON（UTF-8 字节），默认紧凑格式，pretty 为 True 时缩进便于人工查看"""
+    if ORJSON_AVAILABLE:
+        option = orjson.OPT_NON_STR_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=_json_default, option=option)
+    if pretty:
+        return json.dumps(data, ensure_ascii=False, indent=2, default=_json_default).encode("utf-8")
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=_json_default).encode("utf-8")
+
+
+def _write_atomic(path: Path, data: bytes):
+    """先写临时文件再替换，避免写入中断留下损坏的文件"""
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def _make_reader(name: str, fields: Tuple[Tuple[str, Any], ...]) -> Callable[[bytes], tuple]:
+    """生成只提取指定字段的行解码函数，返回按 fields 顺序排列的字段值元组
+    
+    安装了 msgspec 时解码为只含这些字段的 Struct，其余字段在解码器内直接跳过，
+    不再为每行构造完整的 dict。
+    """
+    names = [field_name for field_name, _ in fields]
+    if MSGSPEC_AVAILABLE:
+        record_type = msgspec.defstruct(name, [(field_name, Any, default) for field_name, default in fields])
+        decode = msgspec.json.Decoder(record_type).decode
+        getter = operator.attrgetter(*names)
+        return lambda line: getter(decode(line))
+    
+    def read(line: bytes) -> tuple:
+        record = _loads(line)
+        return tuple(record.get(field_name, default) for field_name, default in fields)
+    return read
+
+
+# 判断记录是否在时间窗口内只需这两个字段
+_read_timestamp = _make_reader("TimestampRecord", (("timestamp", ""), ("ts_epoch", None)))
+
+# 各日志需要的字段及缺省值
+_read_conversation = _make_reader("ConversationRecord", (("timestamp", ""), ("user_id", None), ("user_message", "")))
+_read_event = _make_reader("EventRecord", (("timestamp", ""), ("event_type", None), ("description", "")))
+_read_thought = _make_reader("ThoughtRecord", (("timestamp", ""), ("content", "")))
+
+# 倒序读取 JSONL 时每次读取的块大小（字节）
+_TAIL_CHUNK_SIZE = 1 << 16
+
+
+def _iter_jsonl_reverse(path: Path, cutoff_time: datetime) -> Iterator[bytes]:
+    """从文件末尾向前按块读取追加写的 JSONL 日志，倒序产出时间窗口内的原始行
+    
+    日志按时间顺序追加，遇到不晚于 cutoff_time 的记录即停止，
+    只需读取时间窗口内的数据。每行只解码时间字段：记录带有 ts_epoch 时直接比较数值；
+    旧记录没有该字段，ISO-8601 时间字符串按字典序即时间序，比较字符串即可。
+    """
+    cutoff_ts = cutoff_time.timestamp()
+    cutoff_iso = cutoff_time.isoformat()
+    with open(path, 'rb') as f:
+        pos = f.seek(0, os.SEEK_END)
+        tail = b""
+        while pos > 0:
+            size = min(_TAIL_CHUNK_SIZE, pos)
+            pos -= size
+            f.seek(pos)
+            lines = (f.read(size) + tail).split(b"\n")
+            # 块首行可能不完整，留到读取前一块时拼接；已到文件开头则整行可用
+            tail = lines.pop(0) if pos > 0 else b""
+            for line in reversed(lines):
+                if not line.strip():
+                    continue
+                timestamp, ts = _read_timestamp(line)
+                if ts <= cutoff_ts if ts is not None else timestamp <= cutoff_iso:
+                    return
+                yield line
+
+
+def _scan_window(path: Path, cutoff_time: datetime, read: Callable[[bytes], tuple], limit: int) -> Tuple[int, List[tuple]]:
+    """统计时间窗口内的记录总数，并按时间顺序返回其中最早 limit 条记录的解码结果
+    
+    窗口内每行只解码时间字段用于计数，完整解码只发生在最终保留的 limit 行上。
+    """
+    oldest = deque(maxlen=limit)
+    total = 0
+    for line in _iter_jsonl_reverse(path, cutoff_time):
+        total += 1
+        oldest.append(line)
+    return total, [read(line) for line in reversed(oldest)]
+
 
 class LifeStoryEngine:
     """人生故事引擎
@@ -25,6 +146,20 @@ class LifeStoryEngine:
     4. 优先保证扮演质量，其次优化token
     """
     
+    # get_context_for_llm 结果在进程内缓存的最长时间（秒）
+    CONTEXT_MEMO_SECONDS = 60
+    
+    # 人生故事时间线保留的最近章节数
+    TIMELINE_MAX_CHAPTERS = 10
+    
+    # 故事更新提示词中列出的对话、思考、事件条数上限（只收集这么多条的详情）
+    PROMPT_CONVERSATION_LIMIT = 10
+    PROMPT_THOUGHT_LIMIT = 5
+    PROMPT_EVENT_LIMIT = 5
+    
+    # 人生故事序列化后超过该大小（字节）时改为 gzip 压缩保存
+    LIFE_STORY_GZIP_THRESHOLD = 256 * 1024
+    
     def __init__(
         self,
         data_dir: Path,
@@ -34,7 +169,8 @@ class LifeStoryEngine:
         update_interval: int = 86400 * 3,  # 默认3天更新一次经历线
         collect_days: int = 7,  # 收集最近N天的经历
         context_max_length: int = 200,  # 精简上下文最大长度
-        cache_days: int = 7  # 缓存有效期（天）
+        cache_days: int = 7,  # 缓存有效期（天）
+        pretty_json: bool = False  # 数据文件是否使用缩进格式（调试用）
     ):
         """初始化人生故事引擎
         
@@ -47,6 +183,7 @@ class LifeStoryEngine:
             collect_days: 收集最近N天的经历，默认7天
             context_max_length: 精简上下文最大长度，默认200字符
             cache_days: 缓存有效期（天），默认7天
+            pretty_json: 数据文件是否使用缩进格式保存，默认紧凑格式（调试时可开启）
         """
         self.data_dir = data_dir
         self.data_dir.mkdir(parents=True, exist_ok=True)
@@ -58,9 +195,11 @@ class LifeStoryEngine:
         self.collect_days = collect_days
         self.context_max_length = context_max_length
         self.cache_days = cache_days
+        self.pretty_json = pretty_json
         
         # 核心数据文件
         self.life_story_file = self.data_dir / "life_story.json"  # 完整人生故事
+        self.life_story_gz_file = self.data_dir / "life_story.json.gz"  # 人生故事过大时的压缩版本
         self.context_cache_file = self.data_dir / "context_cache.json"  # 上下文缓存
         self.state_file = self.data_dir / "engine_state.json"  # 引擎状态
         
@@ -69,14 +208,19 @@ class LifeStoryEngine:
         self.life_story = self._load_life_story()
         self.context_cache = self._load_context_cache()
         
+        # 本轮有改动、尚未写盘的数据（"state" / "life_story" / "context_cache"）
+        self._dirty: set = set()
+        
+        # get_context_for_llm 结果缓存：(time.monotonic() 截止时间, 上下文)
+        self._ctx_memo: Optional[Tuple[float, str]] = None
+        
         logger.info(f"[人生故事引擎] 初始化完成，更新间隔: {update_interval/86400}天")
     
     def _load_state(self) -> Dict:
         """加载引擎状态"""
         if self.state_file.exists():
             try:
-                with open(self.state_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                return _loads(self.state_file.read_bytes())
             except Exception as e:
                 logger.error(f"[人生故事引擎] 加载状态失败: {e}")
         
@@ -91,33 +235,48 @@ class LifeStoryEngine:
     def _save_state(self):
         """保存引擎状态"""
         try:
-            with open(self.state_file, 'w', encoding='utf-8') as f:
-                json.dump(self.state, f, ensure_ascii=False, indent=2)
+            _write_atomic(self.state_file, _dumps(self.state, self.pretty_json))
         except Exception as e:
             logger.error(f"[人生故事引擎] 保存状态失败: {e}")
     
     def _load_life_story(self) -> Dict:
         """加载人生故事"""
-        if self.life_story_file.exists():
-            try:
-                with open(self.life_story_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.error(f"[人生故事引擎] 加载人生故事失败: {e}")
+        life_story = None
+        try:
+            # 优先读取压缩版本
+            if self.life_story_gz_file.exists():
+                life_story = _loads(gzip.decompress(self.life_story_gz_file.read_bytes()))
+            elif self.life_story_file.exists():
+                life_story = _loads(self.life_story_file.read_bytes())
+        except Exception as e:
+            logger.error(f"[人生故事引擎] 加载人生故事失败: {e}")
+        
+        if life_story is None:
+            life_story = {
+                "timeline": [],  # 时间线事件
+                "key_experiences": [],  # 关键经历
+                "relationships": {},  # 关系网络
+                "growth_milestones": [],  # 成长里程碑
+                "current_state": {}  # 当前状态
+            }
         
-        return {
-            "timeline": [],  # 时间线事件
-            "key_experiences": [],  # 关键经历
-            "relationships": {},  # 关系网络
-            "growth_milestones": [],  # 成长里程碑
-            "current_state": {}  # 当前状态
-        }
+        # 时间线在内存中为定长队列，追加新章节时自动淘汰最旧的章节
+        life_story["timeline"] = deque(life_story.get("timeline", []), maxlen=self.TIMELINE_MAX_CHAPTERS)
+        return life_story
     
     def _save_life_story(self):
         """保存人生故事"""
         try:
-            with open(self.life_story_file, 'w', encoding='utf-8') as f:
-                json.dump(self.life_story, f, ensure_ascii=False, indent=2)
+            data = _dumps(self.life_story, self.pretty_json)
+            if len(data) > self.LIFE_STORY_GZIP_THRESHOLD:
+                _write_atomic(self.life_story_gz_file, gzip.compress(data, compresslevel=1))
+                stale_file = self.life_story_file
+            else:
+                _write_atomic(self.life_story_file, data)
+                stale_file = self.life_story_gz_file
+            # 删除另一种格式的旧文件，避免加载时读到过期内容
+            if stale_file.exists():
+                stale_file.unlink()
         except Exception as e:
             logger.error(f"[人生故事引擎] 保存人生故事失败: {e}")
     
@@ -125,8 +284,7 @@ class LifeStoryEngine:
         """加载上下文缓存"""
         if self.context_cache_file.exists():
             try:
-                with open(self.context_cache_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                return _loads(self.context_cache_file.read_bytes())
             except Exception as e:
                 logger.error(f"[人生故事引擎] 加载上下文缓存失败: {e}")
         
@@ -139,15 +297,25 @@ class LifeStoryEngine:
     def _save_context_cache(self):
         """保存上下文缓存"""
         try:
-            with open(self.context_cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.context_cache, f, ensure_ascii=False, indent=2)
+            _write_atomic(self.context_cache_file, _dumps(self.context_cache, self.pretty_json))
         except Exception as e:
             logger.error(f"[人生故事引擎] 保存上下文缓存失败: {e}")
     
+    def _flush(self):
+        """写出本轮所有改动过的数据文件，每个文件只写一次"""
+        dirty, self._dirty = self._dirty, set()
+        if "state" in dirty:
+            self._save_state()
+        if "life_story" in dirty:
+            self._save_life_story()
+        if "context_cache" in dirty:
+            self._save_context_cache()
+    
     def set_base_persona(self, persona: str):
         """设置基础人设（只在首次设置，之后永不修改）"""
         if not self.state.get("base_persona"):
             self.state["base_persona"] = persona
+            self._ctx_memo = None
             self._save_state()
             logger.info("[人生故事引擎] 基础人设已设置")
         else:
@@ -183,61 +351,30 @@ class LifeStoryEngine:
             days = self.collect_days
         
         data = {
-            "conversations": [],
+            "conversations": [],  # 窗口内最早的 PROMPT_CONVERSATION_LIMIT 条
             "thoughts": [],
             "events": [],
+            "conversation_count": 0,  # 窗口内的总条数
+            "thought_count": 0,
+            "event_count": 0,
             "growth_changes": []
         }
         
         try:
             cutoff_time = datetime.now() - timedelta(days=days)
             
-            # 从经历银行收集
+            # 三个日志文件的扫描都是同步 I/O，放到线程中并发执行，避免阻塞事件循环
             if self.experience_bank:
-                # 收集对话
-                conversations_file = self.experience_bank.conversations_file
-                if conversations_file.exists():
-                    with open(conversations_file, 'r', encoding='utf-8') as f:
-                        for line in f:
-                            if line.strip():
-                                record = json.loads(line)
-                                timestamp = datetime.fromisoformat(record.get("timestamp", ""))
-                                if timestamp > cutoff_time:
-                                    data["conversations"].append({
-                                        "time": record.get("timestamp"),
-                                        "user": record.get("user_id"),
-                                        "topic": record.get("user_message", "")[:50]
-                                    })
-                
-                # 收集事件
-                events_file = self.experience_bank.events_file
-                if events_file.exists():
-                    with open(events_file, 'r', encoding='utf-8') as f:
-                        for line in f:
-                            if line.strip():
-                                record = json.loads(line)
-                                timestamp = datetime.fromisoformat(record.get("timestamp", ""))
-                                if timestamp > cutoff_time:
-                                    data["events"].append({
-                                        "time": record.get("timestamp"),
-                                        "type": record.get("event_type"),
-                                        "desc": record.get("description", "")[:100]
-                                    })
-            
-            # 从思考引擎收集
-            if self.thought_engine:
-                thoughts_file = self.thought_engine.thoughts_file
-                if thoughts_file.exists():
-                    with open(thoughts_file, 'r', encoding='utf-8') as f:
-                        for line in f:
-                            if line.strip():
-                                record = json.loads(line)
-                                timestamp = datetime.fromisoformat(record.get("timestamp", ""))
-                                if timestamp > cutoff_time:
-                                    data["thoughts"].append({
-                                        "time": record.get("timestamp"),
-                                        "content": record.get("content", "")
-                                    })
+                # 先写出经历银行缓冲中的记录
+                await asyncio.to_thread(self.experience_bank.flush)
+            conversations, events, thoughts = await asyncio.gather(
+                asyncio.to_thread(self._scan_conversations, cutoff_time),
+                asyncio.to_thread(self._scan_events, cutoff_time),
+                asyncio.to_thread(self._scan_thoughts, cutoff_time),
+            )
+            data["conversation_count"], data["conversations"] = conversations
+            data["event_count"], data["events"] = events
+            data["thought_count"], data["thoughts"] = thoughts
             
             # 从人格演化系统收集成长变化
             if self.personality_evolution:
@@ -251,8 +388,8 @@ class LifeStoryEngine:
                         "current_interests": interests[:5]
                     }
             
-            logger.info(f"[人生故事引擎] 收集到 {len(data['conversations'])} 条对话, "
-                       f"{len(data['thoughts'])} 条思考, {len(data['events'])} 个事件")
+            logger.info(f"[人生故事引擎] 收集到 {data['conversation_count']} 条对话, "
+                       f"{data['thought_count']} 条思考, {data['event_count']} 个事件")
             
             return data
             
@@ -260,6 +397,45 @@ class LifeStoryEngine:
             logger.error(f"[人生故事引擎] 收集经历失败: {e}", exc_info=True)
             return data
     
+    def _scan_conversations(self, cutoff_time: datetime) -> Tuple[int, List[Dict]]:
+        """统计时间窗口内的对话，返回 (总条数, 最早的若干条对话)"""
+        if not self.experience_bank:
+            return 0, []
+        conversations_file = self.experience_bank.conversations_file
+        if not conversations_file.exists():
+            return 0, []
+        total, records = _scan_window(conversations_file, cutoff_time, _read_conversation, self.PROMPT_CONVERSATION_LIMIT)
+        return total, [
+            {"time": timestamp, "user": user_id, "topic": user_message[:50]}
+            for timestamp, user_id, user_message in records
+        ]
+    
+    def _scan_events(self, cutoff_time: datetime) -> Tuple[int, List[Dict]]:
+        """统计时间窗口内的事件，返回 (总个数, 最早的若干个事件)"""
+        if not self.experience_bank:
+            return 0, []
+        events_file = self.experience_bank.events_file
+        if not events_file.exists():
+            return 0, []
+        total, records = _scan_window(events_file, cutoff_time, _read_event, self.PROMPT_EVENT_LIMIT)
+        return total, [
+            {"time": timestamp, "type": event_type, "desc": description[:100]}
+            for timestamp, event_type, description in records
+        ]
+    
+    def _scan_thoughts(self, cutoff_time: datetime) -> Tuple[int, List[Dict]]:
+        """统计时间窗口内的思考，返回 (总条数, 最早的若干条思考)"""
+        if not self.thought_engine:
+            return 0, []
+        thoughts_file = self.thought_engine.thoughts_file
+        if not thoughts_file.exists():
+            return 0, []
+        total, records = _scan_window(thoughts_file, cutoff_time, _read_thought, self.PROMPT_THOUGHT_LIMIT)
+        return total, [
+            {"time": timestamp, "content": content}
+            for timestamp, content in records
+        ]
+    
     async def update_life_story(self, llm_action) -> bool:
         """更新人生故事（补充经历线）
         
@@ -304,11 +480,14 @@ class LifeStoryEngine:
                 self.state["last_update_time"] = datetime.now().timestamp()
                 self.state["update_count"] += 1
                 self.state["current_chapter"] += 1
-                self._save_state()
+                self._dirty.add("state")
                 
                 # 重新生成上下文缓存
                 await self._regenerate_context_cache(llm_action)
                 
+                # 本轮的改动统一写盘
+                self._flush()
+                
                 logger.info(f"[人生故事引擎] 人生经历线已更新到第 {self.state['current_chapter']} 章")
                 return True
             else:
@@ -321,54 +500,62 @@ class LifeStoryEngine:
     
     def _build_story_update_prompt(self, recent_data: Dict) -> str:
         """构建故事更新提示词"""
-        prompt_parts = [
-            "请根据以下最近的经历，为角色的人生故事补充新的章节。",
-            "",
-            "【基础人设】（请保持一致，不要修改）",
-            self.state.get("base_persona", "一个善于思考的AI助手"),
-            "",
-            f"【最近{self.collect_days}天的经历】",
-        ]
-        
-        # 添加对话经历
-        if recent_data.get("conversations"):
-            prompt_parts.append(f"\n对话记录（共{len(recent_data['conversations'])}次）：")
-            for conv in recent_data["conversations"][:10]:  # 最多10条
-                prompt_parts.append(f"- {conv['time'][:10]}: 与{conv['user']}讨论了{conv['topic']}")
-        
-        # 添加思考记录
-        if recent_data.get("thoughts"):
-            prompt_parts.append(f"\n内心思考（共{len(recent_data['thoughts'])}条）：")
-            for thought in recent_data["thoughts"][:5]:  # 最多5条
-                prompt_parts.append(f"- {thought['time'][:10]}: {thought['content']}")
-        
-        # 添加事件记录
-        if recent_data.get("events"):
-            prompt_parts.append(f"\n发生的事件（共{len(recent_data['events'])}个）：")
-            for event in recent_data["events"][:5]:  # 最多5个
-                prompt_parts.append(f"- {event['time'][:10]}: {event['desc']}")
-        
-        # 添加成长变化
-        if recent_data.get("growth_changes"):
-            growth = recent_data["growth_changes"]
+        # 各段先用生成器拼成整块，最后一次性套入模板，避免逐行 append 的临时字符串
+        sections = []
+        
+        # 对话经历（最多10条）
+        conversations = recent_data.get("conversations")
+        if conversations:
+            total = recent_data.get("conversation_count", len(conversations))
+            sections.append(f"\n对话记录（共{total}次）：\n" + "\n".join(
+                f"- {conv['time'][:10]}: 与{conv['user']}讨论了{conv['topic']}"
+                for conv in conversations[:self.PROMPT_CONVERSATION_LIMIT]
+            ))
+        
+        # 内心思考（最多5条）
+        thoughts = recent_data.get("thoughts")
+        if thoughts:
+            total = recent_data.get("thought_count", len(thoughts))
+            sections.append(f"\n内心思考（共{total}条）：\n" + "\n".join(
+                f"- {thought['time'][:10]}: {thought['content']}"
+                for thought in thoughts[:self.PROMPT_THOUGHT_LIMIT]
+            ))
+        
+        # 发生的事件（最多5个）
+        events = recent_data.get("events")
+        if events:
+            total = recent_data.get("event_count", len(events))
+            sections.append(f"\n发生的事件（共{total}个）：\n" + "\n".join(
+                f"- {event['time'][:10]}: {event['desc']}"
+                for event in events[:self.PROMPT_EVENT_LIMIT]
+            ))
+        
+        # 成长变化
+        growth = recent_data.get("growth_changes")
+        if growth:
             if growth.get("current_traits"):
-                prompt_parts.append(f"\n当前性格特质：{', '.join(growth['current_traits'])}")
+                sections.append(f"\n当前性格特质：{', '.join(growth['current_traits'])}")
             if growth.get("current_interests"):
-                prompt_parts.append(f"当前兴趣：{', '.join(growth['current_interests'])}")
+                sections.append(f"当前兴趣：{', '.join(growth['current_interests'])}")
         
-        prompt_parts.extend([
-            "",
-            "【请补充新的经历章节】",
-            "要求：",
-            "1. 基于以上经历，补充具体的人生事件细节",
-            "2. 保持基础人设的核心特征不变",
-            "3. 让人生经历更加完整、真实、连贯",
-            "4. 可以补充一些合理的背景故事和成长经历",
-            "5. 输出格式：简洁的叙述性文字，3-5个要点",
-            ""
-        ])
+        experiences_block = "".join("\n" + section for section in sections)
         
-        return "\n".join(prompt_parts)
+        return (
+            "请根据以下最近的经历，为角色的人生故事补充新的章节。\n"
+            "\n"
+            "【基础人设】（请保持一致，不要修改）\n"
+            f"{self.state.get('base_persona', '一个善于思考的AI助手')}\n"
+            "\n"
+            f"【最近{self.collect_days}天的经历】{experiences_block}\n"
+            "\n"
+            "【请补充新的经历章节】\n"
+            "要求：\n"
+            "1. 基于以上经历，补充具体的人生事件细节\n"
+            "2. 保持基础人设的核心特征不变\n"
+            "3. 让人生经历更加完整、真实、连贯\n"
+            "4. 可以补充一些合理的背景故事和成长经历\n"
+            "5. 输出格式：简洁的叙述性文字，3-5个要点\n"
+        )
     
     def _get_story_system_prompt(self) -> str:
         """获取故事系统提示词"""
@@ -386,24 +573,21 @@ class LifeStoryEngine:
                 "chapter": self.state["current_chapter"] + 1,
                 "time": datetime.now().isoformat(),
                 "content": story_update,
-                "based_on_events": len(recent_data.get("events", [])),
-                "based_on_conversations": len(recent_data.get("conversations", [])),
-                "based_on_thoughts": len(recent_data.get("thoughts", []))
+                "based_on_events": recent_data.get("event_count", len(recent_data.get("events", []))),
+                "based_on_conversations": recent_data.get("conversation_count", len(recent_data.get("conversations", []))),
+                "based_on_thoughts": recent_data.get("thought_count", len(recent_data.get("thoughts", [])))
             }
             
+            # 时间线只保留最近 TIMELINE_MAX_CHAPTERS 个章节（deque 自动淘汰）
             self.life_story["timeline"].append(chapter)
             
-            # 保留最近10个章节
-            if len(self.life_story["timeline"]) > 10:
-                self.life_story["timeline"] = self.life_story["timeline"][-10:]
-            
             # 更新当前状态
             self.life_story["current_state"] = {
                 "last_update": datetime.now().isoformat(),
                 "total_chapters": self.state["current_chapter"] + 1
             }
             
-            self._save_life_story()
+            self._dirty.add("life_story")
             
             logger.info("[人生故事引擎] 故事章节已整合")
             
@@ -443,7 +627,8 @@ class LifeStoryEngine:
                     "estimated_tokens": len(compact_context) // 2  # 粗略估计
                 }
                 
-                self._save_context_cache()
+                self._dirty.add("context_cache")
+                self._ctx_memo = None
                 
                 logger.info(f"[人生故事引擎] 精简上下文已生成，约{self.context_cache['estimated_tokens']}token")
             
@@ -462,7 +647,7 @@ class LifeStoryEngine:
         ]
         
         # 添加最近的章节
-        recent_chapters = self.life_story["timeline"][-3:]  # 最近3章
+        recent_chapters = list(self.life_story["timeline"])[-3:]  # 最近3章
         for chapter in recent_chapters:
             prompt_parts.append(f"第{chapter['chapter']}章: {chapter['content'][:100]}")
         
@@ -481,9 +666,16 @@ class LifeStoryEngine:
     def get_context_for_llm(self) -> str:
         """获取用于LLM对话的上下文
         
+        结果在进程内缓存最多 CONTEXT_MEMO_SECONDS 秒（不超过上下文缓存的剩余有效期），
+        每轮对话直接返回缓存的字符串。
+        
         Returns:
             精简的上下文字符串
         """
+        memo = self._ctx_memo
+        if memo is not None and time.monotonic() < memo[0]:
+            return memo[1]
+        
         # 检查缓存是否有效
         current_time = datetime.now().timestamp()
         cache_valid = self.context_cache.get("cache_valid_until", 0)
@@ -492,11 +684,14 @@ class LifeStoryEngine:
             compact = self.context_cache.get("compact_context", "")
             if compact:
                 logger.debug(f"[人生故事引擎] 使用缓存的上下文，约{len(compact)//2}token")
+                ttl = min(self.CONTEXT_MEMO_SECONDS, cache_valid - current_time)
+                self._ctx_memo = (time.monotonic() + ttl, compact)
                 return compact
         
         # 缓存失效，返回基础人设
         base_persona = self.state.get("base_persona", "")
         logger.debug("[人生故事引擎] 缓存失效，使用基础人设")
+        self._ctx_memo = (time.monotonic() + self.CONTEXT_MEMO_SECONDS, base_persona)
         return base_persona
     
     def get_summary(self) -> str:
@@ -1,8 +1,16 @@
+import hashlib
+import logging
+import os
 import random
 import re
+import time
+import uuid
+from collections import OrderedDict, defaultdict, deque
+from dataclasses import dataclass
 from datetime import datetime
+from functools import partial
 from pathlib import Path
-from typing import Any
+from typing import Any, Awaitable, Callable
 
 import aiohttp
 import asyncio
@@ -15,10 +23,246 @@ from astrbot.core.provider.provider import Provider
 from astrbot.core.star.context import Context
 from astrbot.core.star.star_tools import StarTools
 
+from .local_data_manager import LocalDataManager
 from .post import Post
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# 日记正文：第一对三引号之间的内容
+_DIARY_RE = re.compile(r'"""(.*?)"""', re.S)
+
+# 生图缓存图片的文件名（不含扩展名）：缓存键，即 sha256 十六进制串
+_IMAGE_CACHE_NAME_RE = re.compile(r"[0-9a-f]{64}")
+
+# 评论中需要去掉的空白：与正则 \s 匹配的字符相同（Unicode 空白，含全角空格），用 str.translate 一次删除
+_WS_TABLE = dict.fromkeys(
+    map(ord, "\t\n\v\f\r\x1c\x1d\x1e\x1f \x85\xa0\u1680\u2000\u2001\u2002\u2003\u2004\u2005"
+             "\u2006\u2007\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000"),
+    None,
+)
+
+
+def _loads(data) -> Any:
+    """解析 JSON 文本或字节"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _dumps_pretty(data: Any) -> str:
+    """格式化 JSON 用于日志（缩进 2 格，中文不转义）"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode("utf-8")
+    return json.dumps(data, ensure_ascii=False, indent=2)
+
+
+def _dumps_body(payload: Any) -> bytes:
+    """序列化请求体为 JSON 字节（orjson 输出 UTF-8；标准库按默认转义为 ASCII，编码更快）"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(payload)
+    return json.dumps(payload).encode("ascii")
+
+
+def _write_file_atomic(path: Path, chunks: list[bytes]) -> None:
+    """写入唯一的临时文件后原子替换为目标文件，失败时删除临时文件（在线程中调用）
+
+    同一缓存键的并发下载各写各的临时文件，互不覆盖，也不会删掉另一方已完成的图片。
+    """
+    tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex[:8]}.part")
+    try:
+        with open(tmp_path, "wb") as f:
+            f.writelines(chunks)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def _extract_images_key(data: dict) -> str | None:
+    """格式1: {"images": [{"url": "..."}]} 或 {"images": ["..."]} (Tongyi-MAI/Z-Image-Turbo)"""
+    images = data.get("images") or []
+    if images:
+        first = images[0]
+        return first.get("url") if isinstance(first, dict) else first
+    return None
+
+
+def _extract_output_images(data: dict) -> str | None:
+    """格式2: {"output_images": ["..."]} (旧版格式)"""
+    output_images = data.get("output_images") or []
+    return output_images[0] if output_images else None
+
+
+# ModelScope 同步返回图片 URL 的各种格式，按顺序尝试
+_MS_IMAGE_EXTRACTORS = (_extract_images_key, _extract_output_images)
+
+
+def _extract_ms_url(data: dict) -> str | None:
+    """ModelScope: 依次尝试各种同步返回格式"""
+    for extract in _MS_IMAGE_EXTRACTORS:
+        image_url = extract(data)
+        if image_url:
+            return image_url
+    return None
+
+
+def _extract_openai_url(data: dict) -> str | None:
+    """OpenAI: {"data": [{"url": "..."}]}"""
+    items = data.get("data") or []
+    return items[0].get("url") if items else None
+
+
+def _extract_aliyun_url(data: dict) -> str | None:
+    """阿里云: {"output": {"results": [{"url": "..."}]}}"""
+    results = (data.get("output") or {}).get("results") or []
+    return results[0].get("url") if results else None
+
+
+def _openai_size(size: str) -> str:
+    """OpenAI DALL-E 只支持 256x256、512x512、1024x1024，映射到最接近的尺寸（默认 1024x1024）"""
+    for side in ("256", "512", "1024"):
+        if side in size:
+            return f"{side}x{side}"
+    return "1024x1024"
+
+
+@dataclass(frozen=True, slots=True)
+class _ImageProviderSpec:
+    """绘图平台的请求规格，各平台只在这些字段上不同，请求流程由 LLMAction._request_generic 统一处理"""
+    # 缓存键中的平台名与日志前缀
+    name: str
+    label: str
+    # 配置项：API 密钥、API 地址、模型
+    api_key_key: str
+    api_url_key: str
+    default_api_url: str
+    model_key: str
+    default_model: str
+    # 拼接在 API 地址后的生图接口路径
+    path: str
+    # 尺寸格式转换、构建请求体 (模型, 提示词, 尺寸)、从响应中提取图片 URL
+    convert_size: Callable[[str], str]
+    build_payload: Callable[[str, str, str], dict[str, Any]]
+    extract_url: Callable[[dict], str | None]
+    # 未同步返回图片时是否按 {"task_id": "..."} 轮询异步任务
+    async_task: bool = False
+
+
+_MODELSCOPE_SPEC = _ImageProviderSpec(
+    name="modelscope",
+    label="ModelScope",
+    api_key_key="api_key",
+    api_url_key="api_url",
+    default_api_url="https://api.modelscope.com/api/",
+    model_key="ms_model",
+    default_model="iic/sdxl-turbo",
+    path="v1/images/generations",
+    convert_size=str,
+    build_payload=lambda model, prompt, size: {"model": model, "prompt": prompt, "size": size},
+    extract_url=_extract_ms_url,
+    async_task=True,
+)
+
+# 配置中的平台名 -> 请求规格
+_PROVIDER_SPECS: dict[str, _ImageProviderSpec] = {
+    "ms": _MODELSCOPE_SPEC,
+    "modelscope": _MODELSCOPE_SPEC,
+    "openai": _ImageProviderSpec(
+        name="openai",
+        label="OpenAI DALL-E",
+        api_key_key="openai_api_key",
+        api_url_key="openai_api_url",
+        default_api_url="https://api.openai.com/v1",
+        model_key="openai_model",
+        default_model="dall-e-3",
+        path="/images/generations",
+        convert_size=_openai_size,
+        build_payload=lambda model, prompt, size: {"model": model, "prompt": prompt, "n": 1, "size": size},
+        extract_url=_extract_openai_url,
+    ),
+    "aliyun": _ImageProviderSpec(
+        name="aliyun",
+        label="阿里云通义万相",
+        api_key_key="aliyun_api_key",
+        api_url_key="aliyun_api_url",
+        default_api_url="https://dashscope.aliyuncs.com/api/v1",
+        model_key="aliyun_model",
+        default_model="wanx-v1",
+        path="/services/aigc/text2image",
+        # 阿里云尺寸格式为 "1024*1024"
+        convert_size=lambda size: size.replace("x", "*"),
+        build_payload=lambda model, prompt, size: {
+            "model": model,
+            "input": {"prompt": prompt, "size": size},
+            "parameters": {"n": 1},
+        },
+        extract_url=_extract_aliyun_url,
+    ),
+}
+
 
 class LLMAction:
+    # 生图结果缓存的有效期（秒）与缓存图片总大小的默认上限（字节）
+    IMAGE_CACHE_TTL = 7 * 86400
+    IMAGE_CACHE_MAX_BYTES = 200 * 1024 * 1024
+    # 历史压缩时同时进行的摘要 LLM 调用数上限
+    SUMMARY_CONCURRENCY = 4
+    # 单条内容不超过该长度时直接保留，不做摘要：按字符数 / 按 token 数（安装了 tiktoken 时）
+    SUMMARY_MIN_CHARS = 500
+    SUMMARY_MIN_TOKENS = 300
+    # tiktoken 编码，首次压缩历史时加载；加载失败时为 False，之后按字符数判断
+    _token_encoding = None
+    # 评论缓存的最大条数（相同帖子直接复用生成过的评论）
+    COMMENT_CACHE_SIZE = 256
+    # 天气描述在进程内缓存的时间（秒）；查询失败时在较短时间内不再重试；查询超时（秒）
+    WEATHER_CACHE_TTL = 1800
+    WEATHER_FAILURE_TTL = 300
+    WEATHER_TIMEOUT = 3
+    # ModelScope 异步任务轮询：指数退避的初始间隔、倍数、最大间隔（秒）与最多查询次数
+    MS_POLL_BASE = 0.3
+    MS_POLL_MULTIPLIER = 2.0
+    MS_POLL_MAX_INTERVAL = 10.0
+    MS_POLL_MAX_ATTEMPTS = 30
+    # 下载图片时每次读取的块大小（字节）
+    DOWNLOAD_CHUNK_SIZE = 64 * 1024
+    # 接口报错时最多读取并记录的响应体字节数
+    ERROR_PREVIEW_BYTES = 4096
+    # 日程中标识穿着信息的关键词（"今日穿搭" 已包含在 "穿搭" 中）
+    OUTFIT_KEYWORDS = ("穿搭", "穿着")
+    # 绘图平台对冲：当前平台超过该时间（秒）仍未出图时并行启动下一个平台，最多额外并行启动的次数
+    HEDGE_DELAY_S = 8.0
+    MAX_HEDGES = 1
+    # 绘图平台熔断：统计窗口（秒）内失败率超过阈值时跳过该平台，每隔探测间隔（秒）放行一次请求试探恢复
+    PROVIDER_HEALTH_WINDOW = 60.0
+    PROVIDER_FAILURE_RATIO = 0.5
+    PROVIDER_PROBE_INTERVAL = 30.0
+    PROVIDER_HEALTH_SIZE = 32
+    # 各平台耗时的指数加权平均系数
+    PROVIDER_LATENCY_ALPHA = 0.3
+    # 未配置 diary_prompt 时使用的写作风格提示
+    DEFAULT_DIARY_PROMPT = (
+        "写作风格：\n"
+        "- 用口语化、随意的语气，像朋友圈那样轻松\n"
+        "- 可以包含 Emoji 表情增加生动性\n"
+        "- 只写 2-3 句话，简洁明了\n"
+        "- 不要长篇大论，不要流水账式的叙述\n"
+        "- 可以是分享心情、小感慨、有趣的事、即时感受、思考、或者emo等\n"
+        "\n示例：\n"
+        "- “今天天气超好，在公园晒了一下午的太阳🌞”\n"
+        "- “终于学会了那道难题，感觉自己还是挺聪明的呀😏”\n"
+        "- “晚风很舒服，散步回家的路上看到了超美的晚霞✨”"
+    )
+
     def __init__(self, context: Context, config: AstrBotConfig, client: CQHttp):
         self.context = context
         self.config = config
@@ -37,6 +281,173 @@ class LLMAction:
         self.ms_size: str = self.config.get("size", "1080x1920")
         self.weather_location: str = self.config.get("weather_location", "")
 
+        # 随机选群时跳过的群号，转为集合后按 O(1) 判断
+        self._ignore_groups_set: set[str] = {str(gid) for gid in (self.config.get("ignore_groups", []) or [])}
+
+        # 生成日记/评论/绘画提示词时用到的配置，构造时读取一次
+        self._diary_max_msg = int(self.config.get("diary_max_msg", 100))
+        self._diary_prompt: str = self.config.get("diary_prompt", self.DEFAULT_DIARY_PROMPT)
+        self._comment_prompt: str = self.config.get("comment_prompt", "请根据帖子内容生成一条简短的评论。")
+        self._image_forbidden_rules: str = (self.config.get("image_forbidden_rules", "") or "").strip()
+
+        # 所有外部 HTTP 请求共用一个会话，复用连接池与 keep-alive（首次使用时创建）
+        self._session: aiohttp.ClientSession | None = None
+        self._session_lock = asyncio.Lock()
+
+        # 生图结果缓存：(平台, 模型, 尺寸, 提示词) 哈希 -> {"path": 本地图片路径, "expires_at": 过期时间戳, "size": 字节数}
+        # 图片以哈希命名保存；按最近使用顺序排列，超过总大小上限时淘汰最久未用的图片
+        self._image_cache_file = StarTools.get_data_dir("astrbot_plugin_realistic_persona") / "image_cache.json"
+        self._image_cache: dict[str, dict[str, Any]] = self._load_image_cache()
+        self._image_cache_lock = asyncio.Lock()
+        self._image_cache_max_bytes = int(self.config.get("image_cache_max_bytes", self.IMAGE_CACHE_MAX_BYTES))
+
+        # 各绘图平台最近的调用结果 (time.monotonic(), 是否成功)、上次熔断探测时间、平均耗时（秒）
+        self._provider_health: defaultdict[str, deque[tuple[float, bool]]] = defaultdict(
+            lambda: deque(maxlen=self.PROVIDER_HEALTH_SIZE)
+        )
+        self._provider_last_probe: dict[str, float] = {}
+        self._provider_latency: dict[str, float] = {}
+
+        # 天气描述缓存：(time.monotonic() 获取时间, 地点, 描述)
+        self._weather_cache: tuple[float, str, str] | None = None
+        self._weather_lock = asyncio.Lock()
+
+        # 限制并发摘要调用数
+        self._summary_semaphore = asyncio.Semaphore(self.SUMMARY_CONCURRENCY)
+
+        # 首次压缩历史时加载 tiktoken 编码，并发调用只加载一次
+        self._token_encoding_lock = asyncio.Lock()
+
+        # 评论缓存：帖子内容哈希 -> 评论，按最近使用顺序排列
+        self._comment_cache: OrderedDict[str, str] = OrderedDict()
+
+        # 当天日程缓存：(日期, 日程文本)，同一天内不重复读取文件
+        self._schedule_cache: tuple[str, str] | None = None
+
+        # 各会话已拉取的历史消息：{"g:群号" / "u:QQ号": {"ids": [...], "contexts": [...], "last_time": 最新消息时间}}
+        self._msg_ctx_cache_file = StarTools.get_data_dir("astrbot_plugin_realistic_persona") / "msg_context_cache.json"
+        self._msg_ctx_cache: dict[str, dict[str, Any]] = self._load_msg_ctx_cache()
+        self._msg_ctx_cache_lock = asyncio.Lock()
+
+    def _load_image_cache(self) -> dict[str, dict[str, Any]]:
+        """加载生图缓存，丢弃已过期或图片已不存在的条目，并删除不在索引中的缓存图片"""
+        cache = {}
+        try:
+            if self._image_cache_file.exists():
+                with open(self._image_cache_file, "r", encoding="utf-8") as f:
+                    cache = json.load(f)
+                now = time.time()
+                cache = {
+                    key: entry for key, entry in cache.items()
+                    if entry.get("expires_at", 0) > now and Path(entry["path"]).exists()
+                }
+        except Exception as e:
+            logger.warning(f"[绘图] 加载生图缓存失败: {e}")
+            cache = {}
+        self._sweep_image_cache_files(cache)
+        return cache
+
+    @staticmethod
+    def _sweep_image_cache_files(cache: dict[str, dict[str, Any]]) -> None:
+        """删除 images 目录中不在缓存索引里的缓存图片（已过期、已丢弃或索引写入前中断的），避免占用空间无限增长"""
+        images_dir = StarTools.get_data_dir("astrbot_plugin_realistic_persona") / "images"
+        if not images_dir.is_dir():
+            return
+        removed = 0
+        for path in images_dir.iterdir():
+            # 未完成下载残留的临时文件，以及不在索引中的缓存图片
+            if path.suffix == ".part" or (
+                path.suffix == ".png" and _IMAGE_CACHE_NAME_RE.fullmatch(path.stem) and path.stem not in cache
+            ):
+                try:
+                    path.unlink()
+                    removed += 1
+                except OSError as e:
+                    logger.warning(f"[绘图] 删除过期缓存图片失败: {path}, {e}")
+        if removed:
+            logger.info("[绘图] 已删除 %d 张不在缓存索引中的缓存图片", removed)
+
+    @staticmethod
+    def _image_cache_key(provider: str, model: str, size: str, prompt: str) -> str:
+        """生图缓存键，同时用作缓存图片的文件名"""
+        return hashlib.sha256(f"{provider}|{model}|{size}|{prompt}".encode("utf-8")).hexdigest()
+
+    def _get_cached_image(self, key: str) -> str | None:
+        """返回仍有效的缓存图片路径，并将其标记为最近使用"""
+        entry = self._image_cache.get(key)
+        if entry and entry["expires_at"] > time.time() and Path(entry["path"]).exists():
+            self._image_cache[key] = self._image_cache.pop(key)
+            return entry["path"]
+        return None
+
+    async def _save_image_cache_entry(self, key: str, local_path: str) -> None:
+        """记录一条生图结果，淘汰过期及超出总大小上限的旧图片后写盘（文件操作在线程中执行）"""
+        async with self._image_cache_lock:
+            now = time.time()
+            size = (await asyncio.to_thread(Path(local_path).stat)).st_size
+            self._image_cache.pop(key, None)
+            self._image_cache[key] = {
+                "path": local_path,
+                "expires_at": now + self.IMAGE_CACHE_TTL,
+                "size": size,
+            }
+            
+            evicted = {k for k, entry in self._image_cache.items() if entry["expires_at"] <= now}
+            total = sum(entry.get("size", 0) for k, entry in self._image_cache.items() if k not in evicted)
+            for k, entry in self._image_cache.items():
+                if total <= self._image_cache_max_bytes or k == key:
+                    break
+                if k not in evicted:
+                    evicted.add(k)
+                    total -= entry.get("size", 0)
+            evicted_paths = [self._image_cache.pop(k)["path"] for k in evicted]
+            
+            try:
+                await asyncio.to_thread(self._write_image_cache, dict(self._image_cache), evicted_paths)
+            except Exception as e:
+                logger.warning(f"[绘图] 保存生图缓存失败: {e}")
+
+    def _write_image_cache(self, cache: dict[str, dict[str, Any]], evicted_paths: list[str]) -> None:
+        """写入缓存索引后再删除被淘汰的图片（先写临时文件再替换，避免写入中断留下损坏的索引）"""
+        tmp_path = self._image_cache_file.with_suffix(self._image_cache_file.suffix + ".tmp")
+        tmp_path.write_bytes(_dumps_body(cache))
+        os.replace(tmp_path, self._image_cache_file)
+        for path in evicted_paths:
+            Path(path).unlink(missing_ok=True)
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """获取共享的 HTTP 会话，不存在或已关闭时新建"""
+        async with self._session_lock:
+            if self._session is None or self._session.closed:
+                self._session = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(limit=32, limit_per_host=16, ttl_dns_cache=300, keepalive_timeout=60),
+                    timeout=aiohttp.ClientTimeout(total=60),
+                )
+            return self._session
+
+    async def terminate(self) -> None:
+        """关闭共享的 HTTP 会话"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def request_image(self, provider: str | None, prompt: str, size: str | None = None) -> str:
+        """生成图片，返回本地图片路径
+        
+        Args:
+            provider: 指定绘图平台（如 "modelscope"）；为 None 时按配置的主平台和备用平台自动切换
+            prompt: 图片生成提示词
+            size: 图片尺寸，默认使用配置中的尺寸
+            
+        Raises:
+            ValueError: 平台不支持或生成失败时
+        """
+        if provider is None:
+            return await self._request_image_with_fallback(prompt, size)
+        if provider not in _PROVIDER_SPECS:
+            raise ValueError(f"不支持的绘图平台: {provider}")
+        return await self._request_generic(provider, prompt, size)
+
     async def _request_image_with_fallback(self, prompt: str, size: str | None = None) -> str:
         """调用图片生成API，支持多平台和自动切换
         
@@ -59,354 +470,396 @@ class LLMAction:
         
         logger.info(f"[绘图] 尝试平台列表: {all_providers}，主平台: {primary_provider}")
         
-        last_error = None
-        for provider in all_providers:
-            try:
-                logger.info(f"[绘图] 尝试使用平台: {provider}")
-                
-                if provider in ["ms", "modelscope"]:
-                    # ModelScope 平台
-                    if not self.ms_api_key:
-                        logger.warning(f"[绘图] {provider} 平台未配置API密钥，跳过")
-                        continue
-                    return await self._request_modelscope(prompt, size)
-                elif provider == "openai":
-                    # OpenAI 平台
-                    openai_api_key = self.config.get("openai_api_key", "")
-                    if not openai_api_key:
-                        logger.warning(f"[绘图] OpenAI 平台未配置API密钥，跳过")
-                        continue
-                    return await self._request_openai_dalle(prompt, size)
-                elif provider == "aliyun":
-                    # 阿里云平台
-                    aliyun_api_key = self.config.get("aliyun_api_key", "")
-                    if not aliyun_api_key:
-                        logger.warning(f"[绘图] 阿里云平台未配置API密钥，跳过")
-                        continue
-                    return await self._request_aliyun(prompt, size)
-                else:
-                    logger.warning(f"[绘图] 不支持的平台: {provider}，跳过")
-                    continue
-                    
-            except Exception as e:
-                logger.warning(f"[绘图] {provider} 平台调用失败: {e}")
-                last_error = e
-                continue  # 尝试下一个平台
-        
-        # 如果所有平台都失败了
-        if last_error:
-            logger.error(f"[绘图] 所有绘图平台都失败了，最后错误: {last_error}")
-            raise ValueError(f"所有绘图平台都失败了: {last_error}")
-        else:
+        attempts = self._image_provider_attempts(all_providers)
+        if not attempts:
             raise ValueError("没有配置任何绘图平台")
-    
-    async def _request_modelscope(self, prompt: str, size: str | None = None) -> str:
-        """调用 ModelScope 文生图，下载并保存到本地，返回本地路径"""
-        if not self.ms_api_key:
-            raise ValueError("未配置 ms_api_key，无法使用 ModelScope 生图")
-        size = size or self.ms_size
-        headers = {
-            "Authorization": f"Bearer {self.ms_api_key}",
-            "Content-Type": "application/json",
-        }
-        payload = {
-            "model": self.ms_model,
-            "prompt": prompt,
-            "size": size,
-        }
         
-        url = f"{self.ms_api_url}v1/images/generations"
-        logger.info(f"[ModelScope] 请求URL: {url}")
-        logger.info(f"[ModelScope] 请求参数: model={self.ms_model}, size={size}, prompt={prompt[:50]}...")
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                url,
-                headers=headers,
-                data=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
-            ) as resp:
-                resp_text = await resp.text()
-                logger.info(f"[ModelScope] 响应状态: {resp.status}")
-                logger.info(f"[ModelScope] 响应内容: {resp_text[:1000]}...")
-                
-                if resp.status != 200:
-                    logger.error(f"[ModelScope] API调用失败: HTTP {resp.status}")
-                    logger.error(f"[ModelScope] 错误详情: {resp_text}")
-                    raise ValueError(f"ModelScope API调用失败: HTTP {resp.status}, {resp_text[:200]}")
-                
-                try:
-                    data = json.loads(resp_text)
-                    logger.info(f"[ModelScope] 解析后的数据键: {list(data.keys())}")
-                except json.JSONDecodeError as e:
-                    logger.error(f"[ModelScope] 响应解析失败: {e}")
-                    raise ValueError(f"ModelScope 响应解析失败: {e}")
-        
-        # 兼容多种返回格式
-        image_url = None
-        
-        # 格式1: {"images": [{"url": "..."}]} (Tongyi-MAI/Z-Image-Turbo)
-        if "images" in data and data["images"]:
-            if isinstance(data["images"], list) and len(data["images"]) > 0:
-                first_image = data["images"][0]
-                if isinstance(first_image, dict) and "url" in first_image:
-                    image_url = first_image["url"]
-                    logger.info(f"[ModelScope] 同步返回图片URL (格式1): {image_url[:50]}...")
-                elif isinstance(first_image, str):
-                    image_url = first_image
-                    logger.info(f"[ModelScope] 同步返回图片URL (格式1字符串): {image_url[:50]}...")
-        
-        # 格式2: {"output_images": ["..."]} (旧版格式)
-        elif "output_images" in data and data["output_images"]:
-            image_url = data["output_images"][0]
-            logger.info(f"[ModelScope] 同步返回图片URL (格式2): {image_url[:50]}...")
-        
-        # 格式3: 异步任务 {"task_id": "..."}
-        elif "task_id" in data:
-            task_id = data["task_id"]
-            logger.info(f"[ModelScope] 异步任务ID: {task_id}")
-            delay = 1
-            max_retries = 30
-            retry_count = 0
-            while retry_count < max_retries:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(
-                        f"{self.ms_api_url}v1/tasks/{task_id}",
-                        headers={
-                            "Authorization": f"Bearer {self.ms_api_key}",
-                            "Content-Type": "application/json",
-                            "X-ModelScope-Task-Type": "image_generation",
-                        },
-                    ) as r2:
-                        if r2.status == 200:
-                            tdata = await r2.json()
-                            task_status = tdata.get("task_status")
-                            logger.debug(f"[ModelScope] 任务状态: {task_status}")
-                            
-                            if task_status == "SUCCEED":
-                                imgs = tdata.get("output_images", [])
-                                if imgs:
-                                    image_url = imgs[0]
-                                    logger.info(f"[ModelScope] 任务成功，图片URL: {image_url[:50]}...")
-                                break
-                            elif task_status == "FAILED":
-                                error_msg = tdata.get("error", "未知错误")
-                                logger.error(f"[ModelScope] 任务失败: {error_msg}")
-                                break
-                        else:
-                            logger.warning(f"[ModelScope] 查询任务状态失败: HTTP {r2.status}")
-                
-                await asyncio.sleep(delay)
-                delay = min(delay * 2, 10)
-                retry_count += 1
-            
-            if retry_count >= max_retries:
-                logger.error(f"[ModelScope] 任务超时，重试{max_retries}次后仍未完成")
+        # 命中生图缓存时按配置顺序直接返回：不经过熔断排序和对冲，也不计入平台的健康统计与平均耗时
+        for provider, _ in attempts:
+            cached_path = self._get_cached_image(self._provider_cache_key(provider, prompt, size))
+            if cached_path:
+                logger.info(f"[绘图] {provider} 平台命中生图缓存: {cached_path}")
+                return cached_path
         
-        if not image_url:
-            logger.error(f"[ModelScope] 未找到图片URL")
-            logger.error(f"[ModelScope] 完整响应数据: {json.dumps(data, ensure_ascii=False, indent=2)}")
-            raise ValueError("ModelScope 未返回图片 URL")
+        attempts = self._order_by_health(attempts)
         
-        # 下载图片到本地
-        local_path = await self._download_image(image_url)
-        logger.info(f"[ModelScope] 生成的图片已保存到: {local_path}")
-        return local_path
-    
-    async def _download_image(self, url: str) -> str:
-        """下载图片到本地，返回本地路径"""
-        # 创建images目录
-        images_dir = StarTools.get_data_dir("astrbot_plugin_realistic_persona") / "images"
-        images_dir.mkdir(parents=True, exist_ok=True)
+        # 对冲请求：先启动主平台，超过 hedge_delay 仍未出图时并行启动下一个平台；
+        # 某个平台失败时立即由下一个接替；最先出图的结果胜出，其余请求取消
+        hedge_delay = float(self.config.get("hedge_delay_s", self.HEDGE_DELAY_S))
+        max_hedges = int(self.config.get("max_hedges", self.MAX_HEDGES))
+        pending: dict[asyncio.Task, tuple[str, float]] = {}
+        next_index = 0
+        hedges = 0
+        last_error = None
         
-        # 生成文件名（使用时间戳）
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"generated_{timestamp}.png"
-        local_path = images_dir / filename
+        def launch_next() -> None:
+            nonlocal next_index
+            provider, request = attempts[next_index]
+            next_index += 1
+            logger.info(f"[绘图] 尝试使用平台: {provider}")
+            pending[asyncio.create_task(request(prompt, size))] = (provider, time.monotonic())
         
-        # 下载图片
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as resp:
-                resp.raise_for_status()
-                content = await resp.read()
-                with open(local_path, 'wb') as f:
-                    f.write(content)
+        launch_next()
+        try:
+            while pending:
+                can_hedge = next_index < len(attempts) and hedges < max_hedges
+                done, _ = await asyncio.wait(
+                    pending,
+                    timeout=hedge_delay if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    hedges += 1
+                    logger.info(f"[绘图] {hedge_delay} 秒内未出图，并行启动备用平台")
+                    launch_next()
+                    continue
+                
+                winner = None
+                failures = 0
+                for task in done:
+                    provider, started = pending.pop(task)
+                    error = task.exception()
+                    self._record_provider_result(provider, error is None, time.monotonic() - started)
+                    if error is None:
+                        if winner is None:
+                            winner = (provider, task.result())
+                    else:
+                        logger.warning(f"[绘图] {provider} 平台调用失败: {error}")
+                        last_error = error
+                        failures += 1
+                if winner is not None:
+                    logger.info(f"[绘图] 使用 {winner[0]} 平台生成成功")
+                    return winner[1]
+                
+                for _ in range(failures):
+                    if next_index < len(attempts):
+                        launch_next()
+        finally:
+            # 取消仍在进行的请求，并等待其清理完成（如删除未下载完的图片）
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
         
-        return str(local_path)
+        logger.error(f"[绘图] 所有绘图平台都失败了，最后错误: {last_error}")
+        raise ValueError(f"所有绘图平台都失败了: {last_error}")
     
-    async def _request_openai_dalle(self, prompt: str, size: str | None = None) -> str:
-        """调用 OpenAI DALL-E 生成图片"""
-        openai_api_key = self.config.get("openai_api_key", "")
-        openai_api_url = self.config.get("openai_api_url", "https://api.openai.com/v1")
-        
-        if not openai_api_key:
-            raise ValueError("未配置 openai_api_key，无法使用 OpenAI DALL-E 生图")
-        
-        # 将尺寸转换为 OpenAI 支持的格式
-        size = size or self.ms_size
-        # OpenAI DALL-E 支持 256x256, 512x512, 1024x1024
-        # 将其他尺寸映射到最接近的 OpenAI 支持的尺寸
-        if "256" in size:
-            openai_size = "256x256"
-        elif "512" in size:
-            openai_size = "512x512"
-        elif "1024" in size:
-            openai_size = "1024x1024"
-        else:
-            # 默认使用 1024x1024
-            openai_size = "1024x1024"
+    def _provider_is_open(self, provider: str, now: float) -> bool:
+        """统计窗口内的失败率是否超过阈值（熔断打开）"""
+        recent = [ok for ts, ok in self._provider_health.get(provider, ()) if now - ts <= self.PROVIDER_HEALTH_WINDOW]
+        return bool(recent) and recent.count(False) / len(recent) > self.PROVIDER_FAILURE_RATIO
+
+    def _record_provider_result(self, provider: str, ok: bool, elapsed: float) -> None:
+        """记录一次平台调用结果；成功时更新平均耗时"""
+        self._provider_health[provider].append((time.monotonic(), ok))
+        if ok:
+            last = self._provider_latency.get(provider)
+            alpha = self.PROVIDER_LATENCY_ALPHA
+            self._provider_latency[provider] = elapsed if last is None else alpha * elapsed + (1 - alpha) * last
+
+    def _order_by_health(self, attempts: list[tuple[str, Callable[[str, str | None], Awaitable[str]]]]) -> list[tuple[str, Callable[[str, str | None], Awaitable[str]]]]:
+        """熔断中的平台跳过，到了探测时间的排在最前放行一次请求试探恢复（失败或超时由其余平台接替）；
+        健康的平台按平均耗时从快到慢排列（没有耗时记录的保持配置顺序排在后面）；全部熔断时按原顺序全部尝试"""
+        now = time.monotonic()
+        healthy, probing = [], []
+        for attempt in attempts:
+            provider = attempt[0]
+            if not self._provider_is_open(provider, now):
+                healthy.append(attempt)
+            elif now - max(self._provider_last_probe.get(provider, 0.0), self._provider_health[provider][-1][0]) >= self.PROVIDER_PROBE_INTERVAL:
+                self._provider_last_probe[provider] = now
+                logger.info(f"[绘图] {provider} 平台处于熔断状态，放行一次请求试探恢复")
+                probing.append(attempt)
+            else:
+                logger.info(f"[绘图] {provider} 平台近期失败率过高，暂时跳过")
+        if not healthy and not probing:
+            logger.warning("[绘图] 所有绘图平台都处于熔断状态，按原顺序全部尝试")
+            return attempts
+        healthy.sort(key=lambda attempt: self._provider_latency.get(attempt[0], float("inf")))
+        return probing + healthy
+
+    def _image_provider_attempts(self, providers: list[str]) -> list[tuple[str, Callable[[str, str | None], Awaitable[str]]]]:
+        """按顺序筛选出已配置的绘图平台，返回 (平台名, 请求方法) 列表"""
+        attempts = []
+        for provider in providers:
+            spec = _PROVIDER_SPECS.get(provider)
+            if spec is None:
+                logger.warning(f"[绘图] 不支持的平台: {provider}，跳过")
+                continue
+            if not self.config.get(spec.api_key_key):
+                logger.warning(f"[绘图] {spec.label} 平台未配置API密钥，跳过")
+                continue
+            attempts.append((provider, partial(self._request_generic, provider)))
+        return attempts
+    
+    def _provider_cache_key(self, provider: str, prompt: str, size: str | None = None) -> str:
+        """按平台规格计算生图缓存键（模型取自配置，尺寸转换为平台格式）"""
+        spec = _PROVIDER_SPECS[provider]
+        model = self.config.get(spec.model_key, spec.default_model)
+        return self._image_cache_key(spec.name, model, spec.convert_size(size or self.ms_size), prompt)
+
+    async def _request_generic(self, provider: str, prompt: str, size: str | None = None) -> str:
+        """按平台规格调用文生图接口，下载并保存到本地，返回本地路径
         
+        流程对各平台相同：查生图缓存 → 请求接口 → 检查状态码 → 解析 JSON → 提取图片 URL → 下载图片。
+        """
+        spec = _PROVIDER_SPECS[provider]
+        tag = spec.label
+        api_key = self.config.get(spec.api_key_key)
+        if not api_key:
+            raise ValueError(f"未配置 {spec.api_key_key}，无法使用 {tag} 生图")
+
+        # 相同平台、模型、尺寸、提示词已生成过且图片仍在本地时直接复用
+        cache_key = self._provider_cache_key(provider, prompt, size)
+        model = self.config.get(spec.model_key, spec.default_model)
+        size = spec.convert_size(size or self.ms_size)
+        cached_path = self._get_cached_image(cache_key)
+        if cached_path:
+            logger.info("[%s] 命中生图缓存: %s", tag, cached_path)
+            return cached_path
+
         headers = {
-            "Authorization": f"Bearer {openai_api_key}",
+            "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json",
         }
+        url = self.config.get(spec.api_url_key, spec.default_api_url) + spec.path
+        logger.info("[%s] 请求URL: %s", tag, url)
+        logger.info("[%s] 请求参数: model=%s, size=%s, prompt=%s...", tag, model, size, prompt[:50])
         
-        # 获取模型配置
-        openai_model = self.config.get("openai_model", "dall-e-3")
-        
-        # 构建请求数据
-        payload = {
-            "model": openai_model,  # 从配置获取模型
-            "prompt": prompt,
-            "n": 1,
-            "size": openai_size,
-        }
-        
-        url = f"{openai_api_url}/images/generations"
-        logger.info(f"[OpenAI DALL-E] 请求URL: {url}")
-        logger.info(f"[OpenAI DALL-E] 请求参数: size={openai_size}, prompt={prompt[:50]}...")
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json=payload) as resp:
-                resp_text = await resp.text()
-                logger.info(f"[OpenAI DALL-E] 响应状态: {resp.status}")
-                logger.info(f"[OpenAI DALL-E] 响应内容: {resp_text[:1000]}...")
+        session = await self._get_session()
+        async with session.post(url, headers=headers, data=_dumps_body(spec.build_payload(model, prompt, size))) as resp:
+            logger.info("[%s] 响应状态: %s", tag, resp.status)
                 
-                if resp.status != 200:
-                    logger.error(f"[OpenAI DALL-E] API调用失败: HTTP {resp.status}")
-                    logger.error(f"[OpenAI DALL-E] 错误详情: {resp_text}")
-                    raise ValueError(f"OpenAI DALL-E API调用失败: HTTP {resp.status}, {resp_text[:200]}")
+            if resp.status != 200:
+                # 只读取错误响应体的开头部分，避免把过大的错误页整体读入内存
+                err_preview = (await resp.content.read(self.ERROR_PREVIEW_BYTES)).decode("utf-8", "replace")
+                logger.error("[%s] API调用失败: HTTP %s", tag, resp.status)
+                logger.error("[%s] 错误详情: %s", tag, err_preview)
+                raise ValueError(f"{tag} API调用失败: HTTP {resp.status}, {err_preview[:200]}")
                 
-                try:
-                    data = json.loads(resp_text)
-                except json.JSONDecodeError as e:
-                    logger.error(f"[OpenAI DALL-E] 响应解析失败: {e}")
-                    raise ValueError(f"OpenAI DALL-E 响应解析失败: {e}")
-        
-        # 从响应中提取图片URL
-        if "data" not in data or not data["data"]:
-            logger.error(f"[OpenAI DALL-E] 未找到图片数据")
-            logger.error(f"[OpenAI DALL-E] 完整响应数据: {json.dumps(data, ensure_ascii=False, indent=2)}")
-            raise ValueError("OpenAI DALL-E 未返回图片数据")
-        
-        image_url = data["data"][0].get("url")
+            # 直接从响应字节解析 JSON，不先解码为完整字符串
+            try:
+                data = await resp.json(loads=_loads, content_type=None)
+                logger.info("[%s] 解析后的数据键: %s", tag, list(data.keys()))
+            except ValueError as e:
+                preview = (await resp.text())[:500]
+                logger.error("[%s] 响应解析失败: %s, 响应内容: %s", tag, e, preview)
+                raise ValueError(f"{tag} 响应解析失败: {e}")
+        
+        # 先找同步返回的图片URL，平台支持异步任务时再按 {"task_id": "..."} 轮询
+        image_url = spec.extract_url(data)
+        if image_url:
+            logger.info("[%s] 同步返回图片URL: %s...", tag, image_url[:50])
+        elif spec.async_task and "task_id" in data:
+            task_id = data["task_id"]
+            logger.info("[%s] 异步任务ID: %s", tag, task_id)
+            image_url = await self._poll_task(task_id)
+        
         if not image_url:
-            logger.error(f"[OpenAI DALL-E] 未找到图片URL")
-            logger.error(f"[OpenAI DALL-E] 完整响应数据: {json.dumps(data, ensure_ascii=False, indent=2)}")
-            raise ValueError("OpenAI DALL-E 未返回图片 URL")
+            logger.error("[%s] 未找到图片URL", tag)
+            if logger.isEnabledFor(logging.ERROR):
+                logger.error("[%s] 完整响应数据: %s", tag, _dumps_pretty(data))
+            raise ValueError(f"{tag} 未返回图片 URL")
         
         # 下载图片到本地
-        local_path = await self._download_image(image_url)
-        logger.info(f"[OpenAI DALL-E] 生成的图片已保存到: {local_path}")
+        local_path = await self._download_image(image_url, cache_key)
+        logger.info("[%s] 生成的图片已保存到: %s", tag, local_path)
+        await self._save_image_cache_entry(cache_key, local_path)
         return local_path
     
-    async def _request_aliyun(self, prompt: str, size: str | None = None) -> str:
-        """调用阿里云通义万相生成图片"""
-        aliyun_api_key = self.config.get("aliyun_api_key", "")
-        aliyun_api_url = self.config.get("aliyun_api_url", "https://dashscope.aliyuncs.com/api/v1")
-        
-        if not aliyun_api_key:
-            raise ValueError("未配置 aliyun_api_key，无法使用阿里云通义万相生图")
-        
-        size = size or self.ms_size
-        # 阿里云支持的尺寸格式，如 "1024*1024"
-        # 将标准格式转换为阿里云格式
-        ali_size = size.replace("x", "*")
+    async def _poll_task(self, task_id: str) -> str | None:
+        """轮询 ModelScope 异步任务直到成功或失败，返回图片URL
         
+        首次立即查询，之后每次查询前等待，间隔按指数增长（有上限）并加入 ±30% 的随机抖动，
+        避免多个并发任务同步重试；最后一次查询后不再等待。
+        """
+        session = await self._get_session()
         headers = {
-            "Authorization": f"Bearer {aliyun_api_key}",
+            "Authorization": f"Bearer {self.ms_api_key}",
             "Content-Type": "application/json",
+            "X-ModelScope-Task-Type": "image_generation",
         }
+        url = f"{self.ms_api_url}v1/tasks/{task_id}"
+        for attempt in range(self.MS_POLL_MAX_ATTEMPTS):
+            if attempt:
+                delay = min(self.MS_POLL_BASE * self.MS_POLL_MULTIPLIER ** (attempt - 1), self.MS_POLL_MAX_INTERVAL)
+                await asyncio.sleep(delay * random.uniform(0.7, 1.3))
+            async with session.get(url, headers=headers) as resp:
+                if resp.status == 200:
+                    tdata = await resp.json()
+                    task_status = tdata.get("task_status")
+                    logger.debug("[ModelScope] 任务状态: %s", task_status)
+                    
+                    if task_status == "SUCCEED":
+                        imgs = tdata.get("output_images", [])
+                        if imgs:
+                            logger.info("[ModelScope] 任务成功，图片URL: %s...", imgs[0][:50])
+                            return imgs[0]
+                        return None
+                    elif task_status == "FAILED":
+                        error_msg = tdata.get("error", "未知错误")
+                        logger.error("[ModelScope] 任务失败: %s", error_msg)
+                        return None
+                else:
+                    logger.warning("[ModelScope] 查询任务状态失败: HTTP %s", resp.status)
         
-        # 获取模型配置
-        aliyun_model = self.config.get("aliyun_model", "wanx-v1")
-        
-        # 构建请求数据
-        payload = {
-            "model": aliyun_model,  # 从配置获取模型
-            "input": {
-                "prompt": prompt,
-                "size": ali_size,
-            },
-            "parameters": {
-                "n": 1,
-            }
-        }
+        logger.error("[ModelScope] 任务超时，重试%s次后仍未完成", self.MS_POLL_MAX_ATTEMPTS)
+        return None
+
+    async def _download_image(self, url: str, name: str | None = None) -> str:
+        """下载图片到本地，返回本地路径；指定 name 时保存为 {name}.png（用于生图缓存）"""
+        # 创建images目录
+        images_dir = StarTools.get_data_dir("astrbot_plugin_realistic_persona") / "images"
+        images_dir.mkdir(parents=True, exist_ok=True)
         
-        url = f"{aliyun_api_url}/services/aigc/text2image"
-        logger.info(f"[阿里云通义万相] 请求URL: {url}")
-        logger.info(f"[阿里云通义万相] 请求参数: size={ali_size}, prompt={prompt[:50]}...")
+        # 生成文件名（时间戳 + 随机后缀，同一秒内的并发下载不会互相覆盖）
+        filename = f"{name}.png" if name else f"generated_{int(time.time())}_{uuid.uuid4().hex[:8]}.png"
+        local_path = images_dir / filename
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json=payload) as resp:
-                resp_text = await resp.text()
-                logger.info(f"[阿里云通义万相] 响应状态: {resp.status}")
-                logger.info(f"[阿里云通义万相] 响应内容: {resp_text[:1000]}...")
-                
-                if resp.status != 200:
-                    logger.error(f"[阿里云通义万相] API调用失败: HTTP {resp.status}")
-                    logger.error(f"[阿里云通义万相] 错误详情: {resp_text}")
-                    raise ValueError(f"阿里云通义万相 API调用失败: HTTP {resp.status}, {resp_text[:200]}")
-                
-                try:
-                    data = json.loads(resp_text)
-                except json.JSONDecodeError as e:
-                    logger.error(f"[阿里云通义万相] 响应解析失败: {e}")
-                    raise ValueError(f"阿里云通义万相 响应解析失败: {e}")
-        
-        # 从响应中提取图片URL
-        if "output" not in data or "results" not in data["output"] or not data["output"]["results"]:
-            logger.error(f"[阿里云通义万相] 未找到图片数据")
-            logger.error(f"[阿里云通义万相] 完整响应数据: {json.dumps(data, ensure_ascii=False, indent=2)}")
-            raise ValueError("阿里云通义万相 未返回图片数据")
-        
-        image_url = data["output"]["results"][0].get("url")
-        if not image_url:
-            logger.error(f"[阿里云通义万相] 未找到图片URL")
-            logger.error(f"[阿里云通义万相] 完整响应数据: {json.dumps(data, ensure_ascii=False, indent=2)}")
-            raise ValueError("阿里云通义万相 未返回图片 URL")
+        # 下载图片：按块读取响应，全部收到后在一次线程调用中写入文件，不阻塞事件循环；
+        # 下载中途失败或被取消（如对冲请求落选）时还未创建任何文件
+        session = await self._get_session()
+        async with session.get(url) as resp:
+            resp.raise_for_status()
+            chunks = [chunk async for chunk in resp.content.iter_chunked(self.DOWNLOAD_CHUNK_SIZE)]
+        await asyncio.to_thread(_write_file_atomic, local_path, chunks)
         
-        # 下载图片到本地
-        local_path = await self._download_image(image_url)
-        logger.info(f"[阿里云通义万相] 生成的图片已保存到: {local_path}")
-        return local_path
+        return str(local_path)
 
     async def _get_weather_desc(self) -> str:
         """获取简单天气描述（用于写日记和画图提示词）"""
         if not self.weather_location:
             return ""
-        try:
-            async with aiohttp.ClientSession() as session:
+        # 同时发起的查询只请求一次 wttr.in，其余等待并复用缓存
+        async with self._weather_lock:
+            cached = self._weather_cache
+            if cached and cached[1] == self.weather_location:
+                ttl = self.WEATHER_CACHE_TTL if cached[2] else self.WEATHER_FAILURE_TTL
+                if time.monotonic() - cached[0] < ttl:
+                    return cached[2]
+            weather_desc = ""
+            try:
+                session = await self._get_session()
                 url = f"https://wttr.in/{self.weather_location}?format=3&lang=zh-cn"
-                async with session.get(url, timeout=5) as resp:
+                async with session.get(url, timeout=aiohttp.ClientTimeout(total=self.WEATHER_TIMEOUT)) as resp:
                     if resp.status == 200:
-                        return (await resp.text()).strip()
-        except Exception:
-            return ""
-        return ""
+                        weather_desc = (await resp.text()).strip()
+            except Exception as e:
+                logger.debug("获取天气失败: %s", e)
+            # 失败时缓存空结果，WEATHER_FAILURE_TTL 内不再请求
+            self._weather_cache = (time.monotonic(), self.weather_location, weather_desc)
+            return weather_desc
 
     def _build_context(
         self, round_messages: list[dict[str, Any]]
     ) -> list[dict[str, str]]:
         """把所有回合里的纯文本消息打包成 openai-style 的 user 上下文。"""
-        contexts: list[dict[str, str]] = []
-        for msg in round_messages:
-            text_segments = [
+        # 没有文字的消息（纯图片、表情等）不计入上下文
+        return [
+            {"role": "user", "content": f"{msg['sender']['nickname']}: {body}"}
+            for msg in round_messages
+            if (body := "".join(
                 seg["data"]["text"] for seg in msg["message"] if seg["type"] == "text"
-            ]
-            text = f"{msg['sender']['nickname']}: {''.join(text_segments).strip()}"
-            if text:
-                contexts.append({"role": "user", "content": text})
-        return contexts
+            ).strip())
+        ]
+
+    def _load_msg_ctx_cache(self) -> dict[str, dict[str, Any]]:
+        """加载各会话已拉取的历史消息缓存"""
+        try:
+            if self._msg_ctx_cache_file.exists():
+                with open(self._msg_ctx_cache_file, "r", encoding="utf-8") as f:
+                    return json.load(f)
+        except Exception as e:
+            logger.warning(f"加载历史消息缓存失败: {e}")
+        return {}
+
+    async def _save_msg_ctx_cache(self) -> None:
+        """保存历史消息缓存（在线程中写入，不阻塞事件循环）"""
+        async with self._msg_ctx_cache_lock:
+            # 各会话的条目只会整体替换，浅拷贝即可得到一致的快照
+            snapshot = dict(self._msg_ctx_cache)
+            try:
+                await asyncio.to_thread(self._write_msg_ctx_cache, snapshot)
+            except Exception as e:
+                logger.warning(f"保存历史消息缓存失败: {e}")
+
+    def _write_msg_ctx_cache(self, cache: dict[str, dict[str, Any]]) -> None:
+        """先写临时文件再替换，避免写入中断留下损坏的文件"""
+        tmp_path = self._msg_ctx_cache_file.with_suffix(self._msg_ctx_cache_file.suffix + ".tmp")
+        tmp_path.write_bytes(_dumps_body(cache))
+        os.replace(tmp_path, self._msg_ctx_cache_file)
+
+    async def _fetch_msg_contexts(
+        self,
+        cache_key: str,
+        action: str,
+        params: dict[str, Any],
+        cursor_index: int,
+        page_size: int,
+        max_count: int,
+        stop_on_short_page: bool = False,
+    ) -> list[dict]:
+        """分页拉取历史消息，只拉取上次之后的新消息，与缓存的上下文拼接
+        
+        每页从最新消息往前翻，翻到上次拉取的最新消息时间之前即停止。缓存中按时间顺序保存
+        每个会话最近的上下文、消息ID与最新消息时间，写入 msg_context_cache.json。
+        
+        Args:
+            cache_key: 会话缓存键（"g:群号" / "u:QQ号"）
+            action: 获取历史消息的接口名
+            params: 接口参数（不含 message_seq / count）
+            cursor_index: 用本页第几条消息的 message_id 作为下一页的起点
+            page_size: 每页条数
+            max_count: 最多返回的上下文条数
+            stop_on_short_page: 本页不足 page_size 条时视为没有更多消息
+        """
+        keep = max(max_count, self._diary_max_msg)
+        cached = self._msg_ctx_cache.get(cache_key, {})
+        known_ids = set(cached.get("ids", []))
+        last_time = cached.get("last_time", 0)
+        
+        new_messages: list[dict] = []
+        seen_ids: set = set()
+        message_seq = 0
+        while len(new_messages) < keep:
+            result: dict = await self.client.api.call_action(
+                action, **params, message_seq=message_seq, count=page_size
+            )
+            if not result or "messages" not in result:
+                logger.debug("获取 %s 的历史消息失败", cache_key)
+                break
+            round_messages = result["messages"]
+            if not round_messages:
+                break
+            
+            reached_known = False
+            for msg in round_messages:
+                msg_id = msg.get("message_id")
+                if msg_id in known_ids or msg.get("time", 0) < last_time:
+                    reached_known = True
+                elif msg_id not in seen_ids:
+                    seen_ids.add(msg_id)
+                    new_messages.append(msg)
+            # 已接上缓存中的消息，或没有更多消息
+            if reached_known or (stop_on_short_page and len(round_messages) < page_size):
+                break
+            
+            next_seq = round_messages[cursor_index].get("message_id", 0)
+            if next_seq == message_seq:
+                break
+            message_seq = next_seq
+        
+        # 新消息按时间排序后接在缓存之后，只保留最近 keep 条
+        new_messages.sort(key=lambda msg: msg.get("time", 0))
+        contexts = (cached.get("contexts", []) + self._build_context(new_messages))[-keep:]
+        ids = (cached.get("ids", []) + [msg.get("message_id") for msg in new_messages])[-keep:]
+        if new_messages or cache_key not in self._msg_ctx_cache:
+            if new_messages:
+                last_time = max(last_time, new_messages[-1].get("time", 0))
+            self._msg_ctx_cache[cache_key] = {"ids": ids, "contexts": contexts, "last_time": last_time}
+            await self._save_msg_ctx_cache()
+        
+        return contexts[-max_count:]
 
     async def _get_private_msg_contexts(self, user_id: str, max_count: int = 100) -> list[dict]:
         """
@@ -420,64 +873,34 @@ class LLMAction:
             对话上下文列表
         """
         try:
-            contexts: list[dict] = []
-            message_seq = 0
-            
-            while len(contexts) < max_count:
-                payloads = {
-                    "user_id": user_id,
-                    "message_seq": message_seq,
-                    "count": 100,  # 每次获取100条
-                }
-                
-                result: dict = await self.client.api.call_action(
-                    "get_friend_msg_history", **payloads
-                )
-                
-                if not result or "messages" not in result:
-                    logger.debug(f"获取用户 {user_id} 的私聊历史失败")
-                    break
-                
-                round_messages = result["messages"]
-                if not round_messages:
-                    break
-                
-                message_seq = round_messages[-1].get("message_id", 0)
-                contexts.extend(self._build_context(round_messages))
-                
-                # 如果返回的消息少于100条，说明已经没有更多了
-                if len(round_messages) < 100:
-                    break
-            
-            logger.info(f"从用户 {user_id} 获取了 {len(contexts)} 条私聊消息")
-            return contexts[:max_count]  # 限制最大数量
+            contexts = await self._fetch_msg_contexts(
+                f"u:{user_id}",
+                "get_friend_msg_history",
+                {"user_id": user_id},
+                cursor_index=-1,
+                page_size=100,  # 每次获取100条
+                max_count=max_count,
+                stop_on_short_page=True,  # 返回的消息少于100条，说明已经没有更多了
+            )
+            logger.info("从用户 %s 获取了 %s 条私聊消息", user_id, len(contexts))
+            return contexts
             
         except Exception as e:
-            logger.error(f"获取私聊历史失败: {e}")
+            logger.error("获取私聊历史失败: %s", e)
             return []
 
-    async def _get_msg_contexts(self, group_id: str) -> list[dict]:
+    async def _get_msg_contexts(self, group_id: str, max_count: int | None = None) -> list[dict]:
         """获取群聊历史消息"""
-        message_seq = 0
-        contexts: list[dict] = []
-        diary_max_msg = self.config.get("diary_max_msg", 100)
-        while len(contexts) < diary_max_msg:
-            payloads = {
-                "group_id": group_id,
-                "message_seq": message_seq,
-                "count": 200,
-                "reverseOrder": True,
-            }
-            result: dict = await self.client.api.call_action(
-                "get_group_msg_history", **payloads
-            )
-            round_messages = result["messages"]
-            if not round_messages:
-                break
-            message_seq = round_messages[0]["message_id"]
-
-            contexts.extend(self._build_context(round_messages))
-        return contexts
+        if max_count is None:
+            max_count = self._diary_max_msg
+        return await self._fetch_msg_contexts(
+            f"g:{group_id}",
+            "get_group_msg_history",
+            {"group_id": group_id, "reverseOrder": True},
+            cursor_index=0,
+            page_size=200,
+            max_count=max_count,
+        )
 
     @staticmethod
     def extract_content(diary: str) -> str:
@@ -485,22 +908,13 @@ class LLMAction:
         if not diary:
             return ""
         
-        start_marker = '"""'
-        end_marker = '"""'
-        start = diary.find(start_marker)
-        if start == -1:
-            # 没有找到开始标记，返回原始内容
-            logger.debug(f"extract_content: 未找到三对双引号，返回原始内容")
-            return diary.strip()
-        
-        start += len(start_marker)
-        end = diary.find(end_marker, start)
-        if end == -1:
-            # 没有找到结束标记，返回原始内容
-            logger.debug(f"extract_content: 未找到结束的三对双引号，返回原始内容")
+        match = _DIARY_RE.search(diary)
+        if match is None:
+            # 没有成对的三对双引号，返回原始内容
+            logger.debug(f"extract_content: 未找到成对的三对双引号，返回原始内容")
             return diary.strip()
         
-        content = diary[start:end].strip()
+        content = match.group(1).strip()
         if not content:
             # 提取的内容为空，返回原始内容
             logger.debug(f"extract_content: 提取内容为空，返回原始内容")
@@ -508,13 +922,36 @@ class LLMAction:
         
         return content
 
+    async def _get_token_encoding(self):
+        """加载 cl100k_base 编码；未安装 tiktoken 或加载失败时返回 None
+        
+        首次加载可能需要联网下载编码文件，放到线程中执行，不阻塞事件循环。
+        """
+        cls = type(self)
+        if cls._token_encoding is None and TIKTOKEN_AVAILABLE:
+            async with self._token_encoding_lock:
+                if cls._token_encoding is None:
+                    try:
+                        cls._token_encoding = await asyncio.to_thread(tiktoken.get_encoding, "cl100k_base")
+                    except Exception as e:
+                        logger.warning(f"[历史压缩] 加载 tiktoken 编码失败，改按字符数判断: {e}")
+                        cls._token_encoding = False
+        return cls._token_encoding or None
+
+    @staticmethod
+    def _count_tokens(encoding, texts: list[str]) -> list[int]:
+        """批量统计各段文本的 token 数（在线程中调用）"""
+        return [len(tokens) for tokens in encoding.encode_batch(texts, disallowed_special=())]
+
     async def _compress_contexts(self, contexts: list[dict[str, str]], max_rounds: int | None = None, compression_threshold: int | None = None) -> list[dict[str, str]]:
         """压缩对话历史上下文，减少token使用
         
+        安装了 tiktoken 时按 token 数衡量内容长度（中英文计费差异更准确），否则按字符数。
+        
         Args:
             contexts: 原始对话上下文列表
             max_rounds: 最大对话轮数，超出部分将被丢弃（保留最新的）
-            compression_threshold: 压缩阈值（字符数），超过此值时进行压缩
+            compression_threshold: 压缩阈值（token 数或字符数），超过此值时进行压缩
             
         Returns:
             压缩后的对话上下文列表
@@ -525,51 +962,63 @@ class LLMAction:
         # 从配置获取默认值
         if max_rounds is None:
             max_rounds = self.config.get("history_max_rounds", 10)
-        if compression_threshold is None:
-            compression_threshold = self.config.get("history_compression_threshold", 2000)
-
         # 首先检查是否超过最大轮数限制
         if len(contexts) > max_rounds:
             # 保留最新的max_rounds轮对话
             contexts = contexts[-max_rounds:]
             logger.debug(f"[历史压缩] 超过最大轮数限制({max_rounds})，保留最新的{len(contexts)}轮对话")
 
-        # 检查总字符数是否超过压缩阈值
-        total_chars = sum(len(ctx.get("content", "")) for ctx in contexts)
-        if total_chars <= compression_threshold:
-            logger.debug(f"[历史压缩] 总字符数({total_chars})未超过压缩阈值({compression_threshold})，无需压缩")
+        # 统计各条内容的长度：有 tiktoken 时在线程中批量编码计算 token 数，否则按字符数
+        contents = [ctx.get("content", "") for ctx in contexts]
+        encoding = await self._get_token_encoding()
+        if encoding is not None:
+            sizes = await asyncio.to_thread(self._count_tokens, encoding, contents)
+            unit, min_size = "token 数", self.SUMMARY_MIN_TOKENS
+            if compression_threshold is None:
+                compression_threshold = self.config.get("history_compression_token_threshold", 1500)
+        else:
+            sizes = [len(content) for content in contents]
+            unit, min_size = "字符数", self.SUMMARY_MIN_CHARS
+            if compression_threshold is None:
+                compression_threshold = self.config.get("history_compression_threshold", 2000)
+
+        # 检查总长度是否超过压缩阈值
+        total_size = sum(sizes)
+        if total_size <= compression_threshold:
+            logger.debug(f"[历史压缩] 总{unit}({total_size})未超过压缩阈值({compression_threshold})，无需压缩")
             return contexts
 
-        logger.info(f"[历史压缩] 总字符数({total_chars})超过压缩阈值({compression_threshold})，开始压缩")
+        logger.info(f"[历史压缩] 总{unit}超过压缩阈值({compression_threshold})，开始压缩")
 
         # 检查是否启用了压缩功能
         if not self.config.get("enable_history_compression", True):
             logger.info("[历史压缩] 压缩功能已禁用，返回原始上下文")
             return contexts
 
-        # 进行压缩 - 保留重要信息，精简内容
-        compressed_contexts = []
-        for ctx in contexts:
-            role = ctx.get("role", "user")
-            content = ctx.get("content", "")
+        # 进行压缩 - 保留重要信息，精简内容；各条长内容的摘要并发进行，结果保持原顺序
+        return list(await asyncio.gather(*(
+            self._compress_context(ctx, size <= min_size) for ctx, size in zip(contexts, sizes)
+        )))
 
-            if len(content) <= 500:  # 如果内容已经很短，直接保留
-                compressed_contexts.append({"role": role, "content": content})
-                continue
+    async def _compress_context(self, ctx: dict[str, str], is_short: bool) -> dict[str, str]:
+        """压缩单条上下文：短内容直接保留，长内容生成摘要，摘要失败时截取前面的部分"""
+        role = ctx.get("role", "user")
+        content = ctx.get("content", "")
 
-            # 对长内容进行摘要
-            try:
-                compressed_content = await self._summarize_content(content)
-                compressed_contexts.append({"role": role, "content": compressed_content})
-                logger.debug(f"[历史压缩] 压缩内容: {len(content)} -> {len(compressed_content)} 字符")
-            except Exception as e:
-                logger.warning(f"[历史压缩] 压缩失败，使用原始内容: {e}")
-                # 如果压缩失败，截取前面的部分
-                truncated_content = content[:500] + "..."
-                compressed_contexts.append({"role": role, "content": truncated_content})
-                logger.debug(f"[历史压缩] 使用截取内容: {len(truncated_content)} 字符")
+        if is_short:  # 如果内容已经很短，直接保留
+            return {"role": role, "content": content}
 
-        return compressed_contexts
+        # 对长内容进行摘要
+        try:
+            compressed_content = await self._summarize_content(content)
+            logger.debug(f"[历史压缩] 压缩内容: {len(content)} -> {len(compressed_content)} 字符")
+            return {"role": role, "content": compressed_content}
+        except Exception as e:
+            logger.warning(f"[历史压缩] 压缩失败，使用原始内容: {e}")
+            # 如果压缩失败，截取前面的部分
+            truncated_content = content[:500] + "..."
+            logger.debug(f"[历史压缩] 使用截取内容: {len(truncated_content)} 字符")
+            return {"role": role, "content": truncated_content}
 
     async def _summarize_content(self, content: str) -> str:
         """使用LLM对长内容进行摘要
@@ -595,10 +1044,11 @@ class LLMAction:
         prompt = f"请摘要以下内容：\n{content}"
 
         try:
-            response = await provider.text_chat(
-                system_prompt=system_prompt,
-                prompt=prompt
-            )
+            async with self._summary_semaphore:
+                response = await provider.text_chat(
+                    system_prompt=system_prompt,
+                    prompt=prompt
+                )
             summary = response.completion_text.strip()
 
             # 如果摘要太长，进一步截断
@@ -611,32 +1061,14 @@ class LLMAction:
             # 摘要失败时使用简单截断
             return content[:300] + "..."
 
-    async def generate_diary(self, group_id: str = "", topic: str | None = None, persona_profile: str = "", user_id: str = "") -> str | None:
-        """
-        根据聊天记录 + 人设 + 当天时间/天气/日程生成日记文本
-            
-        Args:
-            group_id: 群号，留空则随机选一个群
-            topic: 主题，留空则由LLM自己选择
-            persona_profile: 人设描述，优先使用传入的参数，留空则从系统获取
-            user_id: 优先使用的用户ID，如果指定则从该用户的私聊历史生成，留空则从群聊读取
-        """
-        # 如果配置了 diary_provider_id 则使用，否则使用默认提供商
-        provider = None
-        if self.diary_provider_id:
-            provider = self.context.get_provider_by_id(self.diary_provider_id)
-        if not provider:
-            provider = self.context.get_using_provider()
-        if not isinstance(provider, Provider):
-            logger.error("未配置用于文本生成任务的 LLM 提供商")
-            return None
+    async def _get_diary_contexts(self, group_id: str, user_id: str) -> list[dict] | None:
+        """获取写日记用的对话历史：优先私聊，其次指定群聊，再次随机群聊；没有可用群组时返回 None"""
         contexts = []
     
         # 优先从指定用户的私聊获取对话历史
         if user_id and user_id.strip():
             logger.info(f"优先从用户 {user_id} 的私聊历史生成说说")
-            diary_max_msg = self.config.get("diary_max_msg", 100)
-            contexts = await self._get_private_msg_contexts(user_id, max_count=diary_max_msg)
+            contexts = await self._get_private_msg_contexts(user_id, max_count=self._diary_max_msg)
                 
             if not contexts:
                 logger.warning(f"无法从用户 {user_id} 获取私聊历史，回退到群聊模式")
@@ -649,46 +1081,87 @@ class LLMAction:
                 contexts = await self._get_msg_contexts(group_id)
             else:  # 随机获取一个群组
                 group_list = await self.client.get_group_list()
-                ignore_groups = self.config.get("ignore_groups", [])
+                ignore_groups = self._ignore_groups_set
                 group_ids = [
-                    str(group["group_id"])
+                    gid
                     for group in group_list
-                    if str(group["group_id"]) not in ignore_groups
+                    if (gid := str(group["group_id"])) not in ignore_groups
                 ]
                 if not group_ids:
                     logger.warning("未找到可用群组")
                     return None
                 contexts = await self._get_msg_contexts(random.choice(group_ids))
         # TODO: 更多模式
-            
-        # 人设：优先使用传入的参数，其次从系统获取
-        if not persona_profile or not persona_profile.strip():
-            try:
-                persona_mgr = self.context.persona_manager
-                default_persona = await persona_mgr.get_default_persona_v3()
-                persona_profile = default_persona.get("prompt", "")
-            except Exception:
-                persona_profile = ""
-        now = datetime.now()
-        today_str = now.strftime("%Y-%m-%d")
-        weekday = "一二三四五六日"[now.weekday()]
-        weather_desc = await self._get_weather_desc()
-            
-        # 获取当天的日程安排
-        schedule_text = ""
+        return contexts
+
+    async def _resolve_persona(self, persona_profile: str) -> str:
+        """人设：优先使用传入的参数，其次从系统获取"""
+        if persona_profile and persona_profile.strip():
+            return persona_profile
+        try:
+            persona_mgr = self.context.persona_manager
+            default_persona = await persona_mgr.get_default_persona_v3()
+            return default_persona.get("prompt", "")
+        except Exception:
+            return ""
+
+    async def _get_schedule_text(self, today_str: str) -> str:
+        """获取当天的日程安排文本（文件读取在线程中执行，读到后当天内缓存），失败时返回空字符串"""
+        cached = self._schedule_cache
+        if cached and cached[0] == today_str:
+            return cached[1]
         try:
-            from .local_data_manager import LocalDataManager
             data_dir = self.context.get_data_dir("astrbot_plugin_realistic_persona") / "local_data"
-            data_mgr = LocalDataManager(data_dir)
-            schedule_text = data_mgr.get_schedule_data(today_str)
+            schedule_text = await asyncio.to_thread(
+                lambda: LocalDataManager(data_dir).get_schedule_data(today_str)
+            )
+            # 日程可能稍后才生成，未读到时不缓存
             if schedule_text:
-                logger.info(f"获取到当天日程安排")
-            else:
-                logger.info(f"未找到当天日程安排")
+                self._schedule_cache = (today_str, schedule_text)
+            return schedule_text or ""
         except Exception as e:
             logger.warning(f"获取日程安排失败: {e}")
+            return ""
+
+    async def generate_diary(self, group_id: str = "", topic: str | None = None, persona_profile: str = "", user_id: str = "") -> str | None:
+        """
+        根据聊天记录 + 人设 + 当天时间/天气/日程生成日记文本
+            
+        Args:
+            group_id: 群号，留空则随机选一个群
+            topic: 主题，留空则由LLM自己选择
+            persona_profile: 人设描述，优先使用传入的参数，留空则从系统获取
+            user_id: 优先使用的用户ID，如果指定则从该用户的私聊历史生成，留空则从群聊读取
+        """
+        # 如果配置了 diary_provider_id 则使用，否则使用默认提供商
+        provider = None
+        if self.diary_provider_id:
+            provider = self.context.get_provider_by_id(self.diary_provider_id)
+        if not provider:
+            provider = self.context.get_using_provider()
+        if not isinstance(provider, Provider):
+            logger.error("未配置用于文本生成任务的 LLM 提供商")
+            return None
+        now = datetime.now()
+        today_str = now.strftime("%Y-%m-%d")
+        weekday = "一二三四五六日"[now.weekday()]
+        
+        # 对话历史、人设、天气、日程互不依赖，并发获取
+        contexts, persona_profile, weather_desc, schedule_text = await asyncio.gather(
+            self._get_diary_contexts(group_id, user_id),
+            self._resolve_persona(persona_profile),
+            self._get_weather_desc(),
+            self._get_schedule_text(today_str),
+        )
+        if contexts is None:
+            return None
+        if schedule_text:
+            logger.info(f"获取到当天日程安排")
+        else:
+            logger.info(f"未找到当天日程安排")
             
-        life_header = [
+        # 系统提示按行拼接，空字符串对应段落间的空行；要求使用三对双引号包裹正文
+        parts = [
             f"今天是 {today_str}（星期{weekday}）。",
             "你要以第一人称写一条简短的 QQ 空间说说，分享今天的某个生活片段或感受。",
             "重要：你就是这个角色，直接以第一人称输出说说内容，不要添加任何第三人称的描述、确认、解释或多余的话。",
@@ -696,35 +1169,22 @@ class LLMAction:
             "长度控制在 2-3 句话以内，每句话不超过 30 字。",
         ]
         if persona_profile:
-            life_header.append(f"以下是你的角色设定，请保持一致：{persona_profile}")
+            parts.append(f"以下是你的角色设定，请保持一致：{persona_profile}")
         if weather_desc:
-            life_header.append(f"你所在城市的天气概况：{weather_desc}")
+            parts.append(f"你所在城市的天气概况：{weather_desc}")
         if schedule_text:
-            life_header.append(f"你今天的日程安排：{schedule_text[:300]}...")  # 限制长度避免提示词过长
-            life_header.append("请结合今天的日程安排和对话历史，生成相关的感慨或事件，不要直接复制对话内容，而是根据对话历史和日程安排生成相关的感受或经历。")
-        life_header_text = "\n".join(life_header) + "\n\n"
-            
-        # 系统提示，要求使用三对双引号包裹正文
-        diary_prompt = self.config.get(
-            "diary_prompt", 
-            "写作风格：\n"
-            "- 用口语化、随意的语气，像朋友圈那样轻松\n"
-            "- 可以包含 Emoji 表情增加生动性\n"
-            "- 只写 2-3 句话，简洁明了\n"
-            "- 不要长篇大论，不要流水账式的叙述\n"
-            "- 可以是分享心情、小感慨、有趣的事、即时感受、思考、或者emo等\n"
-            "\n示例：\n"
-            "- “今天天气超好，在公园晒了一下午的太阳🌞”\n"
-            "- “终于学会了那道难题，感觉自己还是挺聪明的呀😏”\n"
-            "- “晚风很舒服，散步回家的路上看到了超美的晚霞✨”"
-        )
-        system_prompt = (
-            life_header_text
-            + f"# 写作主题：{topic or '从聊天内容和今日日程中选一个与今天生活相关的主题'}\n\n"
-            "# 输出格式要求：\n"
-            '- 使用三对双引号（"""）将正文内容包裹起来。\n\n'
-            + diary_prompt
-        )
+            parts.append(f"你今天的日程安排：{schedule_text[:300]}...")  # 限制长度避免提示词过长
+            parts.append("请结合今天的日程安排和对话历史，生成相关的感慨或事件，不要直接复制对话内容，而是根据对话历史和日程安排生成相关的感受或经历。")
+        parts.extend((
+            "",
+            f"# 写作主题：{topic or '从聊天内容和今日日程中选一个与今天生活相关的主题'}",
+            "",
+            "# 输出格式要求：",
+            '- 使用三对双引号（"""）将正文内容包裹起来。',
+            "",
+            self._diary_prompt,
+        ))
+        system_prompt = "\n".join(parts)
             
         logger.debug(f"{system_prompt}\n\n{contexts}")
     
@@ -755,6 +1215,16 @@ class LLMAction:
         if not isinstance(provider, Provider):
             logger.error("未配置用于文本生成任务的 LLM 提供商")
             return None
+        
+        # 相同的帖子（正文、转发内容、图片都相同）直接复用之前生成的评论
+        cache_key = hashlib.blake2b(
+            "|".join((post.text, post.rt_con or "", ",".join(post.images))).encode("utf-8"), digest_size=16
+        ).hexdigest()
+        cached = self._comment_cache.get(cache_key)
+        if cached is not None:
+            self._comment_cache.move_to_end(cache_key)
+            logger.info(f"复用已生成的评论：{cached}")
+            return cached
         try:
             content = post.text
             if post.rt_con:  # 转发文本
@@ -763,16 +1233,17 @@ class LLMAction:
             prompt = f"\n[帖子内容]：\n{content}"
 
             logger.debug(prompt)
-            comment_prompt = self.config.get("comment_prompt", "请根据帖子内容生成一条简短的评论。")
             llm_response = await provider.text_chat(
-                system_prompt=comment_prompt,
+                system_prompt=self._comment_prompt,
                 prompt=prompt,
                 image_urls=post.images,
             )
-            comment = re.sub(r"[\s\u3000]+", "", llm_response.completion_text).rstrip(
-                "。"
-            )
+            comment = llm_response.completion_text.translate(_WS_TABLE).rstrip("。")
             logger.info(f"LLM 生成的评论：{comment}")
+            if comment:
+                self._comment_cache[cache_key] = comment
+                if len(self._comment_cache) > self.COMMENT_CACHE_SIZE:
+                    self._comment_cache.popitem(last=False)
             return comment
 
         except Exception as e:
@@ -860,6 +1331,26 @@ class LLMAction:
             logger.error(f"[昵称生成] LLM调用失败：{e}")
             return None
 
+    async def _get_image_prompt_contexts(self, group_id: str, user_id: str) -> list[dict]:
+        """获取生成画图提示词用的对话历史（最近20条），失败时返回空列表"""
+        contexts = []
+        try:
+            if user_id and user_id.strip():
+                # 从私聊获取
+                logger.info("[绘画提示词生成] 尝试从用户 %s 获取私聊历史", user_id)
+                contexts = await self._get_private_msg_contexts(user_id, max_count=20)
+                logger.info("[绘画提示词生成] 从用户 %s 获取了 %s 条对话", user_id, len(contexts))
+            elif group_id:
+                # 从群聊获取
+                logger.info("[绘画提示词生成] 尝试从群 %s 获取群聊历史", group_id)
+                contexts = await self._get_msg_contexts(group_id, max_count=20)
+                logger.info("[绘画提示词生成] 从群 %s 获取了 %s 条对话", group_id, len(contexts))
+            else:
+                logger.warning("[绘画提示词生成] user_id 和 group_id 都为空，无法获取对话历史")
+        except Exception as e:
+            logger.error("[绘画提示词生成] 获取对话历史失败: %s", e, exc_info=True)
+        return contexts
+
     async def generate_image_prompt_from_diary(self, diary: str, group_id: str = "", user_id: str = "") -> str | None:
         """让大模型根据日记和生活状态生成画图提示词
         
@@ -878,52 +1369,30 @@ class LLMAction:
             logger.error("未配置用于文本生成任务的 LLM 提供商")
             return None
         
-        # 获取对话历史作为上下文
-        contexts = []
-        try:
-            if user_id and user_id.strip():
-                # 从私聊获取
-                logger.info(f"[绘画提示词生成] 尝试从用户 {user_id} 获取私聊历史")
-                contexts = await self._get_private_msg_contexts(user_id, max_count=20)
-                logger.info(f"[绘画提示词生成] 从用户 {user_id} 获取了 {len(contexts)} 条对话")
-            elif group_id:
-                # 从群聊获取
-                logger.info(f"[绘画提示词生成] 尝试从群 {group_id} 获取群聊历史")
-                contexts = await self._get_msg_contexts(group_id, max_count=20)
-                logger.info(f"[绘画提示词生成] 从群 {group_id} 获取了 {len(contexts)} 条对话")
-            else:
-                logger.warning("[绘画提示词生成] user_id 和 group_id 都为空，无法获取对话历史")
-        except Exception as e:
-            logger.error(f"[绘画提示词生成] 获取对话历史失败: {e}", exc_info=True)
-        
         now = datetime.now()
         today_str = now.strftime("%Y-%m-%d")
         weekday = "一二三四五六日"[now.weekday()]
-        weather_desc = await self._get_weather_desc()
         
-        # 获取当天的日程信息（特别是穿着）
-        schedule_text = ""
+        # 对话历史、天气、日程互不依赖，并发获取
+        contexts, weather_desc, schedule_text = await asyncio.gather(
+            self._get_image_prompt_contexts(group_id, user_id),
+            self._get_weather_desc(),
+            self._get_schedule_text(today_str),
+        )
+        
+        # 从当天日程中提取穿着信息
         outfit = ""
-        try:
-            # 尝试从缓存获取当天日程
-            from .local_data_manager import LocalDataManager
-            data_dir = self.context.get_data_dir("astrbot_plugin_realistic_persona") / "local_data"
-            data_mgr = LocalDataManager(data_dir)
-            schedule_text = data_mgr.get_schedule_data(today_str)
-            
-            if schedule_text:
-                logger.info(f"[绘画提示词生成] 获取到当天日程")
-                # 提取穿着信息
-                lines = schedule_text.split("\n")
-                for line in lines:
-                    if "今日穿搭" in line or "穿搭" in line or "穿着" in line:
-                        outfit = line.replace("今日穿搭：", "").replace("穿搭：", "").strip()
-                        logger.info(f"[绘画提示词生成] 提取到穿着信息: {outfit}")
-                        break
-            else:
-                logger.warning(f"[绘画提示词生成] 未找到当天日程")
-        except Exception as e:
-            logger.debug(f"[绘画提示词生成] 获取日程失败: {e}")
+        if schedule_text:
+            logger.info("[绘画提示词生成] 获取到当天日程")
+            for line in schedule_text.split("\n"):
+                if any(keyword in line for keyword in self.OUTFIT_KEYWORDS):
+                    # 去掉 "今日穿搭：" / "穿搭：" 及其之前的前缀
+                    _, sep, rest = line.partition("穿搭：")
+                    outfit = (rest if sep else line).strip()
+                    logger.info("[绘画提示词生成] 提取到穿着信息: %s", outfit)
+                    break
+        else:
+            logger.warning("[绘画提示词生成] 未找到当天日程")
         
         system_prompt = [
             "你现在的任务是：根据给定的【今天的 QQ 空间日记】和生活背景，生成一条用于文生图的图片提示词。",
@@ -932,7 +1401,7 @@ class LLMAction:
         ]
         
         # 从配置文件读取绘画禁止规则
-        forbidden_rules = self.config.get("image_forbidden_rules", "").strip()
+        forbidden_rules = self._image_forbidden_rules
         if forbidden_rules:
             system_prompt.append(forbidden_rules)
         
@@ -993,7 +1462,7 @@ class LLMAction:
         try:
             # 应用历史压缩
             compressed_contexts = await self._compress_contexts(contexts)
-            logger.debug(f"[历史压缩] 画图提示词生成 - 压缩前: {len(contexts)} 轮对话, 压缩后: {len(compressed_contexts)} 轮对话")
+            logger.debug("[历史压缩] 画图提示词生成 - 压缩前: %s 轮对话, 压缩后: %s 轮对话", len(contexts), len(compressed_contexts))
             
             resp = await provider.text_chat(
                 system_prompt=full_system_prompt,
@@ -1001,7 +1470,7 @@ class LLMAction:
                 contexts=compressed_contexts  # 使用压缩后的对话历史
             )
             prompt_text = (resp.completion_text or "").strip()
-            logger.info(f"LLM 生成的配图提示词：{prompt_text}")
+            logger.info("LLM 生成的配图提示词：%s", prompt_text)
             return prompt_text
         except Exception as e:
             raise ValueError(f"LLM 生成配图提示词失败：{e}")
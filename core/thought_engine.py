@@ -229,6 +229,7 @@ class ThoughtEngine:
         try:
             record = {
                 "timestamp": timestamp.isoformat(),
+                "ts_epoch": timestamp.timestamp(),
                 "date": timestamp.strftime("%Y-%m-%d"),
                 "time": timestamp.strftime("%H:%M:%S"),
                 "content": thought,
@@ -248,6 +249,7 @@ class ThoughtEngine:
         try:
             record = {
                 "timestamp": timestamp.isoformat(),
+                "ts_epoch": timestamp.timestamp(),
                 "date": timestamp.strftime("%Y-%m-%d"),
                 "time": timestamp.strftime("%H:%M:%S"),
                 "content": activity,
@@ -3,10 +3,12 @@
 时间线验证引擎：确保经历的时间一致性和逻辑连贯性
 支持时间线检验、经历关联分析、冲突检测等功能
 """
+import atexit
 import json
+import os
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional, Dict, List, Any, Tuple
+from typing import Optional, Dict, List, Any, Tuple, Iterable, BinaryIO
 from collections import defaultdict
 from astrbot.api import logger
 
@@ -26,8 +28,25 @@ class TimelineVerifier:
         # 经历关联图
         self.experience_graph_file = self.data_dir / "experience_graph.json"
         
+        # 冲突日志的常驻写句柄（首次记录冲突时打开；冲突很少，每条写入后立即刷新）
+        self._conflict_fp: Optional[BinaryIO] = None
+        atexit.register(self.close)
+        
+        # 冲突日志的增量统计：(已扫描到的字节偏移, 已统计的冲突条数)，只需扫描新追加的部分
+        self._conflict_scan = (0, 0)
+        
         self._init_data_files()
     
+    def close(self):
+        """刷新并关闭冲突日志句柄"""
+        atexit.unregister(self.close)
+        if self._conflict_fp is not None:
+            try:
+                self._conflict_fp.close()
+            except Exception as e:
+                logger.error(f"[时间线] 关闭冲突日志失败: {e}")
+            self._conflict_fp = None
+    
     def _init_data_files(self):
         """初始化数据文件"""
         if not self.timeline_file.exists():
@@ -260,8 +279,10 @@ class TimelineVerifier:
                 "conflicts": conflict.get("conflicts", [])
             }
             
-            with open(self.conflict_log_file, 'a', encoding='utf-8') as f:
-                f.write(json.dumps(conflict_record, ensure_ascii=False) + "\n")
+            if self._conflict_fp is None:
+                self._conflict_fp = open(self.conflict_log_file, 'ab', buffering=1 << 16)
+            self._conflict_fp.write((json.dumps(conflict_record, ensure_ascii=False) + "\n").encode("utf-8"))
+            self._conflict_fp.flush()
             
         except Exception as e:
             logger.error(f"[时间线] 记录冲突失败: {e}")
@@ -336,12 +357,12 @@ class TimelineVerifier:
             # 同时发生
             return "parallel"
     
-    def analyze_experience_coherence(self, user_experiences: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def analyze_experience_coherence(self, user_experiences: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
         """
         分析用户经历的整体连贯性
         
         Args:
-            user_experiences: 用户的所有经历列表
+            user_experiences: 用户的所有经历（可为惰性迭代器）
         
         Returns:
             连贯性分析结果
@@ -369,18 +390,15 @@ class TimelineVerifier:
             nodes_count = len(graph_data.get("nodes", {}))
             relationship_density = len(edges) / max(nodes_count - 1, 1) if nodes_count > 1 else 0
             
-            # 分析4: 冲突统计
-            conflicts = []
-            if self.conflict_log_file.exists():
-                with open(self.conflict_log_file, 'r', encoding='utf-8') as f:
-                    conflicts = [json.loads(line) for line in f if line.strip()]
+            # 分析4: 冲突统计（冲突日志只追加，增量计数）
+            conflict_count = self._count_conflicts()
             
             # 分析5: 连贯性评分
             coherence_score = self._calculate_coherence_score(
                 time_span,
                 dict(type_distribution),
                 relationship_density,
-                len(conflicts)
+                conflict_count
             )
             
             return {
@@ -389,8 +407,8 @@ class TimelineVerifier:
                 "total_experiences": len(all_experiences),
                 "type_distribution": dict(type_distribution),
                 "relationship_density": round(relationship_density, 2),
-                "conflict_count": len(conflicts),
-                "has_timeline_issues": len(conflicts) > 0,
+                "conflict_count": conflict_count,
+                "has_timeline_issues": conflict_count > 0,
                 "assessment": self._assess_coherence(coherence_score)
             }
             
@@ -398,6 +416,32 @@ class TimelineVerifier:
             logger.error(f"[时间线] 分析连贯性失败: {e}")
             return {}
     
+    def _count_conflicts(self) -> int:
+        """统计冲突日志的条数，只扫描上次统计之后追加的部分"""
+        if self._conflict_fp is not None:
+            self._conflict_fp.flush()
+        if not self.conflict_log_file.exists():
+            self._conflict_scan = (0, 0)
+            return 0
+        
+        offset, count = self._conflict_scan
+        with open(self.conflict_log_file, 'rb') as f:
+            size = f.seek(0, os.SEEK_END)
+            if size < offset:
+                # 文件被截断或替换，从头重新统计
+                offset, count = 0, 0
+            f.seek(offset)
+            for line in f:
+                # 末尾不完整的行留到下次统计
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                if line.strip():
+                    count += 1
+        
+        self._conflict_scan = (offset, count)
+        return count
+    
     def _calculate_coherence_score(self,
                                    time_span: float,
                                    type_dist: Dict[str, int],
@@ -1,4 +1,5 @@
 
+import asyncio
 from collections.abc import Sequence
 from typing import Union
 
@@ -39,14 +40,18 @@ async def get_nickname(event: AiocqhttpMessageEvent, user_id) -> str:
         stranger_info = await client.get_stranger_info(user_id=int(user_id))
         return stranger_info.get("nickname")
 
+def _read_bytes(path: str) -> bytes:
+    """读取本地文件内容"""
+    with open(path, 'rb') as f:
+        return f.read()
+
 async def download_file(url: str) -> bytes | None:
     """下载图片或读取本地文件"""
-    # 如果是本地路径，直接读取
+    # 如果是本地路径，直接读取（在线程中读取，不阻塞事件循环）
     import os
     if os.path.exists(url):
         try:
-            with open(url, 'rb') as f:
-                return f.read()
+            return await asyncio.to_thread(_read_bytes, url)
         except Exception as e:
             logger.error(f"本地文件读取失败: {url}, 错误: {e}")
             return None
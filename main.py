@@ -48,6 +48,12 @@ def error_handler(func):
     return wrapper
 
 # 导入子模块
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 try:
     import pillowmd
     PILLOWMD_AVAILABLE = True
@@ -76,9 +82,18 @@ from .core.auto_profile_updater import AutoProfileUpdater
 from .core.life_story_engine import LifeStoryEngine
 from .core.news_getter import NewsGetter
 
-# 导入QQ空间核心模块（如果可用）
+# 导入LLM动作模块（绘图、日记等内容生成）
 try:
     from .core.llm_action import LLMAction
+    LLM_ACTION_AVAILABLE = True
+except ImportError as e:
+    LLM_ACTION_AVAILABLE = False
+    logger.warning(f"LLM动作模块未加载: {e}")
+
+# 导入QQ空间核心模块（如果可用）
+try:
+    if not LLM_ACTION_AVAILABLE:
+        raise ImportError("LLM动作模块未加载")
     from .core.operate import PostOperator
     from .core.qzone_api import Qzone
     from .core.scheduler import AutoPublish
@@ -135,10 +150,10 @@ class Main(Star):
         
         # ========== AI绘图配置 ==========
         self.api_key = config.get("api_key")
-        self.model = config.get("model", "iic/sdxl-turbo")
         self.size = config.get("size", "1080x1920")
-        self.api_url = config.get("api_url", "https://api.modelscope.com/api/")
         self.provider = config.get("provider", "ms")
+        # 绘图与内容生成；QQ空间初始化时再绑定 aiocqhttp 客户端
+        self.llm = LLMAction(self.context, self.config, None) if LLM_ACTION_AVAILABLE else None  # type: ignore[arg-type]
         
         # ========== 图像生成检测配置 ==========
         self.enable_image_generation_detection = config.get("enable_image_generation_detection", True)
@@ -207,6 +222,10 @@ class Main(Star):
         self._news_cache = {"data": "", "date": ""}  # 每天缓存一次
         self._schedule_cache = {"data": "", "date": ""}  # 每天缓存一次
         
+        # 天气查询和 draw 工具绘图共用的 HTTP 会话，复用连接池与 keep-alive（首次使用时创建）
+        self._http_session: Optional[aiohttp.ClientSession] = None
+        self._http_session_lock = asyncio.Lock()
+        
         # 初始化本地数据管理器
         data_dir = StarTools.get_data_dir("astrbot_plugin_realistic_persona") / "local_data"
         self.local_data_manager = LocalDataManager(data_dir)
@@ -401,7 +420,7 @@ class Main(Star):
             # 停止异步思考循环
             if self.enable_async_thinking and self.async_thinking_scheduler:
                 try:
-                    self.async_thinking_scheduler.stop()
+                    await self.async_thinking_scheduler.stop()
                     logger.info("异步思考循环已停止")
                 except Exception as e:
                     logger.error(f"停止异步思考循环失败: {e}")
@@ -413,7 +432,28 @@ class Main(Star):
                     logger.debug("主动消息调度器已停止")
                 except Exception as e:
                     logger.debug(f"停止主动消息调度器失败: {e}")
-            
+
+            # 写出经历银行缓冲中的记录
+            if self.experience_bank:
+                try:
+                    self.experience_bank.close()
+                except Exception as e:
+                    logger.debug(f"关闭经历银行失败: {e}")
+
+            # 关闭时间线验证器的冲突日志句柄
+            if self.timeline_verifier:
+                try:
+                    self.timeline_verifier.close()
+                except Exception as e:
+                    logger.debug(f"关闭时间线验证器失败: {e}")
+
+            # 保存自动Profile更新器未写盘的状态
+            if self.auto_profile_updater:
+                try:
+                    self.auto_profile_updater.stop()
+                except Exception as e:
+                    logger.debug(f"保存Profile更新状态失败: {e}")
+
             # 清空情绪上下文
             if hasattr(self, 'emotion_contexts'):
                 self.emotion_contexts.clear()
@@ -430,6 +470,21 @@ class Main(Star):
             if hasattr(self, 'life_state'):
                 self.life_state.clear()
             
+            # 关闭共享的 HTTP 会话
+            if getattr(self, "_http_session", None) is not None and not self._http_session.closed:
+                try:
+                    await self._http_session.close()
+                except Exception as e:
+                    logger.debug(f"关闭HTTP会话失败: {e}")
+            
+            # 关闭LLM动作模块的HTTP会话
+            if getattr(self, "llm", None):
+                try:
+                    await self.llm.terminate()
+                    logger.debug("LLM动作模块已清理")
+                except Exception as e:
+                    logger.debug(f"清理LLM动作模块失败: {e}")
+            
             # 清理QQ空间相关资源
             if self.enable_qzone and QZONE_AVAILABLE:
                 if hasattr(self, "qzone"):
@@ -444,7 +499,7 @@ class Main(Star):
                         logger.debug("自动发布模块已清理")
                     except Exception as e:
                         logger.debug(f"清理自动发布模块失败: {e}")
-            
+
             logger.info("拟人化角色行为系统插件已卸载")
         except Exception as e:
             logger.error(f"插件卸载时发生错误: {e}", exc_info=True)
@@ -492,10 +547,9 @@ class Main(Star):
         self.qzone = Qzone(client)
         logger.info("[QQ空间] Qzone对象创建完成")
                 
-        # llm内容生成器
-        logger.info("[QQ空间] 创建LLMAction对象...")
-        self.llm = LLMAction(self.context, self.config, client)  # type: ignore[arg-type]
-        logger.info("[QQ空间] LLMAction对象创建完成")
+        # llm内容生成器（插件初始化时已创建，这里绑定客户端）
+        self.llm.client = client
+        logger.info("[QQ空间] LLMAction对象已绑定客户端")
                 
         # 输出配置信息
         enable_qzone = self.config.get("enable_qzone", False)
@@ -992,8 +1046,8 @@ class Main(Star):
             return
                 
         try:
-            # 记录对话
-            self.experience_bank.record_conversation(
+            # 记录对话（由异步思考调度器排队写入）
+            self.async_thinking_scheduler.record_user_interaction(
                 user_id=session_id,
                 user_message=user_message,
                 bot_response="",  # 此时还没有AI回复
@@ -1109,7 +1163,7 @@ class Main(Star):
         
     def _extract_and_update_growth(self, message: str) -> None:
         """从用户消息中提取兴趣、技能等，自动更新成長追蹤"""
-        if not self.experience_bank:
+        if not self.async_thinking_scheduler:
             return
             
         try:
@@ -1118,18 +1172,18 @@ class Main(Star):
             # 检测技能
             for skill in ["python", "java", "javascript", "c++", "latex"]:
                 if skill.lower() in message_lower:
-                    self.experience_bank.update_growth("skills", skill)
+                    self.async_thinking_scheduler.update_skill(skill, level=None)
                     
             # 检测兴趣
             for interest in ["编程", "旅游", "音乐", "电影", "游戏"]:
                 if interest in message:
-                    self.experience_bank.update_growth("interests", interest)
+                    self.async_thinking_scheduler.add_interest(interest)
                 
             # 检测观点
             if "成长" in message or "加油" in message:
-                self.experience_bank.update_growth("views", "乐观向上")
+                self.async_thinking_scheduler.add_view("乐观向上")
             if "伤心" in message or "难过" in message:
-                self.experience_bank.update_growth("views", "需要陪伴")
+                self.async_thinking_scheduler.add_view("需要陪伴")
             
         except Exception as e:
             logger.debug(f"提取成長信息失败: {e}")
@@ -1654,6 +1708,18 @@ class Main(Star):
         
         return news_text
     
+    async def _get_http_session(self) -> aiohttp.ClientSession:
+        """获取共享的 HTTP 会话，不存在或已关闭时新建"""
+        async with self._http_session_lock:
+            if self._http_session is None or self._http_session.closed:
+                self._http_session = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(limit=64, limit_per_host=16, ttl_dns_cache=300),
+                    timeout=aiohttp.ClientTimeout(total=60),
+                    # json= 请求体优先用 orjson 序列化（aiohttp 需要 str）
+                    json_serialize=(lambda obj: orjson.dumps(obj).decode()) if ORJSON_AVAILABLE else json.dumps,
+                )
+            return self._http_session
+    
     async def _get_weather_desc(self) -> str:
         """获取简单的本地天气描述（使用本地数据管理器优化）"""
         now = datetime.now()
@@ -1682,16 +1748,16 @@ class Main(Star):
         
         # 优先使用wttr.in获取实时天气
         try:
-            async with aiohttp.ClientSession() as session:
-                url = f"https://wttr.in/{self.weather_location}?format=3&lang=zh-cn"
-                async with session.get(url, timeout=5) as resp:
-                    if resp.status == 200:
-                        weather_text = (await resp.text()).strip()
-                        # 检查返回的是否是有效的天气信息
-                        if weather_text and "抱歉" not in weather_text and "无法" not in weather_text and "未知" not in weather_text:
-                            logger.info(f"通过wttr.in获取天气成功: {weather_text}")
-                        else:
-                            weather_text = ""
+            session = await self._get_http_session()
+            url = f"https://wttr.in/{self.weather_location}?format=3&lang=zh-cn"
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=5)) as resp:
+                if resp.status == 200:
+                    weather_text = (await resp.text()).strip()
+                    # 检查返回的是否是有效的天气信息
+                    if weather_text and "抱歉" not in weather_text and "无法" not in weather_text and "未知" not in weather_text:
+                        logger.info(f"通过wttr.in获取天气成功: {weather_text}")
+                    else:
+                        weather_text = ""
         except Exception as e:
             logger.debug(f"通过wttr.in获取天气失败: {e}")
         
@@ -1852,254 +1918,15 @@ class Main(Star):
     
     # ========== AI绘图功能 ==========
     
-    async def _request_modelscope(self, prompt: str, size: str, session: aiohttp.ClientSession) -> str:
-        """向ModelScope API发送请求"""
-        common_headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
-        
-        current_seed = random.randint(1, 2147483647)
-        payload = {
-            "model": f"{self.model}",
-            "prompt": prompt,
-            "seed": current_seed,
-            "size": size,
-            "num_inference_steps": "30",
-        }
-        
-        async with session.post(
-            f"{self.api_url}v1/images/generations",
-            headers={**common_headers, "X-ModelScope-Async-Mode": "true"},
-            data=json.dumps(payload, ensure_ascii=False).encode('utf-8')
-        ) as response:
-            response.raise_for_status()
-            task_response = await response.json()
-            task_id = task_response.get("task_id")
-            
-            if not task_id:
-                raise Exception("未能获取任务ID，生成图片失败。")
-        
-        # 使用指数退避策略轮询结果
-        delay = 1
-        max_delay = 10
-        while True:
-            async with session.get(
-                f"{self.api_url}v1/tasks/{task_id}",
-                headers={**common_headers, "X-ModelScope-Task-Type": "image_generation"},
-            ) as result_response:
-                result_response.raise_for_status()
-                data = await result_response.json()
-                
-                task_status = data.get("task_status")
-                if task_status == "SUCCEED":
-                    output_images = data.get("output_images", [])
-                    if output_images:
-                        return output_images[0]
-                    else:
-                        raise Exception("图片生成成功但未返回图片URL。")
-                elif task_status == "FAILED":
-                    raise Exception("图片生成失败。")
-                
-                # 指数退避策略
-                await asyncio.sleep(delay)
-                delay = min(delay * 2, max_delay)
-    
-    async def _request_image_with_fallback(self, prompt: str, size: str) -> str:
-        """调用图片生成API，支持多平台和自动切换
-        
-        Args:
-            prompt: 图片生成提示词
-            size: 图片尺寸
-            
-        Returns:
-            图片URL
-            
-        Raises:
-            Exception: 当所有平台都失败时
-        """
-        # 获取配置的主平台和备用平台
-        primary_provider = self.config.get("provider", "ms")
-        backup_providers = self.config.get("backup_providers", ["openai", "aliyun"])
-        
-        # 构建平台列表（主平台优先）
-        all_providers = [primary_provider] + [p for p in backup_providers if p != primary_provider]
-        
-        logger.info(f"[绘图] 尝试平台列表: {all_providers}，主平台: {primary_provider}")
-        
-        last_error = None
-        for provider in all_providers:
-            try:
-                logger.info(f"[绘图] 尝试使用平台: {provider}")
-                
-                if provider.lower() in ["ms", "modelscope"]:
-                    # ModelScope 平台
-                    if not self.api_key:
-                        logger.warning(f"[绘图] {provider} 平台未配置API密钥，跳过")
-                        continue
-                    async with aiohttp.ClientSession() as session:
-                        return await self._request_modelscope(prompt, size, session)
-                elif provider.lower() == "openai":
-                    # OpenAI 平台
-                    openai_api_key = self.config.get("openai_api_key", "")
-                    if not openai_api_key:
-                        logger.warning(f"[绘图] OpenAI 平台未配置API密钥，跳过")
-                        continue
-                    return await self._request_openai_dalle(prompt, size, openai_api_key)
-                elif provider.lower() == "aliyun":
-                    # 阿里云平台
-                    aliyun_api_key = self.config.get("aliyun_api_key", "")
-                    if not aliyun_api_key:
-                        logger.warning(f"[绘图] 阿里云平台未配置API密钥，跳过")
-                        continue
-                    return await self._request_aliyun(prompt, size, aliyun_api_key)
-                else:
-                    logger.warning(f"[绘图] 不支持的平台: {provider}，跳过")
-                    continue
-                    
-            except Exception as e:
-                logger.warning(f"[绘图] {provider} 平台调用失败: {e}")
-                last_error = e
-                continue  # 尝试下一个平台
-        
-        # 如果所有平台都失败了
-        if last_error:
-            logger.error(f"[绘图] 所有绘图平台都失败了，最后错误: {last_error}")
-            raise Exception(f"所有绘图平台都失败了: {last_error}")
-        else:
-            raise Exception("没有配置任何绘图平台")
-    
-    async def _request_openai_dalle(self, prompt: str, size: str, api_key: str) -> str:
-        """调用 OpenAI DALL-E 生成图片"""
-        # 将尺寸转换为 OpenAI 支持的格式
-        # OpenAI DALL-E 支持 256x256, 512x512, 1024x1024
-        # 将其他尺寸映射到最接近的 OpenAI 支持的尺寸
-        if "256" in size:
-            openai_size = "256x256"
-        elif "512" in size:
-            openai_size = "512x512"
-        elif "1024" in size:
-            openai_size = "1024x1024"
-        else:
-            # 默认使用 1024x1024
-            openai_size = "1024x1024"
-        
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        }
-        
-        # 构建请求数据
-        payload = {
-            "model": "dall-e-3",  # 或者使用 "dall-e-2"
-            "prompt": prompt,
-            "n": 1,
-            "size": openai_size,
-        }
-        
-        openai_api_url = self.config.get("openai_api_url", "https://api.openai.com/v1")
-        url = f"{openai_api_url}/images/generations"
-        logger.info(f"[OpenAI DALL-E] 请求URL: {url}")
-        logger.info(f"[OpenAI DALL-E] 请求参数: size={openai_size}, prompt={prompt[:50]}...")
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json=payload) as resp:
-                resp_text = await resp.text()
-                logger.info(f"[OpenAI DALL-E] 响应状态: {resp.status}")
-                logger.info(f"[OpenAI DALL-E] 响应内容: {resp_text[:1000]}...")
-                
-                if resp.status != 200:
-                    logger.error(f"[OpenAI DALL-E] API调用失败: HTTP {resp.status}")
-                    logger.error(f"[OpenAI DALL-E] 错误详情: {resp_text}")
-                    raise Exception(f"OpenAI DALL-E API调用失败: HTTP {resp.status}, {resp_text[:200]}")
-                
-                try:
-                    data = json.loads(resp_text)
-                except json.JSONDecodeError as e:
-                    logger.error(f"[OpenAI DALL-E] 响应解析失败: {e}")
-                    raise Exception(f"OpenAI DALL-E 响应解析失败: {e}")
-        
-        # 从响应中提取图片URL
-        if "data" not in data or not data["data"]:
-            logger.error(f"[OpenAI DALL-E] 未找到图片数据")
-            logger.error(f"[OpenAI DALL-E] 完整响应数据: {json.dumps(data, ensure_ascii=False, indent=2)}")
-            raise Exception("OpenAI DALL-E 未返回图片数据")
-        
-        image_url = data["data"][0].get("url")
-        if not image_url:
-            logger.error(f"[OpenAI DALL-E] 未找到图片URL")
-            logger.error(f"[OpenAI DALL-E] 完整响应数据: {json.dumps(data, ensure_ascii=False, indent=2)}")
-            raise Exception("OpenAI DALL-E 未返回图片 URL")
-        
-        return image_url
-    
-    async def _request_aliyun(self, prompt: str, size: str, api_key: str) -> str:
-        """调用阿里云通义万相生成图片"""
-        # 阿里云支持的尺寸格式，如 "1024*1024"
-        # 将标准格式转换为阿里云格式
-        ali_size = size.replace("x", "*")
-        
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        }
-        
-        # 构建请求数据
-        payload = {
-            "model": "wanx-v1",  # 阿里云通义万相模型
-            "input": {
-                "prompt": prompt,
-                "size": ali_size,
-            },
-            "parameters": {
-                "n": 1,
-            }
-        }
-        
-        aliyun_api_url = self.config.get("aliyun_api_url", "https://dashscope.aliyuncs.com/api/v1")
-        url = f"{aliyun_api_url}/services/aigc/text2image"
-        logger.info(f"[阿里云通义万相] 请求URL: {url}")
-        logger.info(f"[阿里云通义万相] 请求参数: size={ali_size}, prompt={prompt[:50]}...")
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json=payload) as resp:
-                resp_text = await resp.text()
-                logger.info(f"[阿里云通义万相] 响应状态: {resp.status}")
-                logger.info(f"[阿里云通义万相] 响应内容: {resp_text[:1000]}...")
-                
-                if resp.status != 200:
-                    logger.error(f"[阿里云通义万相] API调用失败: HTTP {resp.status}")
-                    logger.error(f"[阿里云通义万相] 错误详情: {resp_text}")
-                    raise Exception(f"阿里云通义万相 API调用失败: HTTP {resp.status}, {resp_text[:200]}")
-                
-                try:
-                    data = json.loads(resp_text)
-                except json.JSONDecodeError as e:
-                    logger.error(f"[阿里云通义万相] 响应解析失败: {e}")
-                    raise Exception(f"阿里云通义万相 响应解析失败: {e}")
-        
-        # 从响应中提取图片URL
-        if "output" not in data or "results" not in data["output"] or not data["output"]["results"]:
-            logger.error(f"[阿里云通义万相] 未找到图片数据")
-            logger.error(f"[阿里云通义万相] 完整响应数据: {json.dumps(data, ensure_ascii=False, indent=2)}")
-            raise Exception("阿里云通义万相 未返回图片数据")
-        
-        image_url = data["output"]["results"][0].get("url")
-        if not image_url:
-            logger.error(f"[阿里云通义万相] 未找到图片URL")
-            logger.error(f"[阿里云通义万相] 完整响应数据: {json.dumps(data, ensure_ascii=False, indent=2)}")
-            raise Exception("阿里云通义万相 未返回图片 URL")
-        
-        return image_url
-    
     async def _request_image(self, prompt: str, size: str) -> str:
-        """根据配置的提供商发起请求，返回图片URL"""
+        """按配置的主平台和备用平台生成图片，返回本地图片路径"""
         try:
             if not prompt:
                 raise ValueError("请提供提示词！")
+            if self.llm is None:
+                raise Exception("绘图模块未加载")
             
-            # 使用新的多平台支持方法
-            return await self._request_image_with_fallback(prompt, size)
+            return await self.llm.request_image(None, prompt, size)
         
         except aiohttp.ClientError as e:
             raise Exception(f"网络请求失败: {str(e)}")
@@ -2143,12 +1970,12 @@ class Main(Star):
             
             logger.info(f"[绘图工具] 开始请求图片生成...")
             # 发送图片生成请求
-            image_url = await self._request_image(prompt, size)
-            logger.info(f"[绘图工具] 图片生成成功: {image_url}")
+            image_path = await self._request_image(prompt, size)
+            logger.info(f"[绘图工具] 图片生成成功: {image_path}")
             
             # 构造并发送图片消息给用户（只发送图片，不加任何文字）
             chain: List[BaseMessageComponent] = [
-                Image.fromURL(image_url)
+                Image.fromFileSystem(image_path)
             ]
             
             logger.info(f"[绘图工具] 发送图片给用户...")
@@ -2192,10 +2019,10 @@ class Main(Star):
             return
         
         try:
-            image_url = await self._request_image(prompt, self.size)
+            image_path = await self._request_image(prompt, self.size)
             chain: List[BaseMessageComponent] = [
                 Plain(f"提示词：{prompt}\n"),
-                Image.fromURL(image_url)
+                Image.fromFileSystem(image_path)
             ]
             yield event.chain_result(chain)
         except Exception as e:
@@ -2336,7 +2163,7 @@ class Main(Star):
                     if image_prompt:
                         logger.info(f"[写说说] 生成的配图提示词: {image_prompt}")
                         # 调用ModelScope生图
-                        image_url = await self.llm._request_modelscope(image_prompt)
+                        image_url = await self.llm.request_image("modelscope", image_prompt)
                         if image_url:
                             images = [image_url]
                             logger.info(f"[写说说] 配图生成成功: {image_url}")
@@ -2619,7 +2446,7 @@ class Main(Star):
                 logger.info(f"[工具调用] 增强提示词: {enhanced_prompt[:100]}...")
                 
                 # 调用 ModelScope API
-                image_url = await self.llm._request_modelscope(enhanced_prompt, size=size)
+                image_url = await self.llm.request_image("modelscope", enhanced_prompt, size=size)
                 if image_url:
                     logger.info(f"[工具调用] 绘图成功: {image_url}")
                     return image_url
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+上下文事件检测测试脚本
+验证关键词扫描对大小写变体的处理
+"""
+from pathlib import Path
+import sys
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from context_events import EventTrigger, EventType, _scan_keywords
+
+
+def test_case_variant_greeting():
+    """测试非 ASCII 大小写变体的问候语不会导致关键词查表失败"""
+    print("\n" + "="*50)
+    print("测试大小写变体问候语")
+    print("="*50)
+
+    # "İ"、"ı" 在忽略大小写匹配时等同于 "i"，但 lower() 后不是 "hi"
+    for message in ("hİ", "hı", "HELLO", "Hİ，今天天气怎么样"):
+        is_greeting, topic = _scan_keywords(message)
+        print(f"- {message!r}: 问候={is_greeting}, 话题={topic}")
+        assert is_greeting
+
+    assert _scan_keywords("Hİ，今天天气怎么样")[1] == "天气"
+
+    trigger = EventTrigger()
+    events = trigger.detect_event("hİ")
+    assert EventType.GREETING in {event.event_type for event in events}
+
+
+def test_topic_priority():
+    """测试多个话题同时命中时按优先级选择"""
+    print("\n" + "="*50)
+    print("测试话题优先级")
+    print("="*50)
+
+    is_greeting, topic = _scan_keywords("你好，帮我画一张下雨天的图")
+    print(f"- 问候={is_greeting}, 话题={topic}")
+    assert is_greeting
+    assert topic == "天气"
+
+
+if __name__ == "__main__":
+    try:
+        test_case_variant_greeting()
+        test_topic_priority()
+
+        print("\n" + "="*60)
+        print("✅ 所有测试完成！")
+        print("="*60 + "\n")
+
+    except Exception as e:
+        print(f"\n❌ 测试出错: {e}")
+        import traceback
+        traceback.print_exc()
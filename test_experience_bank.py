@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+经历银行承诺日志测试脚本
+验证压缩承诺日志后完成状态不丢失
+"""
+from pathlib import Path
+import shutil
+import sys
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from core.experience_bank import ExperienceBank
+
+
+def test_compact_non_ascii_keyword():
+    """测试关键词含非 ASCII 大写字母的承诺在压缩后仍为已完成"""
+    print("\n" + "="*50)
+    print("测试承诺日志压缩（非 ASCII 关键词）")
+    print("="*50)
+
+    data_dir = Path("./test_data/experience_bank")
+    shutil.rmtree(data_dir, ignore_errors=True)
+    bank = ExperienceBank(data_dir, enable_timeline_verification=False)
+    try:
+        # 全角字母、带重音字母、西里尔字母：lower() 后与原文不同
+        keywords = ["ＰＳ５", "CAFÉ", "ПОДАРОК"]
+        for keyword in keywords:
+            bank.record_promise(f"答应给朋友买{keyword}")
+        bank.record_promise("周末一起去爬山")
+
+        for keyword in keywords:
+            bank.complete_promise(keyword)
+
+        with bank._state_lock:
+            bank._compact_promises()
+        bank.flush()
+
+        promises = {p["promise"]: p["status"] for p in bank.get_promises()}
+        for promise, status in promises.items():
+            print(f"- {promise}: {status}")
+        for keyword in keywords:
+            assert promises[f"答应给朋友买{keyword}"] == "completed"
+        assert promises["周末一起去爬山"] == "pending"
+    finally:
+        bank.close()
+
+
+if __name__ == "__main__":
+    Path("./test_data").mkdir(exist_ok=True)
+
+    try:
+        test_compact_non_ascii_keyword()
+
+        print("\n" + "="*60)
+        print("✅ 所有测试完成！")
+        print("="*60 + "\n")
+
+    except Exception as e:
+        print(f"\n❌ 测试出错: {e}")
+        import traceback
+        traceback.print_exc()